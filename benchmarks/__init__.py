@@ -0,0 +1,19 @@
+"""
+Micro-benchmarks for the hot paths of the API.  Each module can be run from
+the root of the project:
+    
+    python -m benchmarks.override
+    python -m benchmarks.parsing
+    python -m benchmarks.rendering
+
+The generators module builds PCS pages of any size for them to work on.
+
+The standin module is a stand-in for the PhillyCarShare site, for load tests
+of the whole app:
+    
+    python -m benchmarks.standin --port 8081 --pods 500
+
+and the handlers module runs the JSON handlers end to end against its pages:
+    
+    python -m benchmarks.handlers --requests 200 --output results.json
+"""
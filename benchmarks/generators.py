@@ -0,0 +1,172 @@
+"""
+Builds PCS pages of any size from the test fixtures, for seeing how the
+screenscrapers cope with more history, pods and options than the fixtures
+have:
+    
+    reservations_page(rows=500, page_links=40)
+    results_payload(pods=60, vehicles_per_pod=4)
+    lightbox_page(time_options=2000)
+    confirmation_page(filler=500)
+
+Each generated page keeps the structure of the fixture that it's built from,
+with ids changed so that no two reservations, pods or vehicles share one.
+"""
+import imp
+import os
+import re
+
+try:
+    import json
+except ImportError:
+    from django.utils import simplejson as json
+
+FIXTURES_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'test', 'strings_for_testing.py')
+
+PAGE_LINK_TEMPLATE = '<span style="padding: 5px"><a class="text">%s</a></span>'
+CURRENT_PAGE_TEMPLATE = '<span style="padding: 5px"><font class="text">%s</font></span>'
+PAGINATION_TABLE = re.compile(
+    r'<table width="100%" id="dlist_pagination">.*?</table>', re.DOTALL)
+SELECT_OPTIONS = re.compile(r'(<select[^>]*>).*?(</select>)', re.DOTALL)
+
+# Stands in for the menus, scripts and such that surround the parts of a page
+# that are actually read.
+FILLER_BLOCK = '<div class="filler"><ul><li><a class="text" href="my_reservations.php?_r=%s">Menu item %s</a></li><li><span>&nbsp;</span></li></ul><script type="text/javascript">var item_%s = {"shown": false};</script></div>'
+
+_fixtures = None
+
+def load_fixtures(path=FIXTURES_PATH):
+    return imp.load_source('strings_for_testing', path)
+
+def get_fixtures():
+    """
+    @return: The test fixtures module, loaded the first time it's asked for.
+    """
+    global _fixtures
+    if _fixtures is None:
+        _fixtures = load_fixtures()
+    return _fixtures
+
+def split_pod_blocks(fragments):
+    """
+    @return: The "pod_top" divs and "pod_bot" divs in the given results.php
+      pod fragments, as two lists of strings.
+    """
+    tops = []
+    bots = []
+    for fragment in fragments:
+        starts = [match.start() for match in
+                  re.finditer(r'<div class="pod_bot', fragment)]
+        tops.append(fragment[:starts[0]])
+        for start, end in zip(starts, starts[1:] + [len(fragment)]):
+            bots.append(fragment[start:end])
+    return tops, bots
+
+def results_payload(pods, vehicles_per_pod=2, fixtures=None):
+    """
+    @return: A results.php response with the given number of pods, each with
+      vehicles_per_pod vehicles.
+    """
+    fixtures = fixtures or get_fixtures()
+    fragments = json.loads(fixtures.RESULTS_FOR_VEHICLES_NEAR_LOCATION)['pods']
+    tops, bots = split_pod_blocks(fragments)
+    
+    pod_fragments = []
+    for index in xrange(pods):
+        podid = 100000 + index
+        top = tops[index % len(tops)]
+        top = re.sub(r'show_pod_details\(\d+\)',
+                     'show_pod_details(%s)' % podid, top)
+        top = re.sub(r'pk=\d+', 'pk=%s' % podid, top)
+        
+        vehicles = []
+        for number in xrange(vehicles_per_pod):
+            bot = bots[(index * vehicles_per_pod + number) % len(bots)]
+            vehicles.append(re.sub(
+                r"(lightbox\.create\('\d+', '\d+', ')\d+'",
+                r"\g<1>%s%02d'" % (podid, number), bot))
+        
+        pod_fragments.append(top + ''.join(vehicles))
+    
+    return json.dumps({'pods': pod_fragments})
+
+def reservations_page(rows, page_links=1, current_page=1,
+                      first_logid=3000000, fixtures=None):
+    """
+    @return: A my_reservations.php page of history with the given number of
+      reservation rows, and links to page_links pages (with no pagination at
+      all if there's only one page).
+    """
+    fixtures = fixtures or get_fixtures()
+    fixture = fixtures.PAST_RESERVATIONS_SECOND_OF_FIVE_PAGES
+    
+    tbody_start = fixture.index('>', fixture.index('<tbody')) + 1
+    tbody_end = fixture.index('</tbody>')
+    head = fixture[:tbody_start]
+    tail = fixture[tbody_end:]
+    fixture_rows = re.findall(r'<tr.*?</tr>', fixture[tbody_start:tbody_end],
+                              re.DOTALL)
+    
+    page_rows = []
+    for index in xrange(rows):
+        page_rows.append(re.sub(r'^(<tr[^>]*><td >)\d+',
+                                r'\g<1>%s' % (first_logid + index),
+                                fixture_rows[index % len(fixture_rows)]))
+    
+    if page_links <= 1:
+        tail = PAGINATION_TABLE.sub('', tail)
+    else:
+        links = []
+        for number in xrange(1, page_links + 1):
+            if number == current_page:
+                links.append(CURRENT_PAGE_TEMPLATE % number)
+            else:
+                links.append(PAGE_LINK_TEMPLATE % number)
+        
+        links_start = tail.index('<td align="center">')
+        links_end = tail.index('</td>', links_start)
+        tail = tail[:links_start] + '<td align="center">' + ''.join(links) \
+            + tail[links_end:]
+    
+    return head + ''.join(page_rows) + tail
+
+def time_option(seconds):
+    time_of_day = seconds % 86400
+    if time_of_day == 0:
+        label = 'Midnight'
+    else:
+        hour, minute = divmod(time_of_day // 60, 60)
+        label = '%02d:%02d %s' % ((hour % 12) or 12, minute,
+                                  hour < 12 and 'AM' or 'PM')
+    return '<option value="%s">%s</option>' % (seconds, label)
+
+def lightbox_page(vehicleid='96692246', time_options=None, fixtures=None):
+    """
+    @return: A lightbox.php reservation box for the given vehicle.  If
+      time_options is given, each of the box's time menus has that many
+      quarter-hours to choose from.
+    """
+    fixtures = fixtures or get_fixtures()
+    page = re.sub(r'name="add\[stack_pk\]" value="\d+"',
+                  'name="add[stack_pk]" value="%s"' % vehicleid,
+                  fixtures.VEHICLE_AVAIL_FOR_NEW_RESERVATION)
+    
+    if time_options is not None:
+        options = ''.join([time_option(index * 900)
+                           for index in xrange(time_options)])
+        page = SELECT_OPTIONS.sub(r'\g<1>%s\g<2>' % options, page)
+    
+    return page
+
+def confirmation_page(filler=0, fixtures=None):
+    """
+    @return: A my_reservations.php confirmation page, with filler blocks of
+      other markup ahead of the confirmation itself.
+    """
+    fixtures = fixtures or get_fixtures()
+    page = fixtures.NEW_RESERVATION_CONFIRMATION
+    
+    body_start = page.index('>', page.index('<body')) + 1
+    blocks = [FILLER_BLOCK % (index, index, index) for index in xrange(filler)]
+    return page[:body_start] + ''.join(blocks) + page[body_start:]
@@ -0,0 +1,355 @@
+"""
+End-to-end benchmarks of the JSON handlers.  Each handler is run with the real
+sources, parsers and views, against connections that are answered from the
+test fixtures (by the stand-in's pages, with no server in between), so that
+only the app's own costs are measured:
+    
+    python -m benchmarks.handlers --requests 200 --concurrency 4 \
+        --output results.json
+
+For each handler this reports requests per second, latency, the time spent in
+each stage of a request, and the peak memory of the process so far.  The
+stages are:
+    
+    fetch   -- in PcsConnection.request (getting the page from the stand-in)
+    parse   -- turning pages into documents, JSON or parser events
+    build   -- the rest of the sources' work, building the data objects
+    render  -- in the views
+    other   -- the rest of the handler
+"""
+import copy
+import datetime
+import optparse
+import resource
+import StringIO
+import sys
+import threading
+import time
+
+try:
+    import json
+except ImportError:
+    from django.utils import simplejson as json
+
+from benchmarks.standin import StandInConnection
+from benchmarks.standin import StandInPages
+from pcs.fetchers.screenscrape import availability
+from pcs.wsgi_handlers.availability import LocationAvailabilityJsonHandler
+from pcs.wsgi_handlers.registry import ApplicationRegistry
+from pcs.wsgi_handlers.reservations import ReservationJsonHandler
+from pcs.wsgi_handlers.reservations import ReservationsJsonHandler
+from pcs.wsgi_handlers.session import SessionJsonHandler
+from util import metrics
+from util.htmlparsing import default_backend
+from util.parallel import WorkerPool
+
+STAGES = ('fetch', 'parse', 'build', 'render')
+
+class StageTimer (object):
+    """
+    Adds up the time spent in each stage of a request, across threads.  A
+    stage's time doesn't include the time spent in any stage entered from
+    within it, so the stages add up to no more than the whole.
+    """
+    
+    def __init__(self, timer=time.time):
+        self.timer = timer
+        
+        self.__lock = threading.Lock()
+        self.__local = threading.local()
+        self.__totals = {}
+    
+    def call(self, stage, function, *args, **kwds):
+        stack = self.__local.__dict__.setdefault('stack', [])
+        # Each entry is [stage, time spent in the stages within it].
+        entry = [stage, 0]
+        stack.append(entry)
+        started_at = self.timer()
+        try:
+            return function(*args, **kwds)
+        finally:
+            elapsed = self.timer() - started_at
+            stack.pop()
+            if stack:
+                stack[-1][1] += elapsed
+            self.add(stage, elapsed - entry[1])
+    
+    def add(self, stage, seconds):
+        self.__lock.acquire()
+        try:
+            self.__totals[stage] = self.__totals.get(stage, 0) + seconds
+        finally:
+            self.__lock.release()
+    
+    def patch(self, obj, name, stage):
+        """
+        Count the time spent in obj's method of the given name towards stage.
+        """
+        function = getattr(obj, name)
+        def timed(*args, **kwds):
+            return self.call(stage, function, *args, **kwds)
+        setattr(obj, name, timed)
+    
+    def take_totals(self):
+        """
+        @return: The seconds spent in each stage since the last call.
+        """
+        self.__lock.acquire()
+        try:
+            totals = self.__totals
+            self.__totals = {}
+            return totals
+        finally:
+            self.__lock.release()
+
+class BenchmarkRequest (dict):
+    def __init__(self, params=None, cookies=None):
+        super(BenchmarkRequest, self).__init__(params or {})
+        self.cookies = cookies or {}
+        self.headers = {}
+        self.query_string = ''
+        self.body = ''
+    
+    def arguments(self):
+        return self.keys()
+
+class BenchmarkResponseHeaders (list):
+    def add_header(self, name, value):
+        self.append((name, value))
+
+class BenchmarkResponse (object):
+    def __init__(self):
+        self.out = StringIO.StringIO()
+        self.headers = BenchmarkResponseHeaders()
+        self.status = None
+    
+    def set_status(self, status):
+        self.status = status
+
+def build_registry(pages, stages, caches=False):
+    """
+    @return: An ApplicationRegistry whose sources are answered by the given
+      pages, and whose sources and views are timed by the given stages.
+    """
+    if caches:
+        registry = ApplicationRegistry()
+    else:
+        registry = ApplicationRegistry(session_cache=None, profile_cache=None,
+                                       vehicle_cache=None)
+    
+    def create_connection():
+        conn = StandInConnection(pages)
+        stages.patch(conn, 'request', 'fetch')
+        return conn
+    
+    html_backend = copy.copy(default_backend)
+    stages.patch(html_backend, 'parse', 'parse')
+    
+    session_source = registry.session_source()
+    session_source.create_host_connection = create_connection
+    for name in ('body_is_valid_session', 'create_session_from_login_response',
+                 'create_session_from_reconnect_response'):
+        stages.patch(session_source, name, 'parse')
+    
+    availability_source = registry.availability_source()
+    availability_source.create_host_connection = create_connection
+    availability_source.html_backend = html_backend
+    stages.patch(availability_source, 'get_json_data', 'parse')
+    
+    locations_source = registry.locations_source()
+    locations_source.create_connection = create_connection
+    locations_source.html_backend = html_backend
+    
+    reservations_source = registry.reservations_source()
+    reservations_source.get_pcs_connection = create_connection
+    reservations_source.html_backend = html_backend
+    
+    for source in (session_source, availability_source, locations_source,
+                   reservations_source):
+        for name in dir(source):
+            if name.startswith('fetch_'):
+                stages.patch(source, name, 'build')
+    
+    for view in (registry.session_json_view(),
+                 registry.availability_json_view(),
+                 registry.reservations_json_view(),
+                 registry.error_json_view()):
+        for name in dir(view):
+            if name.startswith('render_'):
+                stages.patch(view, name, 'render')
+    
+    return registry
+
+def build_scenarios(sessionid, locationid, start_time, end_time):
+    """
+    @return: A list of (name, handler class, handler method, arguments,
+      request parameters, cookies) for each request to benchmark.
+    """
+    cookies = {'session_id': sessionid}
+    time_range = {'start_time': start_time.strftime('%Y-%m-%dT%H:%M'),
+                  'end_time': end_time.strftime('%Y-%m-%dT%H:%M')}
+    
+    return [
+        ('session_login', SessionJsonHandler, 'post', (),
+            {'user': 'mjumbe', 'password': 'secret'}, {}),
+        ('session', SessionJsonHandler, 'get', (), {}, cookies),
+        ('location_availability', LocationAvailabilityJsonHandler, 'get',
+            (locationid,), time_range, cookies),
+        ('upcoming_reservations', ReservationsJsonHandler, 'get', (),
+            {}, cookies),
+        ('past_reservations', ReservationsJsonHandler, 'get', (),
+            {'period': start_time.strftime('%Y-%m')}, cookies),
+        ('reservation', ReservationJsonHandler, 'get', ('2482842',),
+            {}, cookies),
+    ]
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
+
+def peak_memory_kb():
+    # ru_maxrss is in kilobytes on Linux (but bytes on OS X).
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def run_scenario(registry, stages, scenario, requests, concurrency):
+    """
+    Make the scenario's request the given number of times, concurrency at a
+    time.
+    
+    @return: A dict of the results.
+    """
+    name, handler_class, method, args, params, cookies = scenario
+    errors = []
+    
+    class BenchmarkHandler (handler_class):
+        def generate_error(self, error):
+            errors.append(error)
+            return super(BenchmarkHandler, self).generate_error(error)
+    BenchmarkHandler.registry = registry
+    
+    def handle():
+        started_at = time.time()
+        handler = BenchmarkHandler()
+        handler.request = BenchmarkRequest(params, cookies)
+        handler.response = BenchmarkResponse()
+        getattr(handler, method)(*args)
+        return time.time() - started_at
+    
+    # Once through first, so that nothing is measured being set up.
+    handle()
+    errors[:] = []
+    stages.take_totals()
+    
+    pool = WorkerPool(max_workers=concurrency)
+    started_at = time.time()
+    tasks = [pool.submit(handle) for _ in xrange(requests)]
+    latencies = sorted(task.result() for task in tasks)
+    seconds = time.time() - started_at
+    
+    totals = stages.take_totals()
+    stage_ms = dict((stage, totals.get(stage, 0) * 1000 / requests)
+                    for stage in STAGES)
+    stage_ms['other'] = max(0,
+        sum(latencies) * 1000 / requests - sum(stage_ms.values()))
+    
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': len(errors),
+        'seconds': seconds,
+        'requests_per_second': requests / seconds,
+        'latency_ms': {
+            'mean': sum(latencies) * 1000 / requests,
+            'p50': percentile(latencies, 0.50) * 1000,
+            'p95': percentile(latencies, 0.95) * 1000,
+            'max': latencies[-1] * 1000,
+        },
+        'stage_ms': stage_ms,
+        'peak_memory_kb': peak_memory_kb(),
+    }
+
+def run(requests=100, concurrency=1, pods=10, history_pages=5,
+        reservations_per_page=10, caches=False, only=None, out=sys.stdout):
+    """
+    Run each of the scenarios (or just those named in only).
+    
+    @return: A dict of the options and results, ready to be saved as JSON.
+    """
+    stages = StageTimer()
+    pages = StandInPages(pods=pods, history_pages=history_pages,
+                         reservations_per_page=reservations_per_page)
+    registry = build_registry(pages, stages, caches)
+    
+    # The pod parser is made anew for each search, so it's timed for all.
+    stages.patch(availability.PodResultsParser, 'feed', 'parse')
+    
+    start_time = datetime.datetime.now().replace(second=0, microsecond=0) \
+        + datetime.timedelta(days=1)
+    scenarios = build_scenarios('ses1234', '18000000', start_time,
+                                start_time + datetime.timedelta(hours=2))
+    
+    results = {}
+    print >> out, '%-22s %9s %9s %9s %7s %7s %7s %7s %7s %9s' % (
+        'handler', 'req/s', 'p50 ms', 'p95 ms', 'fetch', 'parse', 'build',
+        'render', 'other', 'peak KB')
+    for scenario in scenarios:
+        name = scenario[0]
+        if only and name not in only:
+            continue
+        
+        result = run_scenario(registry, stages, scenario, requests, concurrency)
+        results[name] = result
+        
+        stage_ms = result['stage_ms']
+        print >> out, '%-22s %9.1f %9.2f %9.2f %7.2f %7.2f %7.2f %7.2f %7.2f %9d%s' % (
+            name, result['requests_per_second'], result['latency_ms']['p50'],
+            result['latency_ms']['p95'], stage_ms['fetch'], stage_ms['parse'],
+            stage_ms['build'], stage_ms['render'], stage_ms['other'],
+            result['peak_memory_kb'],
+            result['errors'] and ' (%s errors)' % result['errors'] or '')
+    
+    return {
+        'time': datetime.datetime.now().isoformat(),
+        'python': sys.version.split()[0],
+        'html_backend': default_backend.name,
+        'options': {
+            'requests': requests,
+            'concurrency': concurrency,
+            'pods': pods,
+            'history_pages': history_pages,
+            'reservations_per_page': reservations_per_page,
+            'caches': caches,
+        },
+        'results': results,
+        'metrics': metrics.snapshot(),
+    }
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options] [handler ...]')
+    parser.add_option('--requests', type='int', default=100,
+                      help='requests to make of each handler')
+    parser.add_option('--concurrency', type='int', default=1,
+                      help='requests to make at once')
+    parser.add_option('--pods', type='int', default=10,
+                      help='pods in each search result')
+    parser.add_option('--history-pages', type='int', default=5)
+    parser.add_option('--reservations-per-page', type='int', default=10)
+    parser.add_option('--caches', action='store_true', default=False,
+                      help='remember sessions, profiles and vehicles, as the '
+                           'app does')
+    parser.add_option('--output', help='file to save the results to, as JSON')
+    options, args = parser.parse_args()
+    
+    report = run(options.requests, options.concurrency, options.pods,
+                 options.history_pages, options.reservations_per_page,
+                 options.caches, args)
+    
+    if options.output:
+        output_file = open(options.output, 'w')
+        try:
+            json.dump(report, output_file, indent=1, sort_keys=True)
+        finally:
+            output_file.close()
+
+if __name__ == '__main__':
+    main()
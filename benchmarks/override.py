@@ -0,0 +1,65 @@
+"""
+Compares the cost of calling an @override method with that of calling a plain
+method, and with that of the old decorator, which inspected both methods on
+every call.
+"""
+import functools
+import inspect
+import timeit
+
+from util.abstract import override
+from util.abstract import OverrideException
+
+def inspect_on_every_call(method):
+    # The @override decorator as it used to be.
+    def verify_against_calling_inst(calling_inst):
+        parent_class = inspect.getmro(calling_inst.__class__)[1]
+        if not hasattr(parent_class, method.__name__):
+            raise OverrideException(method.__name__)
+        
+        method_args = inspect.getargspec(method)
+        parent_args = inspect.getargspec(getattr(parent_class,
+                                                 method.__name__))
+        if method_args[0] != parent_args[0]:
+            raise OverrideException(method.__name__)
+    
+    @functools.wraps(method)
+    def wrapped(self, *args, **kwds):
+        verify_against_calling_inst(self)
+        return method(self, *args, **kwds)
+    
+    return wrapped
+
+class _SourceInterface (object):
+    def fetch_vehicle(self, sessionid, vehicleid, start_time, end_time):
+        raise NotImplementedError()
+
+class PlainSource (_SourceInterface):
+    def fetch_vehicle(self, sessionid, vehicleid, start_time, end_time):
+        return vehicleid
+
+class OverrideSource (_SourceInterface):
+    @override
+    def fetch_vehicle(self, sessionid, vehicleid, start_time, end_time):
+        return vehicleid
+
+class InspectingSource (_SourceInterface):
+    @inspect_on_every_call
+    def fetch_vehicle(self, sessionid, vehicleid, start_time, end_time):
+        return vehicleid
+
+def time_calls(source, number):
+    """
+    @return: The average number of microseconds that a call to
+      source.fetch_vehicle takes.
+    """
+    call = lambda: source.fetch_vehicle('ses1234', 'veh1234', 0, 3600)
+    return timeit.timeit(call, number=number) / number * 1000000
+
+def main(number=100000):
+    for source in (PlainSource(), OverrideSource(), InspectingSource()):
+        print '%-20s %6.2f usec per call' \
+            % (source.__class__.__name__, time_calls(source, number))
+
+if __name__ == '__main__':
+    main()
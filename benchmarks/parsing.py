@@ -0,0 +1,237 @@
+"""
+Times the decoders in PcsDocumentDecoder and AvailabilityScreenscrapeSource
+against generated pages of growing size, to show where parsing grows worse
+than linearly:
+    
+    python -m benchmarks.parsing --output parsing.json
+    python -m benchmarks.parsing --backend beautifulsoup reservation_log
+
+For each case and size this reports the time taken to parse the page into a
+document (or JSON, or parser events), the time taken to decode that, and how
+much the process grew while doing both.  The last column is how the total
+time grew from the size before: the exponent k in time ~ size ** k, so 1.0 is
+linear and anything much above it is worse.
+"""
+import math
+import optparse
+import os
+import resource
+import sys
+import time
+
+try:
+    import json
+except ImportError:
+    from django.utils import simplejson as json
+
+from benchmarks.generators import confirmation_page
+from benchmarks.generators import lightbox_page
+from benchmarks.generators import reservations_page
+from benchmarks.generators import results_payload
+from pcs.fetchers.screenscrape.availability import AvailabilityScreenscrapeSource
+from pcs.fetchers.screenscrape.reservations import PcsDocumentDecoder
+from pcs.fetchers.screenscrape.reservations import ReservationsScreenscrapeSource
+from util.htmlparsing import backends
+from util.htmlparsing import default_backend
+from util.TimeZone import Eastern
+
+class ParsingCase (object):
+    """
+    A decoder to time, on pages built by generate for each of sizes.  parse
+    turns a page into whatever decode takes.
+    """
+    
+    def __init__(self, name, unit, sizes, generate, parse, decode):
+        self.name = name
+        self.unit = unit
+        self.sizes = sizes
+        self.generate = generate
+        self.parse = parse
+        self.decode = decode
+
+def build_cases(backend):
+    availability = AvailabilityScreenscrapeSource()
+    availability.html_backend = backend
+    reservations = ReservationsScreenscrapeSource()
+    reservations.html_backend = backend
+    decoder = PcsDocumentDecoder()
+    
+    import datetime
+    start_time = datetime.datetime(2010, 8, 23, 1, 15, tzinfo=Eastern)
+    end_time = start_time + datetime.timedelta(hours=2)
+    
+    def parse_log(body):
+        return reservations.get_html_document(body, decoder.LOG_DOC_PARTS)
+    
+    def decode_log(doc):
+        return (decoder.build_reservation_log_from_log_doc(doc),
+                decoder.decode_page_info_from_log_doc(doc))
+    
+    # The pod fragments are parsed as they're decoded, so for pod_results the
+    # decode time is mostly parsing.  Searches only stream the fragments with
+    # the BeautifulSoup backend; with lxml they use pod_results_tree.
+    def parse_pods(body):
+        return availability.get_pod_fragments(availability.get_json_data(body))
+    
+    return [
+        ParsingCase('reservation_log', 'rows', (10, 100, 1000, 5000),
+            lambda rows: reservations_page(rows, rows // 10 + 1),
+            parse_log, decode_log),
+        ParsingCase('page_info', 'page links', (10, 100, 1000, 5000),
+            lambda links: reservations_page(10, links),
+            parse_log, decoder.decode_page_info_from_log_doc),
+        ParsingCase('pod_results', 'pods', (10, 50, 200, 500),
+            lambda pods: results_payload(pods, 2),
+            parse_pods,
+            lambda fragments: list(availability.generate_vehicles_from_pod_fragments(
+                fragments, start_time, end_time))),
+        ParsingCase('pod_results_tree', 'pods', (10, 50, 200, 500),
+            lambda pods: results_payload(pods, 2),
+            lambda body: availability.get_html_data(availability.get_json_data(body)),
+            lambda doc: availability.create_vehicles_from_pcs_availability_doc(
+                doc, start_time, end_time)),
+        ParsingCase('vehicle_lightbox', 'time options', (100, 1000, 5000, 20000),
+            lambda options: lightbox_page(time_options=options),
+            availability.get_html_vehicle_data,
+            availability.decode_vehicle_info_from_availability_block),
+        ParsingCase('transaction_lightbox', 'time options', (100, 1000, 5000, 20000),
+            lambda options: lightbox_page(time_options=options),
+            reservations.get_html_document,
+            lambda doc: decoder.decode_transaction_id_from_lightbox_block('add', doc)),
+        ParsingCase('confirmation', 'filler blocks', (10, 100, 1000, 5000),
+            confirmation_page,
+            lambda body: reservations.get_html_document(
+                body, decoder.CONFIRMATION_DOC_PARTS),
+            decoder.decode_reservation_info_from_confirmation_doc),
+    ]
+
+def time_call(function, arg, min_time=0.2, repeat=3):
+    """
+    @return: The best, over repeat rounds, of the average number of seconds
+      that function(arg) takes.  Each round is long enough to last at least
+      min_time.
+    """
+    started_at = time.time()
+    function(arg)
+    once = max(time.time() - started_at, 1e-6)
+    number = max(1, int(min_time / once))
+    
+    best = None
+    for _ in xrange(repeat):
+        started_at = time.time()
+        for _ in xrange(number):
+            function(arg)
+        average = (time.time() - started_at) / number
+        if best is None or average < best:
+            best = average
+    return best
+
+def measure_growth(function):
+    """
+    Call function in a child process, so that the memory it takes can be
+    measured without anything that came before getting in the way.
+    
+    The child copies whatever of its parent's memory it touches, so even a
+    small call shows a few megabytes of growth; it's the difference between
+    sizes that matters.
+    
+    @return: How many kilobytes the child's peak memory grew by, or None if
+      that can't be measured here.
+    """
+    if not hasattr(os, 'fork'):
+        return None
+    
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read_fd)
+            before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            function()
+            after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            os.write(write_fd, str(after - before))
+        finally:
+            os._exit(0)
+    
+    os.close(write_fd)
+    try:
+        output = os.read(read_fd, 64)
+    finally:
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+    if not output:
+        return None
+    return int(output)
+
+def run_case(case, max_size=None, out=sys.stdout):
+    """
+    @return: A list of the results for each of the case's sizes.
+    """
+    results = []
+    last_size = None
+    last_total_ms = None
+    
+    print >> out, '%s (by %s)' % (case.name, case.unit)
+    for size in case.sizes:
+        if max_size is not None and size > max_size:
+            continue
+        
+        page = case.generate(size)
+        parsed = case.parse(page)
+        
+        parse_ms = time_call(case.parse, page) * 1000
+        decode_ms = time_call(case.decode, parsed) * 1000
+        growth_kb = measure_growth(lambda: case.decode(case.parse(page)))
+        
+        total_ms = parse_ms + decode_ms
+        if last_size is None:
+            exponent = None
+        else:
+            exponent = math.log(total_ms / last_total_ms) \
+                / math.log(float(size) / last_size)
+        last_size, last_total_ms = size, total_ms
+        
+        results.append({
+            'size': size,
+            'page_bytes': len(page),
+            'parse_ms': parse_ms,
+            'decode_ms': decode_ms,
+            'memory_growth_kb': growth_kb,
+            'exponent': exponent,
+        })
+        print >> out, '  %7d %10d B %10.2f ms %10.2f ms %8s KB %6s' % (
+            size, len(page), parse_ms, decode_ms,
+            growth_kb is None and '?' or growth_kb,
+            exponent is None and '-' or '%.2f' % exponent)
+    
+    return results
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options] [case ...]')
+    parser.add_option('--backend', default=default_backend.name,
+                      choices=sorted(backends.keys()),
+                      help='HTML parser to use (default %default)')
+    parser.add_option('--max-size', type='int',
+                      help='skip sizes bigger than this')
+    parser.add_option('--output', help='file to save the results to, as JSON')
+    options, args = parser.parse_args()
+    
+    report = {
+        'python': sys.version.split()[0],
+        'html_backend': options.backend,
+        'results': {},
+    }
+    for case in build_cases(backends[options.backend]):
+        if args and case.name not in args:
+            continue
+        report['results'][case.name] = run_case(case, options.max_size)
+    
+    if options.output:
+        output_file = open(options.output, 'w')
+        try:
+            json.dump(report, output_file, indent=1, sort_keys=True)
+        finally:
+            output_file.close()
+
+if __name__ == '__main__':
+    main()
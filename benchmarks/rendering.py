@@ -0,0 +1,162 @@
+"""
+Compares the cost of rendering a location's availability with the JSON view,
+which writes its response directly, with that of rendering it through the
+Django template that the view used to use:
+    
+    python -m benchmarks.rendering --vehicles 200
+
+The vehicles are found by the availability source, in search results from the
+stand-in's pages.  The template is only rendered if Django can be imported,
+and its rendering is checked to hold the same data as the view's.
+
+The sizes of the response are given as the view writes it, indented (as for
+?pretty=1), and gzipped.
+"""
+import datetime
+import optparse
+import timeit
+
+try:
+    import json
+except ImportError:
+    from django.utils import simplejson as json
+
+from benchmarks.standin import StandInConnection
+from benchmarks.standin import StandInPages
+from pcs.fetchers.screenscrape.availability import AvailabilityScreenscrapeSource
+from pcs.renderers.json.availability import AvailabilityJsonView
+from pcs.wsgi_handlers.middleware import gzip_body
+from util.TimeZone import Eastern
+
+# The view's template as it was.
+LOCATION_AVAILABILITY_TEMPLATE = \
+r"""{"location_availability" : {
+	"location" : {
+		"id" : "{{ location.id }}",
+		"name" : "{{ location.name }}"
+	} ,
+	"start_time" : "{{ start_time|date:"Y-m-d\TH:i" }}",
+	"end_time" : "{{ end_time|date:"Y-m-d\TH:i" }}",
+	"vehicle_availabilities" : [
+{% for vehicle_availability in vehicle_availabilities %}
+		{
+			"vehicle" : {
+				"id" : "{{ vehicle_availability.vehicle.id }}",
+				"pod" : {
+					"id" : "{{ vehicle_availability.vehicle.pod.id }}",
+					"name" : "{{ vehicle_availability.vehicle.pod.name }}"} ,
+				"model" : {
+					"id" : "{{ vehicle_availability.vehicle.model.id }}",
+					"name" : "{{ vehicle_availability.vehicle.model.name }}"}} ,
+			"earliest" : "{{ vehicle_availability.earliest|date:"Y-m-d\TH:i" }}",
+			"latest" : "{{ vehicle_availability.latest|date:"Y-m-d\TH:i" }}",
+			"availability" : "{{ vehicle_availability.availability }}"
+		}{% if not forloop.last %} ,{% endif%}
+{% endfor %}
+	]
+}}
+"""
+
+def find_vehicle_availabilities(vehicles):
+    """
+    @return: The (location, start time, end time, vehicle availabilities) for
+      a search that turns up the given number of vehicles.
+    """
+    pods = (vehicles + 1) // 2
+    source = AvailabilityScreenscrapeSource()
+    pages = StandInPages(pods=pods, vehicles_per_pod=2)
+    source.create_host_connection = lambda: StandInConnection(pages)
+    
+    class Location (object):
+        id = '18000000'
+        name = 'Location 1'
+    
+    start_time = datetime.datetime(2010, 8, 23, 1, 15, tzinfo=Eastern)
+    end_time = start_time + datetime.timedelta(hours=2)
+    vehicle_availabilities = source.fetch_available_vehicles_near(
+        'ses1234', Location.id, start_time, end_time)
+    return Location(), start_time, end_time, vehicle_availabilities[:vehicles]
+
+def build_template_renderer():
+    """
+    @return: A function that renders the old template with a dict of values,
+      or None if Django can't be imported.
+    """
+    try:
+        from django.conf import settings
+        from django.template import Context
+        from django.template import Template
+    except ImportError:
+        return None
+    
+    if not settings.configured:
+        settings.configure(TEMPLATES=[{
+            'BACKEND': 'django.template.backends.django.DjangoTemplates'}])
+        try:
+            import django
+            django.setup()
+        except AttributeError:
+            pass
+    
+    try:
+        # Newer Djangos escape HTML unless they're told not to; the template
+        # was written for one that didn't.
+        from django.template import Engine
+        template = Engine(autoescape=False).from_string(
+            LOCATION_AVAILABILITY_TEMPLATE)
+    except ImportError:
+        template = Template(LOCATION_AVAILABILITY_TEMPLATE)
+    
+    def render(values):
+        return template.render(Context(values, autoescape=False))
+    return render
+
+def time_call(call, number):
+    """
+    @return: The average number of milliseconds that call takes.
+    """
+    call()
+    return timeit.timeit(call, number=number) / number * 1000
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('--vehicles', type='int', default=200,
+                      help='vehicles in the response')
+    parser.add_option('--number', type='int', default=100,
+                      help='renderings to average over')
+    options, args = parser.parse_args()
+    
+    location, start_time, end_time, vehicle_availabilities = \
+        find_vehicle_availabilities(options.vehicles)
+    view = AvailabilityJsonView()
+    def render_view():
+        return view.render_location_availability(
+            None, location, start_time, end_time, vehicle_availabilities)
+    
+    rendering = render_view()
+    view_ms = time_call(render_view, options.number)
+    pretty = json.dumps(json.loads(rendering), sort_keys=True, indent=2)
+    print '%d vehicles: %d bytes (%d indented, %d gzipped)' % (
+        len(vehicle_availabilities), len(rendering), len(pretty),
+        len(gzip_body(rendering, 6)))
+    print '  view:     %8.3f ms' % view_ms
+    
+    render_template = build_template_renderer()
+    if render_template is None:
+        print '  template: (Django isn\'t importable)'
+        return
+    
+    values = {
+        'location': location,
+        'start_time': start_time,
+        'end_time': end_time,
+        'vehicle_availabilities': vehicle_availabilities,
+    }
+    template_ms = time_call(lambda: render_template(values), options.number)
+    print '  template: %8.3f ms (%.1fx as long)' % (template_ms,
+                                                  template_ms / view_ms)
+    if json.loads(render_template(values)) != json.loads(rendering):
+        print '  The renderings differ!'
+
+if __name__ == '__main__':
+    main()
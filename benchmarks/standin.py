@@ -0,0 +1,329 @@
+"""
+A stand-in for the PhillyCarShare site, for measuring the throughput and
+scaling of the whole app on one machine.  It serves the pages that the
+screenscrape sources ask for (index.php, results.php, lightbox.php,
+ajax_estimate.php, my_info.php and my_reservations.php), built from the test
+fixtures, with as many pods, profiles and pages of history as asked for, and
+with tunable latency and errors:
+    
+    python -m benchmarks.standin --port 8081 --pods 500 --history-pages 40 \
+        --latency 0.2 --jitter 0.1 --error-rate 0.01
+
+Point the sources at it with their host (and, for logging in, scheme):
+    
+    SessionScreenscrapeSource(host='localhost:8081', login_scheme='http')
+    AvailabilityScreenscrapeSource(host='localhost:8081')
+    PcsRequestMaker(host='localhost:8081')
+    LocationsScreenscrapeSource(url='http://localhost:8081/my_info.php?mv_action=dpref&mvssl')
+
+Any user id may log in, with any password but "wrong".
+"""
+import BaseHTTPServer
+import cgi
+import gzip
+import optparse
+import random
+import re
+import SocketServer
+import StringIO
+import threading
+import time
+import urlparse
+import uuid
+
+try:
+    import json
+except ImportError:
+    from django.utils import simplejson as json
+
+from benchmarks.generators import get_fixtures
+from benchmarks.generators import lightbox_page
+from benchmarks.generators import reservations_page
+from benchmarks.generators import results_payload
+from pcs.fetchers.screenscrape.pcsconnection import PcsConnection
+from pcs.fetchers.screenscrape.pcsconnection import PcsResponse
+
+LOGIN_PAGE = '<html><head><title>Please Login</title></head>' \
+    '<body>Please&nbsp;sign&nbsp;in&nbsp;below:</body></html>'
+
+PROFILES_TEMPLATE = '<html><body><table><thead><tr id="dpref_driver_pk__preferences_pk__driver_locations_pk__header"><th>Default</th><th>Name</th><th>Description</th><th></th></tr></thead><tbody id="dpref_driver_pk__preferences_pk__driver_locations_pk__profiles">%s</tbody></table></body></html>'
+PROFILE_ROW_TEMPLATE = '<tr class=""><td><input type="radio" class="profile_default" value="%s"%s></td><td class="profile_name">Location %s</td><td class="profile_descr">Walnut St &amp; S %sth St, Philadelphia, PA 19104, USA</td><td><a href="javascript:void(0);" class="profile_name">Edit</a>&nbsp;&nbsp;<a href="javascript:void(0);" class="delete_profile">Delete</a></td></tr>'
+
+def get_params(query, data):
+    """
+    @return: The parameters in the given query string and request body (a
+      string or a dict), as lists of values by name.
+    """
+    params = cgi.parse_qs(query)
+    if hasattr(data, 'items'):
+        data = data.items()
+    else:
+        data = cgi.parse_qs(data or '').items()
+    
+    for name, values in data:
+        if not isinstance(values, list):
+            values = [values]
+        params.setdefault(name, []).extend(values)
+    return params
+
+def get_session_id(cookie_header):
+    match = re.search(r'sid=([^;\s]+)', cookie_header or '')
+    if match:
+        return match.group(1)
+    return None
+
+class StandInPages (object):
+    """
+    Builds the stand-in's pages from the test fixtures.  The pages that don't
+    depend on the request are built once, up front, so that the stand-in
+    spends as little of its time as possible on anything but answering.
+    """
+    
+    def __init__(self, pods=10, vehicles_per_pod=2, profiles=4,
+                 history_pages=5, reservations_per_page=10, fixtures=None):
+        fixtures = fixtures or get_fixtures()
+        self.fixtures = fixtures
+        
+        self.signed_in_page = fixtures.ONE_CURRENT_ONE_UPCOMING_RESERVATIONS
+        self.confirmation_page = fixtures.NEW_RESERVATION_CONFIRMATION
+        
+        self.results_page = results_payload(pods, vehicles_per_pod, fixtures)
+        self.profiles_page = self.build_profiles_page(profiles)
+        self.history_pages = [
+            reservations_page(reservations_per_page, history_pages, page,
+                              3000000 + page * reservations_per_page, fixtures)
+            for page in xrange(1, history_pages + 1)]
+    
+    def build_profiles_page(self, profile_count):
+        rows = []
+        for index in xrange(profile_count):
+            checked = index == 0 and ' checked="checked"' or ''
+            rows.append(PROFILE_ROW_TEMPLATE
+                        % (18000000 + index, checked, index + 1, index + 30))
+        return PROFILES_TEMPLATE % ''.join(rows)
+    
+    def get_vehicle_page(self, vehicleid):
+        return lightbox_page(vehicleid, fixtures=self.fixtures)
+    
+    def get_price_estimate(self, vehicleid, start_stamp, end_stamp):
+        hours = max(1, (int(end_stamp) - int(start_stamp)) // 3600)
+        time_amount = hours * 9.25
+        tax_amount = round(time_amount * 0.07, 2)
+        total_amount = time_amount + tax_amount
+        
+        def amount(value):
+            return [value, '$%.2f' % value]
+        
+        return json.dumps({
+            'available_balance': amount(0),
+            'available_credit': amount(25),
+            'applied_credit': amount(0),
+            'distance': [0, '0 miles'],
+            'hourly_rate': amount(9.25),
+            'daily_rate': amount(70),
+            'time_amount': amount(time_amount),
+            'distance_amount': amount(0),
+            'tax_amount': amount(tax_amount),
+            'fee_amount': amount(0),
+            'total_amount': amount(total_amount),
+            'amount_due': amount(total_amount),
+        })
+    
+    def get_history_page(self, page_num):
+        page_num = min(max(page_num, 1), len(self.history_pages))
+        return self.history_pages[page_num - 1]
+
+    def respond(self, path, params, sessionid):
+        """
+        @param params: The query and form parameters, as parsed by
+          cgi.parse_qs.
+        @return: The (status, body, headers) to answer the given request with.
+        """
+        def param(name, default=None):
+            return params.get(name, [default])[0]
+        
+        if path == '/index.php':
+            if param('login[name]') is not None:
+                if param('login[password]') == 'wrong':
+                    return 200, LOGIN_PAGE, []
+                cookie = 'sid=%s; path=/' % uuid.uuid4().hex
+                return 200, self.signed_in_page, [('Set-Cookie', cookie)]
+        
+        if sessionid is None:
+            return 200, LOGIN_PAGE, []
+        
+        if path == '/index.php':
+            return 200, self.signed_in_page, []
+        elif path == '/results.php':
+            return 200, self.results_page, []
+        elif path == '/lightbox.php':
+            return 200, self.get_vehicle_page(
+                param('default[stack_pk]', '96692246')), []
+        elif path == '/ajax_estimate.php':
+            return 200, self.get_price_estimate(param('stack_pk'),
+                param('start_stamp', 0), param('end_stamp', 3600)), []
+        elif path == '/my_info.php':
+            return 200, self.profiles_page, []
+        elif path == '/my_reservations.php':
+            if param('mv_action') == 'confirm':
+                return 200, self.confirmation_page, []
+            if param('main[multi_filter][history][yearmonth]') is None:
+                return 200, self.signed_in_page, []
+            return 200, self.get_history_page(
+                int(param('main[dlist][page_num]', 1))), []
+        else:
+            return 404, 'Not Found', []
+
+class StandInServer (SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    Answers each request on its own thread, after latency seconds (give or
+    take up to jitter), failing a fraction error_rate of them with a 500.
+    """
+    
+    daemon_threads = True
+    allow_reuse_address = True
+    
+    def __init__(self, address, pages, latency=0, jitter=0, error_rate=0,
+                 compress=True, random=random.random, sleep=time.sleep):
+        BaseHTTPServer.HTTPServer.__init__(self, address, StandInHandler)
+        self.pages = pages
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.compress = compress
+        self.random = random
+        self.sleep = sleep
+    
+    @property
+    def host(self):
+        """
+        The host (and port) to give the sources.
+        """
+        return 'localhost:%s' % self.server_address[1]
+    
+    def delay(self):
+        wait = self.latency + self.jitter * (2 * self.random() - 1)
+        if wait > 0:
+            self.sleep(wait)
+    
+    def should_fail(self):
+        return self.error_rate and self.random() < self.error_rate
+    
+
+class StandInHandler (BaseHTTPServer.BaseHTTPRequestHandler):
+    # Keep connections open, as PCS does, so that they can be reused.
+    protocol_version = 'HTTP/1.1'
+    
+    def do_GET(self):
+        self.respond('')
+    
+    def do_POST(self):
+        length = int(self.headers.getheader('content-length') or 0)
+        self.respond(self.rfile.read(length))
+    
+    def respond(self, data):
+        path, _, query = self.path.partition('?')
+        params = get_params(query, data)
+        sessionid = get_session_id(self.headers.getheader('cookie'))
+        
+        self.server.delay()
+        if self.server.should_fail():
+            status, body, headers = 500, 'Internal Server Error', []
+        else:
+            status, body, headers = self.server.pages.respond(path, params,
+                                                               sessionid)
+        
+        if self.server.compress and \
+           'gzip' in (self.headers.getheader('accept-encoding') or ''):
+            buf = StringIO.StringIO()
+            gzip_file = gzip.GzipFile(fileobj=buf, mode='wb')
+            gzip_file.write(body)
+            gzip_file.close()
+            body = buf.getvalue()
+            headers.append(('Content-Encoding', 'gzip'))
+        
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        # Logging every request would cost more than answering it.
+        pass
+
+class StandInConnection (PcsConnection):
+    """
+    A PcsConnection that is answered by a StandInPages directly, with no
+    server or socket in between, for measuring the app's own costs.
+    """
+    
+    # Neither is any use against pages that never fail or fall behind.
+    breakers = None
+    rate_limiter = None
+    
+    def __init__(self, pages):
+        super(StandInConnection, self).__init__()
+        self.pages = pages
+    
+    def send_request(self, url, method, data, headers):
+        path, query = urlparse.urlsplit(url)[2:4]
+        params = get_params(query, data)
+        sessionid = get_session_id(headers.get('Cookie'))
+        
+        status, body, response_headers = \
+            self.pages.respond(path, params, sessionid)
+        # Named as httplib would name them.
+        return PcsResponse(status, body, [(name.lower(), value)
+                                          for name, value in response_headers])
+
+def start_standin(port=0, latency=0, jitter=0, error_rate=0, compress=True,
+                  **page_options):
+    """
+    Start a stand-in serving on a background thread.  Call its shutdown
+    method to stop it.
+    
+    @return: The StandInServer.
+    """
+    server = StandInServer(('localhost', port), StandInPages(**page_options),
+                           latency, jitter, error_rate, compress)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.setDaemon(True)
+    thread.start()
+    return server
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('--port', type='int', default=8081)
+    parser.add_option('--latency', type='float', default=0,
+                      help='seconds to take over each response')
+    parser.add_option('--jitter', type='float', default=0,
+                      help='seconds to vary the latency by, either way')
+    parser.add_option('--error-rate', type='float', default=0,
+                      help='fraction of responses that are 500 errors')
+    parser.add_option('--pods', type='int', default=10,
+                      help='pods in each search result')
+    parser.add_option('--vehicles-per-pod', type='int', default=2)
+    parser.add_option('--profiles', type='int', default=4,
+                      help='saved location profiles')
+    parser.add_option('--history-pages', type='int', default=5,
+                      help='pages in each month of reservation history')
+    parser.add_option('--reservations-per-page', type='int', default=10)
+    parser.add_option('--no-compress', action='store_false', dest='compress',
+                      default=True, help="don't gzip responses")
+    options, args = parser.parse_args()
+    
+    pages = StandInPages(options.pods, options.vehicles_per_pod,
+                         options.profiles, options.history_pages,
+                         options.reservations_per_page)
+    server = StandInServer(('', options.port), pages, options.latency,
+                           options.jitter, options.error_rate, options.compress)
+    print 'Standing in for PCS at http://%s/' % server.host
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
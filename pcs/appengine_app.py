@@ -1,3 +1,4 @@
+from google.appengine.api import users
 from google.appengine.ext import webapp
 from google.appengine.ext.webapp.util import run_wsgi_app
 
@@ -7,6 +8,10 @@ from pcs.wsgi_handlers.appengine.locations    import LocationsJsonHandler
 from pcs.wsgi_handlers.appengine.reservations import ReservationJsonHandler
 from pcs.wsgi_handlers.appengine.reservations import ReservationsJsonHandler
 from pcs.wsgi_handlers.appengine.session      import SessionJsonHandler
+from pcs.wsgi_handlers.middleware import ConditionalGetMiddleware
+from pcs.wsgi_handlers.middleware import GzipMiddleware
+from pcs.wsgi_handlers.middleware import PrettyJsonMiddleware
+from pcs.wsgi_handlers.middleware import StatsMiddleware
 
 application = webapp.WSGIApplication(
         [('/session.json', SessionJsonHandler),
@@ -17,6 +22,12 @@ application = webapp.WSGIApplication(
          ('/reservations.json', ReservationsJsonHandler)],
         debug=True)
 
+def is_admin(environ):
+    return users.is_current_user_admin()
+
+application = GzipMiddleware(ConditionalGetMiddleware(
+    PrettyJsonMiddleware(StatsMiddleware(application, is_admin))))
+
 def main():
     run_wsgi_app(application)
 
@@ -3,12 +3,45 @@
 class _SourceBase (object):
     pass
 
+class Fetch (object):
+    """
+    A call to an upstream source, split into the request that it makes and the
+    parsing of the response, so that a source can send the requests of several
+    calls at the same time (see _AvailabilitySourceInterface.fetch_each).
+    
+    The request is a tuple of (url, method, data, headers), and the result is
+    parse(response_body, response_headers, *parse_args).  A fetch whose result
+    is already known (e.g., from a cache) has no request.
+    """
+    
+    def __init__(self, request, parse=None, *parse_args):
+        self.request = request
+        self.parse = parse
+        self.parse_args = parse_args
+        self.result = None
+    
+    @classmethod
+    def done(cls, result):
+        """
+        @return: A fetch that needs no request, for a result that is already
+          known.
+        """
+        fetch = cls(None)
+        fetch.result = result
+        return fetch
+    
+    def parse_response(self, response_body, response_headers):
+        return self.parse(response_body, response_headers, *self.parse_args)
+
 class _SessionSourceInterface (object):
     def create_session(self, userid, password):
         raise NotImplementedError()
     
     def fetch_session(self, userid, sessionid):
         raise NotImplementedError()
+    
+    def prepare_session_fetch(self, userid, sessionid):
+        raise NotImplementedError()
 
 class _AvailabilitySourceInterface (object):
     def fetch_available_vehicles_near(self, sessionid, locationid, start_time, end_time):
@@ -22,6 +55,24 @@ class _AvailabilitySourceInterface (object):
     
     def fetch_updated_transaction(self, sessionid, vehicleid, start_time, end_time):
         raise NotImplementedError()
+    
+    def prepare_vehicle_availability_fetch(self, sessionid, vehicleid, start_time, end_time):
+        raise NotImplementedError()
+    
+    def prepare_vehicle_price_estimate_fetch(self, sessionid, vehicleid, start_time, end_time):
+        raise NotImplementedError()
+    
+    def fetch_each(self, fetches):
+        """
+        Send the requests of all of the given Fetches at the same time, and
+        give back each fetch's result as soon as it has one.  Closing the
+        returned generator abandons the fetches that haven't finished.
+        
+        @return: A generator of (index, result) tuples, where index is the
+          fetch's position in fetches, and result is either its result or the
+          error that it failed with.
+        """
+        raise NotImplementedError()
 
 class _ReservationsSourceInterface (object):
     def fetch_reservations(self, sessionid, year_month=None):
@@ -43,6 +94,9 @@ class _LocationsSourceInterface (object):
     def fetch_location_profiles(self, sessionid):
         raise NotImplementedError()
     
+    def fetch_location_profiles_version(self, sessionid):
+        raise NotImplementedError()
+    
     def fetch_location_profile(self, sessionid, locationid):
         raise NotImplementedError()
     
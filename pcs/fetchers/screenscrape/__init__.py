@@ -1,4 +1,6 @@
 """Package for screenscraping as a data source."""
+from util.context import current_context
+from util.htmlparsing import default_backend
 
 class ErrorWithCode (Exception):
     def __init__(self, msg=None, code=None):
@@ -11,7 +13,62 @@ class ScreenscrapeParseError (ErrorWithCode):
 class ScreenscrapeFetchError (ErrorWithCode):
     pass
 
+def record_pcs_response(body, headers):
+    """
+    Note the latest response from PCS in the current request's context, so
+    that it can be reported if the request goes wrong.
+    """
+    context = current_context()
+    if context is not None:
+        context.set('pcs_response', (body, headers))
+
+def send_each(conn, fetches):
+    """
+    Send the requests of all of the given pcs.fetchers.Fetches at the same time
+    over the connection (see PcsConnection.request_each), and parse each of
+    their responses as it arrives.  The caller may stop early, in which case
+    the fetches that haven't finished are abandoned.
+    
+    @return: A generator of (index, result) tuples, where index is the fetch's
+      position in fetches, and result is either its result or the error that
+      it failed with.
+    """
+    indexes = []
+    requests = []
+    for index, fetch in enumerate(fetches):
+        if fetch.request is None:
+            yield index, fetch.result
+        else:
+            indexes.append(index)
+            requests.append(fetch.request)
+    
+    if not requests:
+        return
+        
+    responses = conn.request_each(requests)
+    try:
+        for request_index, response in responses:
+            index = indexes[request_index]
+            if isinstance(response, Exception):
+                yield index, response
+                continue
+        
+            try:
+                response_body = response.read()
+                response_headers = response.getheaders()
+                record_pcs_response(response_body, response_headers)
+                result = fetches[index].parse_response(response_body,
+                                                       response_headers)
+            except Exception, e:
+                result = e
+            yield index, result
+    finally:
+        responses.close()
+
 class _ScreenscrapeBase (object):
+    # The parser used to build documents from PCS's HTML
+    html_backend = default_backend
+    
     def verify_pcs_response(self, response_body, response_headers=None):
         if 'Please&nbsp;sign&nbsp;in&nbsp;below:' in response_body:
             raise ScreenscrapeFetchError(
@@ -0,0 +1,221 @@
+"""
+A record of PCS's responses that a PcsConnection can play back instead of
+contacting PCS, for testing and benchmarking offline.  To record:
+    
+    cassette = Cassette(Cassette.RECORD)
+    PcsConnection.cassette = cassette
+    ... use the app as normal ...
+    cassette.save('pcs.cassette.json')
+
+and to play back, with each response taking as long as it did originally:
+    
+    PcsConnection.cassette = Cassette.load('pcs.cassette.json', latency_scale=1.0)
+
+Requests are matched on their method, url, data and headers, ignoring the
+Cookie header, so that a cassette recorded in one session can be played back
+in any other.
+
+Cassettes are meant to be shared, so the credentials in login requests and the
+session ids in Set-Cookie response headers are redacted before they are
+recorded.  A recorded login can still be played back (with any credentials),
+and gives a session whose id is the redacted value.
+"""
+import cgi
+import re
+import threading
+import time
+import urllib
+
+try:
+    import json
+except ImportError:
+    from django.utils import simplejson as json
+
+from pcs.fetchers.screenscrape.pcsconnection import PcsConnectionError
+from pcs.fetchers.screenscrape.pcsconnection import PcsResponse
+
+class Cassette (object):
+    RECORD = 'record'
+    REPLAY = 'replay'
+    
+    # Request headers that don't affect which response PCS gives.
+    IGNORED_HEADERS = ('cookie',)
+    
+    # Request fields and response headers whose values aren't to be recorded.
+    REDACTED_FIELDS = ('login[name]', 'login[password]')
+    REDACTED_HEADERS = ('set-cookie',)
+    REDACTED = 'REDACTED'
+    
+    # The parts of a Set-Cookie header that aren't a cookie's value.
+    COOKIE_ATTRIBUTES = ('path', 'domain', 'expires', 'max-age', 'version',
+                         'comment', 'secure', 'httponly')
+    
+    def __init__(self, mode=REPLAY, latency_scale=0, sleep=time.sleep):
+        """
+        @param latency_scale: On playback, how long to take over each response,
+          as a multiple of the time that it originally took.
+        """
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.sleep = sleep
+        
+        self.__lock = threading.Lock()
+        self.__interactions = {}
+        self.__played = {}
+    
+    def redact_data(self, data):
+        """
+        @return: The request data, as a string, with the values of any
+          REDACTED_FIELDS replaced.
+        """
+        if not data:
+            return ''
+        
+        if hasattr(data, 'items'):
+            fields = sorted(data.items())
+        else:
+            fields = cgi.parse_qsl(data, keep_blank_values=True)
+            if not [name for name, value in fields
+                    if name in self.REDACTED_FIELDS]:
+                return data
+        
+        return urllib.urlencode([
+            (name, name in self.REDACTED_FIELDS and self.REDACTED or value)
+            for name, value in fields])
+    
+    def redact_cookies(self, header_value):
+        """
+        @return: A Set-Cookie header value, with each cookie's value replaced.
+        """
+        def redact(match):
+            if match.group(2).lower() in self.COOKIE_ATTRIBUTES:
+                return match.group(0)
+            return '%s%s=%s' % (match.group(1), match.group(2), self.REDACTED)
+        
+        return re.sub(r'(^|[;,]\s*)([^=;,\s]+)=[^;,]*', redact, header_value)
+    
+    def redact_response_headers(self, response_headers):
+        """
+        @return: The response headers, with the values of any REDACTED_HEADERS
+          cleaned of cookies.
+        """
+        return [(name, name.lower() in self.REDACTED_HEADERS
+                       and self.redact_cookies(value) or value)
+                for name, value in response_headers]
+    
+    def get_key(self, url, method, data, headers):
+        data = self.redact_data(data)
+        
+        headers = tuple(sorted((name, value) for name, value in headers.items()
+                               if name.lower() not in self.IGNORED_HEADERS))
+        return (method, url, data, headers)
+    
+    def add(self, url, method, data, headers, status, body,
+            response_headers=(), elapsed=0):
+        """
+        Add a response to the cassette.  Several responses to the same request
+        are played back in the order they were added, the last one repeating.
+        """
+        key = self.get_key(url, method, data, headers)
+        interaction = (status, body, list(response_headers), elapsed)
+        
+        self.__lock.acquire()
+        try:
+            self.__interactions.setdefault(key, []).append(interaction)
+        finally:
+            self.__lock.release()
+    
+    def record(self, url, method, data, headers, response, elapsed):
+        response_headers = response.getheaders()
+        if hasattr(response_headers, 'items'):
+            response_headers = response_headers.items()
+        self.add(url, method, data, headers, response.status, response.read(),
+                 self.redact_response_headers(response_headers), elapsed)
+    
+    def play(self, url, method, data, headers):
+        """
+        @return: A PcsResponse for the recorded response to the given request.
+        @raise: PcsConnectionError if no response was recorded for it.
+        """
+        key = self.get_key(url, method, data, headers)
+        
+        self.__lock.acquire()
+        try:
+            interactions = self.__interactions.get(key)
+            if not interactions:
+                raise PcsConnectionError('No recorded response to %s %s' % (method, url))
+            
+            index = self.__played.get(key, 0)
+            self.__played[key] = index + 1
+            status, body, response_headers, elapsed = \
+                interactions[min(index, len(interactions) - 1)]
+        finally:
+            self.__lock.release()
+        
+        if self.latency_scale and elapsed:
+            self.sleep(elapsed * self.latency_scale)
+        return PcsResponse(status, body, list(response_headers))
+    
+    def rewind(self):
+        """
+        Play back each request's responses from the first one again.
+        """
+        self.__lock.acquire()
+        try:
+            self.__played.clear()
+        finally:
+            self.__lock.release()
+    
+    def save(self, path):
+        """
+        Write the recorded responses to a JSON file.  Bodies are stored as
+        latin-1, so that any bytes survive the trip.
+        """
+        self.__lock.acquire()
+        try:
+            entries = []
+            for key, interactions in self.__interactions.iteritems():
+                method, url, data, headers = key
+                for status, body, response_headers, elapsed in interactions:
+                    entries.append({
+                        'method': method,
+                        'url': url,
+                        'data': data,
+                        'headers': dict(headers),
+                        'status': status,
+                        'body': body.decode('latin-1'),
+                        'response_headers': response_headers,
+                        'elapsed': elapsed,
+                    })
+        finally:
+            self.__lock.release()
+        
+        cassette_file = open(path, 'w')
+        try:
+            json.dump({'interactions': entries}, cassette_file, indent=1)
+        finally:
+            cassette_file.close()
+    
+    @classmethod
+    def load(cls, path, mode=REPLAY, latency_scale=0, sleep=time.sleep):
+        """
+        @return: A Cassette with the responses saved in the given file.
+        """
+        cassette_file = open(path)
+        try:
+            saved = json.load(cassette_file)
+        finally:
+            cassette_file.close()
+        
+        cassette = cls(mode, latency_scale, sleep)
+        for entry in saved['interactions']:
+            # JSON gives back unicode, but the rest of the app deals in str.
+            headers = dict((str(name), str(value))
+                           for name, value in entry['headers'].items())
+            response_headers = [(str(name), str(value))
+                                for name, value in entry['response_headers']]
+            cassette.add(str(entry['url']), str(entry['method']),
+                         str(entry['data']), headers, entry['status'],
+                         entry['body'].encode('latin-1'), response_headers,
+                         entry['elapsed'])
+        return cassette
@@ -1,4 +1,7 @@
+import hashlib
+import logging
 import re
+import threading
 import urllib
 import Cookie as cookielib
 import HTMLParser as htmlparserlib
@@ -15,7 +18,141 @@ from pcs.fetchers.screenscrape import _ScreenscrapeBase
 from pcs.fetchers.screenscrape import ScreenscrapeParseError
 from pcs.fetchers.screenscrape.pcsconnection import PcsConnection
 from util.abstract import override
-from util.BeautifulSoup import BeautifulSoup
+from util.cache import TtlCache
+from util.context import use_context
+from util.parallel import WorkerPool
+
+def profiles_version(sessionid, profiles):
+    """
+    @return: A version for a session's location profiles, made from the
+      session id and the profiles' contents.  It only changes when they do, so
+      it's the same however many times, and in whichever process, they are
+      loaded.
+    """
+    data = [sessionid] + [
+        (profile.id, profile.name, profile.desc,
+         bool(getattr(profile, 'is_default', False)))
+        for profile in profiles]
+    return hashlib.sha1(json.dumps(data)).hexdigest()[:16]
+
+class LocationProfileIndex (object):
+    """
+    A session's location profiles, in the order that PCS lists them, indexed
+    by id.  If the index came from a cache, it has a version (see
+    profiles_version).
+    """
+    
+    def __init__(self, profiles, version=None):
+        self.profiles = profiles
+        self.version = version
+        self.default = None
+        self.by_id = {}
+        
+        for profile in profiles:
+            self.by_id.setdefault(profile.id, profile)
+            if self.default is None and profile.is_default:
+                self.default = profile
+    
+    def find(self, locationid):
+        """
+        @return: The profile with the given id, or the default profile if the
+          id is None.  None if there is no such profile.
+        """
+        if locationid is None:
+            return self.default
+        return self.by_id.get(locationid)
+
+class LocationProfileCache (object):
+    """
+    Remembers each session's location profiles, since they hardly ever change.
+    Profiles that have been remembered for longer than refresh_after seconds
+    are still used, but are re-fetched in the background, outside of any
+    request (so without a request's deadline).
+    
+    Where threads can't be started (as on AppEngine), there's no background to
+    re-fetch them in, and doing it in the request would cost it the time that
+    the cache is meant to save.  There, profiles are just used until they are
+    ttl seconds old, and then re-fetched by the next request that needs them.
+    (A task queue would run the re-fetch in some other process, which couldn't
+    update this one's cache.)
+    """
+    
+    def __init__(self, ttl=900, refresh_after=120, max_entries=1000,
+                 workers=None, stats_name='location_profile_cache'):
+        self.refresh_after = refresh_after
+        self.workers = workers or WorkerPool(max_workers=2)
+        self.indexes = TtlCache(ttl, max_entries, stats_name)
+        
+        self.__lock = threading.Lock()
+        self.__refreshing = set()
+    
+    def get(self, sessionid, fetch_profiles):
+        """
+        @param fetch_profiles: A function that fetches the list of profiles for
+          a session id from PCS.
+        @return: A LocationProfileIndex for the session.
+        """
+        entry = self.indexes.get(sessionid)
+        if entry is None:
+            return self.load(sessionid, fetch_profiles)
+        
+        fetched_at, index = entry
+        if self.indexes.timer() - fetched_at >= self.refresh_after:
+            self.refresh_later(sessionid, fetch_profiles)
+        return index
+    
+    def load(self, sessionid, fetch_profiles):
+        profiles = fetch_profiles(sessionid)
+        index = LocationProfileIndex(profiles,
+                                     profiles_version(sessionid, profiles))
+        self.indexes.set(sessionid, (self.indexes.timer(), index))
+        return index
+    
+    def refresh_later(self, sessionid, fetch_profiles):
+        self.__lock.acquire()
+        try:
+            if sessionid in self.__refreshing:
+                return
+            self.__refreshing.add(sessionid)
+        finally:
+            self.__lock.release()
+        
+        # The refresh isn't part of the request that happened to notice it
+        # was due, so it shouldn't share that request's context or deadline.
+        previous_context = use_context(None)
+        try:
+            task = self.workers.submit_in_background(self.__refresh,
+                                                     sessionid, fetch_profiles)
+        finally:
+            use_context(previous_context)
+        
+        if task is None:
+            self.__lock.acquire()
+            try:
+                self.__refreshing.discard(sessionid)
+            finally:
+                self.__lock.release()
+    
+    def __refresh(self, sessionid, fetch_profiles):
+        try:
+            try:
+                self.load(sessionid, fetch_profiles)
+            except Exception, e:
+                # Keep using the profiles we have, unless the session is gone.
+                logging.warning('Could not refresh location profiles: %s' % e)
+                if getattr(e, 'code', None) == 'invalid_session':
+                    self.forget(sessionid)
+        finally:
+            self.__lock.acquire()
+            try:
+                self.__refreshing.discard(sessionid)
+            finally:
+                self.__lock.release()
+    
+    def forget(self, sessionid):
+        self.indexes.delete(sessionid)
+
+default_profile_cache = LocationProfileCache()
 
 class LocationsScreenscrapeSource (_LocationsSourceInterface, _ScreenscrapeBase):
     """
@@ -24,9 +161,11 @@ class LocationsScreenscrapeSource (_LocationsSourceInterface, _ScreenscrapeBase)
     """
     SIMPLE_FAILURE_DOCUMENT = "<html><head><title>Please Login</title></head><body></body></html>"
     
-    def __init__(self, url="http://reservations.phillycarshare.org/my_info.php?mv_action=dpref&mvssl"):
+    def __init__(self, url="http://reservations.phillycarshare.org/my_info.php?mv_action=dpref&mvssl",
+                 profile_cache=None):
         super(LocationsScreenscrapeSource, self).__init__()
         self.__url = url
+        self.profile_cache = profile_cache
     
     def create_connection(self):
         conn = PcsConnection()
@@ -41,9 +180,11 @@ class LocationsScreenscrapeSource (_LocationsSourceInterface, _ScreenscrapeBase)
     def parse_locations_from_preferences_body(self, response_body):
         location_profiles = []
         
-        response_doc = BeautifulSoup(response_body)
-        tbody_tag = response_doc.find('tbody', 
-            {'id':'dpref_driver_pk__preferences_pk__driver_locations_pk__profiles'})
+        profiles_attrs = \
+            {'id':'dpref_driver_pk__preferences_pk__driver_locations_pk__profiles'}
+        response_doc = self.html_backend.parse(response_body,
+            only=[('tbody', profiles_attrs)])
+        tbody_tag = response_doc.find('tbody', profiles_attrs)
         
         if tbody_tag is None:
             raise ScreenscrapeParseError('No tbody found: %r' % response_body)
@@ -67,8 +208,7 @@ class LocationsScreenscrapeSource (_LocationsSourceInterface, _ScreenscrapeBase)
         
         return location_profiles
     
-    @override
-    def fetch_location_profiles(self, sessionid):
+    def download_location_profiles(self, sessionid):
         conn = self.create_connection()
         locations = None
         prefs_body, prefs_headers = \
@@ -78,18 +218,38 @@ class LocationsScreenscrapeSource (_LocationsSourceInterface, _ScreenscrapeBase)
         
         return locations
     
+    def get_location_profile_index(self, sessionid):
+        if self.profile_cache is None:
+            return LocationProfileIndex(
+                self.download_location_profiles(sessionid))
+        
+        return self.profile_cache.get(sessionid,
+                                      self.download_location_profiles)
+    
+    @override
+    def fetch_location_profiles(self, sessionid):
+        index = self.get_location_profile_index(sessionid)
+        return list(index.profiles)
+    
+    @override
+    def fetch_location_profiles_version(self, sessionid):
+        """
+        @return: The version of the profiles that fetch_location_profiles would
+          return, which changes whenever they (or the session) do; or None if
+          they aren't cached, so that there's no telling.
+        """
+        if self.profile_cache is None:
+            return None
+        return self.get_location_profile_index(sessionid).version
+    
     @override
     def fetch_location_profile(self, sessionid, locationid):
-        conn = self.create_connection()
-        locations = self.fetch_location_profiles(sessionid)
+        index = self.get_location_profile_index(sessionid)
         
-        for location in locations:
-            if locationid is None and location.is_default:
-                return location
-            elif location.id == locationid:
-                return location
-        
-        raise ScreenscrapeParseError('No location with id %r found' % locationid)
+        location = index.find(locationid)
+        if location is None:
+            raise ScreenscrapeParseError('No location with id %r found' % locationid)
+        return location
     
     @override
     def fetch_custom_location(self, location_name, location_key):
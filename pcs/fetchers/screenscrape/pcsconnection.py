@@ -1,11 +1,311 @@
 import httplib
+import Queue
+import socket
+import threading
+import time
+import urllib
+import zlib
 
-from google.appengine.api.urlfetch import DownloadError 
-from google.appengine.api.urlfetch import fetch as gaefetch
+try:
+    from google.appengine.api import apiproxy_stub_map
+    from google.appengine.api import urlfetch as gaeurlfetch
+    from google.appengine.api.urlfetch import DownloadError
+    from google.appengine.api.urlfetch import fetch as gaefetch
+except ImportError:
+    # Not running on AppEngine; only the httplib backend will be available.
+    apiproxy_stub_map = gaeurlfetch = gaefetch = None
+    class DownloadError (Exception):
+        pass
+
+from util import metrics
+from util.deadline import call_with_deadline
+from util.deadline import current_deadline
+from util.deadline import Deadline
+from util.deadline import DeadlineExceededError
+from util.parallel import SingleFlight
+from util.parallel import TaskTimeoutError
+from util.parallel import WorkerPool
+from util.ratelimit import RateLimiter
+from util.retry import CircuitBreakers
+from util.retry import RetryPolicy
 
 class PcsConnectionError (Exception):
     pass
 
+class PcsUnavailableError (PcsConnectionError):
+    """
+    Raised without contacting PCS, when it has been failing too often to be
+    worth trying.
+    """
+    pass
+
+def get_header(headers, header, default=None):
+    """
+    Look up a header, ignoring case, in either a list of (name, value) pairs
+    (as from httplib) or a mapping (as from urlfetch).
+    """
+    header = header.lower()
+    items = headers.items() if hasattr(headers, 'items') else headers
+    for name, value in items:
+        if name.lower() == header:
+            return value
+    return default
+
+class ContentDecoder (object):
+    """
+    Decompresses a gzip- or deflate-encoded response body, a chunk at a time.
+    """
+    
+    ENCODINGS = ('gzip', 'deflate')
+    
+    def __init__(self, encoding):
+        if encoding == 'gzip':
+            # Tell zlib to expect (and skip) a gzip header.
+            wbits = 16 + zlib.MAX_WBITS
+        elif encoding == 'deflate':
+            wbits = zlib.MAX_WBITS
+        else:
+            raise PcsConnectionError('Unsupported content encoding: %r' % encoding)
+        
+        self.encoding = encoding
+        self.__decompressor = zlib.decompressobj(wbits)
+        self.__started = False
+    
+    def decompress(self, chunk):
+        try:
+            data = self.__decompressor.decompress(chunk)
+        except zlib.error, ze:
+            # Some servers send "deflate" bodies without the zlib wrapper.
+            if self.encoding != 'deflate' or self.__started:
+                raise PcsConnectionError('Could not decompress response: %s' % ze)
+            self.__decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            data = self.__decompressor.decompress(chunk)
+        
+        self.__started = True
+        return data
+    
+    def flush(self):
+        return self.__decompressor.flush()
+
+class PcsResponse (object):
+    """
+    A response whose body has already been read in full.  Both request backends
+    return one of these, so that the underlying socket can go back into the
+    connection pool before the caller gets around to reading the body.
+    """
+    def __init__(self, status, body, headers, will_close=True):
+        self.status = status
+        self.body = body
+        self.headers = headers
+        self.will_close = will_close
+    
+    def read(self):
+        return self.body
+    
+    def getheaders(self):
+        return self.headers
+    
+    def getheader(self, header, default=None):
+        return get_header(self.headers, header, default)
+
+class PcsConnectionPool (object):
+    """
+    A pool of keep-alive httplib connections, keyed by (scheme, host).
+    
+    A connection is checked out with acquire, and must be handed back with
+    either release (if the socket can be used again) or discard.  At most
+    max_per_host connections to a given host will be open at one time; further
+    requests wait up to wait_timeout seconds for one to be released.  At most
+    max_idle connections per host are kept around once released, and any that
+    have been idle for longer than idle_timeout seconds are assumed to have been
+    closed by the server, and are dropped.
+    
+    The server may still close an idle connection sooner than that, and a
+    request that fails on one can't always be told apart from one that the
+    server read before it went away.  So callers that mustn't send a request
+    twice can ask for a fresh connection, which makes room for itself by
+    closing an idle one if it has to.
+    """
+    
+    def __init__(self, max_idle=4, max_per_host=8, idle_timeout=15,
+                 wait_timeout=10, stats_name='connection_pool'):
+        self.max_idle = max_idle
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.wait_timeout = wait_timeout
+        
+        self.__condition = threading.Condition()
+        self.__idle = {}
+        self.__open = {}
+        
+        self.stats = metrics.counters(stats_name,
+            'hits', 'misses', 'stale', 'discarded')
+    
+    def __close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+    
+    def __take_idle(self, key, now):
+        """
+        Pop the most recently released connection for the given key that has
+        not gone stale.  Must be called with the lock held.
+        """
+        idle = self.__idle.get(key, [])
+        while idle:
+            conn, released_at = idle.pop()
+            if now - released_at <= self.idle_timeout:
+                return conn
+            
+            self.__open[key] -= 1
+            self.stats.increment('stale')
+            self.__close(conn)
+        return None
+    
+    def __drop_idle(self, key):
+        """
+        Close the longest-idle connection for the given key, if there is one.
+        Must be called with the lock held.
+        
+        @return: Whether a connection was closed.
+        """
+        idle = self.__idle.get(key, [])
+        if not idle:
+            return False
+        
+        conn, _ = idle.pop(0)
+        self.__open[key] -= 1
+        self.__close(conn)
+        return True
+    
+    def acquire(self, scheme, host, factory, fresh=False):
+        """
+        Get a connection to the given host, either from the pool or newly made
+        by calling factory(scheme, host).  If fresh is true, the connection is
+        always newly made.
+        
+        @return: A tuple of the connection, and whether it was reused.
+        """
+        key = (scheme, host)
+        give_up_at = time.time() + self.wait_timeout
+        
+        self.__condition.acquire()
+        try:
+            while True:
+                if not fresh:
+                    conn = self.__take_idle(key, time.time())
+                    if conn is not None:
+                        self.stats.increment('hits')
+                        return conn, True
+                elif self.__open.get(key, 0) >= self.max_per_host:
+                    self.__drop_idle(key)
+                
+                if self.__open.get(key, 0) < self.max_per_host:
+                    self.__open[key] = self.__open.get(key, 0) + 1
+                    break
+                
+                remaining = give_up_at - time.time()
+                if remaining <= 0:
+                    raise PcsConnectionError(
+                        'Timed out waiting for a connection to %s' % host)
+                self.__condition.wait(remaining)
+        finally:
+            self.__condition.release()
+        
+        self.stats.increment('misses')
+        try:
+            return factory(scheme, host), False
+        except:
+            self.__forget(key)
+            raise
+    
+    def __forget(self, key):
+        self.__condition.acquire()
+        try:
+            self.__open[key] -= 1
+            self.__condition.notify()
+        finally:
+            self.__condition.release()
+    
+    def release(self, scheme, host, conn):
+        """
+        Return a connection whose last response has been read in full, so that
+        it may be reused.
+        """
+        key = (scheme, host)
+        
+        self.__condition.acquire()
+        try:
+            idle = self.__idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append((conn, time.time()))
+                conn = None
+            else:
+                self.__open[key] -= 1
+            self.__condition.notify()
+        finally:
+            self.__condition.release()
+        
+        if conn is not None:
+            self.stats.increment('discarded')
+            self.__close(conn)
+    
+    def discard(self, scheme, host, conn):
+        """
+        Close a checked-out connection that should not be reused (e.g., because
+        the server asked to close it, or because it errored).
+        """
+        self.stats.increment('discarded')
+        self.__close(conn)
+        self.__forget((scheme, host))
+    
+    def clear(self):
+        """
+        Close all of the idle connections in the pool.
+        """
+        self.__condition.acquire()
+        try:
+            idle, self.__idle = self.__idle, {}
+            for key, conns in idle.iteritems():
+                self.__open[key] -= len(conns)
+            self.__condition.notifyAll()
+        finally:
+            self.__condition.release()
+        
+        for conns in idle.itervalues():
+            for conn, released_at in conns:
+                self.__close(conn)
+
+# The pool is shared by every PcsConnection in the process.
+default_pool = PcsConnectionPool()
+
+# ...as are the threads that request_each uses for the httplib backend...
+default_workers = WorkerPool(max_workers=8)
+
+# ...and the record of which read-only requests are currently in flight.
+default_coalescer = SingleFlight(stats_name='request_coalescer')
+
+# ...and the count of recent failures of each endpoint, so that while part of
+# PCS is down every connection to it fails fast instead of waiting out its
+# deadline.
+default_breakers = CircuitBreakers(stats_name='pcs_circuit_breaker')
+
+# ...and the rate at which each kind of request may be sent to each host, as
+# (requests per second, burst size).
+default_rate_limiter = RateLimiter({
+        'search': (5, 10),
+        'lightbox': (10, 20),
+        'estimate': (10, 20),
+        'reservations': (5, 10),
+    },
+    default=(10, 20),
+    stats_name='pcs_rate_limiter')
+
+# The number of bytes that came over the wire, and what they decompressed to.
+default_transfer_stats = metrics.counters('pcs_transfer',
+    'responses', 'compressed_responses', 'wire_bytes', 'body_bytes')
+
 class PcsConnection (object):
 
     HTTP = 'http'
@@ -16,6 +316,58 @@ class PcsConnection (object):
     PUT = 'PUT'
     DELETE = 'DELETE'
     
+    GAE_BACKEND = 'gae'
+    HTTPLIB_BACKEND = 'httplib'
+    
+    # Use GAE's fetch when it's available, so that GAE pays attention to our
+    # deadlines.  Otherwise (e.g., from a Django instance), use httplib.
+    backend = GAE_BACKEND if gaefetch is not None else HTTPLIB_BACKEND
+    pool = default_pool
+    workers = default_workers
+    
+    # Identical read-only requests made at the same time (e.g., by a client
+    # that retries, or by several that poll) share one round trip to PCS.  Set
+    # to None to send every request.
+    coalescer = default_coalescer
+    
+    # Each endpoint (host and path) has its own breaker, so that one failing
+    # page doesn't keep us from the rest of PCS.  Set to None to always try
+    # PCS, however often it has failed.
+    breakers = default_breakers
+    
+    # To record PCS's responses, or to play recorded responses back instead of
+    # contacting PCS, set this to a cassette.Cassette.
+    cassette = None
+    
+    # Keeps us from sending PCS so much that it throttles (or blocks) us.  Set
+    # to None to send requests as fast as they come.
+    rate_limiter = default_rate_limiter
+    
+    # PCS is occasionally very slow to answer.  To send a second copy of a slow
+    # read-only request and take whichever answer comes first, set this to a
+    # util.parallel.Hedger, e.g.:
+    #
+    #     PcsConnection.hedger = Hedger(stats_name='pcs_hedging')
+    #
+    # It should have its own workers, not the ones that request_each uses.
+    hedger = None
+    
+    # A read-only request is safe to send again when it fails in transit; any
+    # other request may have reached PCS (and, e.g., made a reservation) before
+    # failing, so it is not retried.
+    read_retry_policy = RetryPolicy(retries=2, base_delay=0.1, max_delay=1.0)
+    write_retry_policy = RetryPolicy(retries=0)
+    
+    # Ask PCS to compress its (large) pages.  Set to None to ask for them
+    # uncompressed.
+    accept_encoding = 'gzip, deflate'
+    transfer_stats = default_transfer_stats
+    READ_CHUNK_SIZE = 16 * 1024
+    
+    DEFAULT_DEADLINE = 10
+    
+    TRANSIENT_ERRORS = (DownloadError, httplib.HTTPException, socket.error)
+    
     def parse_url(self, url):
         try:
             scheme_end = url.find('://')
@@ -36,14 +388,36 @@ class PcsConnection (object):
     
     def create_host_connection(self, scheme, host):
         if scheme == self.HTTP:
-            conn = httplib.HTTPConnection(host, timeout=10)
+            conn = httplib.HTTPConnection(host, timeout=self.DEFAULT_DEADLINE)
         elif scheme == self.HTTPS:
-            conn = httplib.HTTPSConnection(host, timeout=10)
+            conn = httplib.HTTPSConnection(host, timeout=self.DEFAULT_DEADLINE)
         else:
             raise PcsConnectionError('Unrecognized connection scheme: %r' % scheme)
         
         return conn
     
+    def get_timeout(self):
+        """
+        @return: The number of seconds that the next hop of a request may take:
+          the default deadline, or whatever remains of the current request's
+          deadline if that is less.
+        @raise: DeadlineExceededError if the current request is out of time.
+        """
+        deadline = current_deadline()
+        if deadline is None:
+            return self.DEFAULT_DEADLINE
+        return deadline.limit(self.DEFAULT_DEADLINE)
+    
+    def set_timeout(self, conn, timeout):
+        """
+        Make a (possibly pooled, already connected) host connection give up
+        after timeout seconds.
+        """
+        conn.timeout = timeout
+        sock = getattr(conn, 'sock', None)
+        if sock is not None:
+            sock.settimeout(timeout)
+    
     def make_request(self, conn, method, path, data, headers):
         if method not in (self.GET, self.PUT, self.POST, self.DELETE):
             raise PcsConnectionError('Unrecognized connection method: %r' % method)
@@ -59,12 +433,113 @@ class PcsConnection (object):
             return self.__request_helper(location, method, data, headers, follow_count-1)
         return response
     
+    def exchange_with_httplib(self, conn, method, path, data, headers):
+        """
+        Send a request over the given host connection, and read the response
+        in full.
+        """
+        self.set_timeout(conn, self.get_timeout())
+        self.make_request(conn, method, path, data, headers)
+        response = self.get_response(conn)
+        
+        response_headers = response.getheaders()
+        encoding = self.get_content_encoding(response_headers)
+        if encoding is None:
+            body = response.read()
+            self.record_transfer(len(body), len(body))
+        else:
+            # Decompress as the body comes in, rather than holding on to all of
+            # the compressed bytes first.
+            decoder = ContentDecoder(encoding)
+            chunks = []
+            wire_bytes = 0
+            while True:
+                chunk = response.read(self.READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                wire_bytes += len(chunk)
+                chunks.append(decoder.decompress(chunk))
+            chunks.append(decoder.flush())
+            body = ''.join(chunks)
+            self.record_transfer(wire_bytes, len(body))
+        
+        return PcsResponse(response.status, body, response_headers,
+                           response.will_close)
+    
+    def get_content_encoding(self, headers):
+        """
+        @return: The encoding that a response body must be decompressed from,
+          or None if it is not compressed.
+        """
+        encoding = get_header(headers, 'content-encoding')
+        if encoding is None:
+            return None
+        
+        encoding = encoding.strip().lower()
+        if encoding in ('', 'identity'):
+            return None
+        return encoding
+    
+    def record_transfer(self, wire_bytes, body_bytes):
+        stats = self.transfer_stats
+        stats.increment('responses')
+        if wire_bytes != body_bytes:
+            stats.increment('compressed_responses')
+        stats.increment('wire_bytes', wire_bytes)
+        stats.increment('body_bytes', body_bytes)
+    
+    def add_accept_encoding(self, headers):
+        """
+        @return: A copy of the request headers, asking for a compressed
+          response unless the caller has already said what it accepts.
+        """
+        headers = dict(headers)
+        if self.accept_encoding is not None:
+            headers.setdefault('Accept-Encoding', self.accept_encoding)
+        return headers
+    
     def request_with_httplib(self, url, method, data, headers):
         scheme, host, path = self.parse_url(url)
-        conn = self.create_host_connection(scheme, host)
-        self.make_request(conn, method, path, data, headers)
         
-        response = self.get_response(conn)
+        # The callers hand us an empty dict when there's no payload.
+        if not data:
+            data = None
+        headers = self.add_accept_encoding(headers)
+        if data is not None and method in (self.POST, self.PUT):
+            headers.setdefault('Content-Type', 'application/x-www-form-urlencoded')
+        
+        # PCS may close an idle socket at any time, and a request that fails
+        # on one may or may not have been read first.  Read-only requests can
+        # just be tried again, but anything else goes out on a fresh socket so
+        # that it never has to be (see write_retry_policy).
+        read_only = self.is_read_only(url, method, data)
+        
+        pool = self.pool
+        conn, reused = pool.acquire(scheme, host, self.create_host_connection,
+                                    fresh=not read_only)
+        try:
+            response = self.exchange_with_httplib(conn, method, path, data, headers)
+        except (httplib.HTTPException, socket.error):
+            pool.discard(scheme, host, conn)
+            if not reused:
+                raise
+            
+            # The server has most likely closed the idle socket out from under
+            # us; try once more on a fresh connection.
+            conn, reused = pool.acquire(scheme, host, self.create_host_connection)
+            try:
+                response = self.exchange_with_httplib(conn, method, path, data, headers)
+            except:
+                pool.discard(scheme, host, conn)
+                raise
+        except:
+            pool.discard(scheme, host, conn)
+            raise
+        
+        if response.will_close:
+            pool.discard(scheme, host, conn)
+        else:
+            pool.release(scheme, host, conn)
         return response
         
     def request_with_gae(self, url, method, data, headers):
@@ -75,46 +550,427 @@ class PcsConnection (object):
         other request method (e.g., from a Django instance).
         """
         
-        response = gaefetch(url, data, method, headers, follow_redirects=False, deadline=10)
+        headers = self.add_accept_encoding(headers)
+        response = gaefetch(url, data, method, headers, follow_redirects=False, deadline=self.get_timeout())
         
-        # Wrap the response to make it look like an HTTPResponse object
-        class ResponseWrapper (object):
-            def __init__(self, gae_response):
-                self.gae_response = gae_response
-            
-            @property
-            def status(self):
-                return self.gae_response.status_code
-            
-            def read(self):
-                return self.gae_response.content
-            
-            def getheaders(self):
-                return self.gae_response.headers
-            
-            def getheader(self, header):
-                return self.gae_response.headers[header]
+        return self.wrap_gae_response(response)
+    
+    def wrap_gae_response(self, response):
+        """
+        Wrap a urlfetch response to make it look like an HTTPResponse object,
+        decompressing its body if need be.  urlfetch only hands over the body
+        once it has all arrived, so it is decompressed in one piece.
+        """
+        body = response.content
+        encoding = self.get_content_encoding(response.headers)
+        if encoding is None:
+            self.record_transfer(len(body), len(body))
+        else:
+            decoder = ContentDecoder(encoding)
+            compressed_length = len(body)
+            body = decoder.decompress(body) + decoder.flush()
+            self.record_transfer(compressed_length, len(body))
         
-        wrapped_response = ResponseWrapper(response)
-        return wrapped_response
+        return PcsResponse(response.status_code, body, response.headers)
     
-    def __request_helper(self, url, method, data, headers, follow_count=5, retry_count=3):
-        try:
-            initial_response = self.request_with_gae(url, method, data, headers)
-#            initial_response = self.request_with_httplib(url, method, data, headers)
-            final_response = self.follow_if_redirect(initial_response, method, 
-                data, headers, follow_count)
-            return final_response
-        except DownloadError, de:
-            if retry_count > 0:
-                return self.__request_helper(url, method, data, headers, follow_count, retry_count-1)
+    def get_retry_policy(self, url, method, data):
+        """
+        @return: The RetryPolicy for requests to the given endpoint.
+        """
+        if self.is_read_only(url, method, data):
+            return self.read_retry_policy
+        else:
+            return self.write_retry_policy
+    
+    def get_breaker(self, url):
+        """
+        @return: The CircuitBreaker for the endpoint that the url is for, or
+          None if there are no breakers.
+        """
+        if self.breakers is None:
+            return None
+        
+        scheme, host, path = self.parse_url(url)
+        return self.breakers.get((host, path.split('?')[0]))
+    
+    def check_breaker(self, url):
+        """
+        @raise: PcsUnavailableError if the url's endpoint should not be
+          contacted right now.
+        """
+        breaker = self.get_breaker(url)
+        if breaker is not None and not breaker.allow_request():
+            raise PcsUnavailableError('Not connecting to %s; it has been failing' % url)
+    
+    def get_endpoint_class(self, url):
+        """
+        @return: The kind of request that the url is for, for rate limiting.
+        """
+        if '/results.php' in url:
+            return 'search'
+        elif '/lightbox.php' in url:
+            return 'lightbox'
+        elif '/ajax_estimate.php' in url:
+            return 'estimate'
+        elif '/my_reservations.php' in url:
+            return 'reservations'
+        else:
+            return 'other'
+    
+    def wait_for_rate_limit(self, url):
+        """
+        Wait until the request may be sent without going over the rate limit,
+        for as long as the current request's deadline allows.
+        
+        @raise: DeadlineExceededError if the deadline would pass first, or
+          PcsConnectionError if there is no deadline and the wait would be
+          longer than the default.
+        """
+        if self.rate_limiter is None:
+            return
+        
+        scheme, host, path = self.parse_url(url)
+        key = (host, self.get_endpoint_class(url))
+        
+        deadline = current_deadline()
+        if deadline is not None:
+            timeout = deadline.limit()
+        else:
+            timeout = self.DEFAULT_DEADLINE
+        
+        if not self.rate_limiter.acquire(key, timeout):
+            if deadline is not None:
+                raise DeadlineExceededError('Gave up on %s: the request would run out of time waiting to be sent' % url)
+            raise PcsConnectionError('Timed out waiting to send a request to %s' % url)
+    
+    def record_outcome(self, url, response=None):
+        """
+        Tell the url's breaker how a request went.  A request that failed in
+        transit has no response; one that PCS could not serve has a 5xx
+        response.
+        """
+        breaker = self.get_breaker(url)
+        if breaker is None:
+            return
+        
+        if response is None or response.status >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+    
+    def send_request(self, url, method, data, headers):
+        """
+        Make a single attempt at the request, with whichever backend is in use
+        (or from the cassette, if one is being played back).
+        """
+        cassette = self.cassette
+        if cassette is not None and cassette.mode == cassette.REPLAY:
+            return cassette.play(url, method, data, headers)
+        
+        started_at = time.time()
+        if self.backend == self.GAE_BACKEND:
+            response = self.request_with_gae(url, method, data, headers)
+        else:
+            response = self.request_with_httplib(url, method, data, headers)
+        
+        if cassette is not None:
+            cassette.record(url, method, data, headers, response,
+                            time.time() - started_at)
+        return response
+    
+    def __request_helper(self, url, method, data, headers, follow_count=5):
+        retry_policy = self.get_retry_policy(url, method, data)
+        attempt = 0
+        
+        while True:
+            self.check_breaker(url)
+            self.wait_for_rate_limit(url)
+            try:
+                initial_response = self.send_request(url, method, data, headers)
+            except self.TRANSIENT_ERRORS, de:
+                # Running out of our own time says nothing about PCS.
+                deadline = current_deadline()
+                if deadline is not None and deadline.expired():
+                    raise DeadlineExceededError('Gave up on %s: %s' % (url, de))
+                
+                self.record_outcome(url, None)
+                if attempt >= retry_policy.retries:
+                    raise PcsConnectionError('Failed to connect to %s after %d attempt(s): %s' % (url, attempt + 1, de))
+                
+                # Back off, so that retries don't pile onto a struggling PCS,
+                # but not for longer than the request has left.
+                retry_policy.wait(attempt, self.get_timeout())
+                attempt += 1
             else:
-                raise PcsConnectionError('Failed to connect to %s after max retry count: %s' % (url, de))
+                break
+            
+        self.record_outcome(url, initial_response)
+        
+        # Since the initial response has been read in full, its connection
+        # is already back in the pool, ready for the redirect to use.
+        final_response = self.follow_if_redirect(initial_response, method, 
+            data, headers, follow_count)
+        return final_response
+    
+    def is_read_only(self, url, method, data):
+        """
+        Check whether the request only reads from PCS, so that its response can
+        be shared with identical requests.
+        """
+        if method == self.GET:
+            return True
+        
+        # Asking lightbox.php about a particular vehicle changes nothing; any
+        # other lightbox.php request (e.g., for a transaction id) may.
+        if method == self.POST and '/lightbox.php' in url \
+           and isinstance(data, basestring):
+            return 'default[stack_pk]' in urllib.unquote(data)
+        
+        return False
+    
+    def get_coalescing_key(self, url, method, data, headers):
+        """
+        @return: A key that identical requests share, or None if the request
+          must not share a response with any other.
+        """
+        if self.coalescer is None or not self.is_read_only(url, method, data):
+            return None
+        
+        if hasattr(data, 'items'):
+            data = tuple(sorted(data.items()))
+        return (url, method, data, tuple(sorted(headers.items())))
     
     def request(self, url, method, data, headers):
         """
         This should be the only method in the public interface.  Get a response
         from the given url, following any redirects.
         """
-        return self.__request_helper(url, method, data, headers, 5, 0)
+        key = self.get_coalescing_key(url, method, data, headers)
+        if key is None:
+            return self.__send(url, method, data, headers)
+        
+        return self.coalescer.do(key, self.__send,
+                                 url, method, data, headers)
+    
+    def __send(self, url, method, data, headers):
+        if self.hedger is not None and self.is_read_only(url, method, data):
+            return self.hedger.call(self.__request_helper,
+                                    url, method, data, headers)
+        
+        return self.__request_helper(url, method, data, headers)
+
+    def normalize_batch_request(self, batch_request):
+        """
+        Fill in the deadline of a request given to request_each, if it has
+        none.
+        
+        @return: A tuple of (url, method, data, headers, deadline)
+        """
+        if len(batch_request) == 4:
+            return tuple(batch_request) + (self.DEFAULT_DEADLINE,)
+        elif len(batch_request) == 5:
+            return tuple(batch_request)
+        else:
+            raise PcsConnectionError('Unrecognized batch request: %r' % (batch_request,))
+    
+    def as_batch_error(self, url, error):
+        """
+        @return: The error to give back for a request in a batch that failed
+          with the given error.  Errors that already say what went wrong (as a
+          PcsConnectionError, or with a code) are given back as they are.
+        """
+        if isinstance(error, PcsConnectionError) or hasattr(error, 'code'):
+            return error
+        return PcsConnectionError('Failed to connect to %s: %s' % (url, error))
+    
+    def start_gae_fetch(self, url, method, data, headers, deadline):
+        """
+        Start a request as an asynchronous urlfetch RPC that gives up when the
+        given Deadline passes.
+        
+        @return: The RPC.
+        """
+        self.check_breaker(url)
+        self.wait_for_rate_limit(url)
+        
+        rpc = gaeurlfetch.create_rpc(deadline=deadline.limit())
+        gaeurlfetch.make_fetch_call(rpc, url, data, method,
+                                    self.add_accept_encoding(headers),
+                                    follow_redirects=False)
+        return rpc
+    
+    def finish_gae_fetch(self, rpc, url, method, data, headers, deadline):
+        """
+        Collect the result of a request started with start_gae_fetch, following
+        any redirects before the given Deadline passes.
+        
+        @return: The response.
+        """
+        try:
+            response = self.wrap_gae_response(rpc.get_result())
+        except self.TRANSIENT_ERRORS, de:
+            # Running out of our own time says nothing about PCS.
+            if deadline.expired():
+                raise DeadlineExceededError('Gave up on %s: %s' % (url, de))
+            
+            self.record_outcome(url, None)
+            raise PcsConnectionError('Failed to connect to %s: %s' % (url, de))
+        
+        self.record_outcome(url, response)
+        return self.follow_if_redirect(response, method, data, headers, 5)
+    
+    def wait_for_any_rpc(self, rpcs):
+        """
+        @return: Whichever of the urlfetch RPCs finishes first.
+        """
+        return apiproxy_stub_map.UserRPC.wait_any(rpcs)
+    
+    def request_each_with_gae(self, batch_requests):
+        """
+        Start all of the requests as asynchronous urlfetch RPCs, and then
+        collect each one as it finishes.  RPCs that are still pending if the
+        caller stops early are simply abandoned; urlfetch can't cancel them.
+        """
+        rpcs = []
+        for index, (url, method, data, headers, seconds) in enumerate(batch_requests):
+            deadline = Deadline(seconds)
+            try:
+                rpc = call_with_deadline(deadline, self.start_gae_fetch,
+                                         url, method, data, headers, deadline)
+            except Exception, e:
+                rpc = self.as_batch_error(url, e)
+            rpcs.append((rpc, index, deadline))
+        
+        pending = []
+        for rpc, index, deadline in rpcs:
+            if isinstance(rpc, Exception):
+                yield index, rpc
+            else:
+                pending.append((rpc, index, deadline))
+            
+        while pending:
+            finished = self.wait_for_any_rpc([rpc for rpc, index, deadline in pending])
+            for rpc, index, deadline in pending:
+                if rpc is finished:
+                    pending.remove((rpc, index, deadline))
+                    break
+            
+            url, method, data, headers, seconds = batch_requests[index]
+            try:
+                response = call_with_deadline(deadline, self.finish_gae_fetch,
+                    rpc, url, method, data, headers, deadline)
+            except Exception, e:
+                response = self.as_batch_error(url, e)
+            yield index, response
+        
+    def request_each_with_threads(self, batch_requests):
+        """
+        Make each of the requests on its own worker thread, and collect each
+        one as it finishes (or as its deadline passes).  Requests that haven't
+        started by the time the caller stops are cancelled.
+        
+        Each request runs with its own deadline, so one that has already
+        started when its deadline passes gives up on its own, rather than
+        holding on to its worker.
+        """
+        finished = Queue.Queue()
+        tasks = []
+        deadlines = []
+        for index, (url, method, data, headers, seconds) in enumerate(batch_requests):
+            deadline = Deadline(seconds)
+            task = self.workers.submit(call_with_deadline, deadline,
+                                       self.request, url, method, data, headers)
+            task.add_done_callback(lambda task, index=index: finished.put(index))
+            tasks.append(task)
+            deadlines.append(deadline)
+        
+        pending = set(range(len(tasks)))
+        try:
+            while pending:
+                for index in sorted(pending):
+                    if deadlines[index].expired() and not tasks[index].done():
+                        url, seconds = batch_requests[index][0], batch_requests[index][4]
+                        tasks[index].cancel()
+                        pending.remove(index)
+                        yield index, DeadlineExceededError('Request to %s did not finish within %s seconds' % (url, seconds))
+                if not pending:
+                    break
+        
+                try:
+                    index = finished.get(True, min([deadlines[index].remaining()
+                                                    for index in pending]))
+                except Queue.Empty:
+                    continue
+                if index not in pending:
+                    continue
+    
+                pending.remove(index)
+                url = batch_requests[index][0]
+                try:
+                    yield index, tasks[index].result()
+                except Exception, e:
+                    yield index, self.as_batch_error(url, e)
+        finally:
+            for index in pending:
+                tasks[index].cancel()
+    
+    def request_each(self, batch_requests):
+        """
+        Make several independent requests at the same time, rather than one
+        after another, and yield each response as it arrives.  The caller may
+        stop early (by closing the generator, or just dropping it) once it has
+        what it needs; requests that haven't been sent yet are then not sent,
+        and ones that are under way are no longer waited on.
+        
+        Each of the batch_requests is a tuple of (url, method, data, headers),
+        as would be passed to request, optionally followed by a deadline in
+        seconds for that request.
+        
+        @return: A generator of (index, response) tuples, where index is the
+          request's position in batch_requests.  The response is either the
+          response (with any redirects followed), or the error that explains
+          why there is no response: a PcsConnectionError, or a
+          DeadlineExceededError if the request ran out of time.
+        """
+        batch_requests = [self.normalize_batch_request(batch_request)
+                          for batch_request in batch_requests]
+        
+        # No request in the batch may outlast the request that it's made for.
+        pending = []
+        request_deadline = current_deadline()
+        for index, (url, method, data, headers, seconds) in enumerate(batch_requests):
+            if request_deadline is not None:
+                try:
+                    seconds = request_deadline.limit(seconds)
+                except DeadlineExceededError, e:
+                    yield index, e
+                    continue
+            pending.append((index, (url, method, data, headers, seconds)))
+        
+        pending_requests = [batch_request for index, batch_request in pending]
+        
+        # Cassettes only see requests that go through send_request.
+        if self.backend == self.GAE_BACKEND and self.cassette is None:
+            responses = self.request_each_with_gae(pending_requests)
+        else:
+            responses = self.request_each_with_threads(pending_requests)
 
+        try:
+            for pending_index, response in responses:
+                yield pending[pending_index][0], response
+        finally:
+            responses.close()
+    
+    def request_many(self, batch_requests):
+        """
+        Make several independent requests at the same time, and wait for all
+        of them (see request_each), so that the batch takes about as long as
+        the slowest request instead of the sum of all of them.
+        
+        @return: A list with an entry for each request, in the same order: the
+          response, or the error that explains why there is no response.
+        """
+        responses = [None] * len(batch_requests)
+        for index, response in self.request_each(batch_requests):
+            responses[index] = response
+        return responses
@@ -22,7 +22,7 @@ from pcs.fetchers.screenscrape import ScreenscrapeParseError
 from pcs.fetchers.screenscrape.pcsconnection import PcsConnection
 from pcs.fetchers.screenscrape.availability import AvailabilityScreenscrapeSource
 from util.abstract import override
-from util.BeautifulSoup import BeautifulSoup
+from util.htmlparsing import default_backend
 from util.TimeZone import Eastern
 from util.TimeZone import to_timestamp
 from util.TimeZone import to_pcs_date_time
@@ -226,6 +226,14 @@ class PcsRequestMaker (object):
         return (response.read(), response.getheaders())
 
 class PcsDocumentDecoder(object):
+    # The elements that each kind of document is decoded from.  Only these
+    # need to be parsed out of PCS's (rather large) pages.
+    LOG_DOC_PARTS = (('table', {'id': 'main_dlist_'}),
+                     ('table', {'id': 'dlist_pagination'}))
+    CONFIRMATION_DOC_PARTS = (('span', {'id': 'confirm_id_'}),
+                              ('table', {'class': 'mi'}),
+                              ('span', {'id': 'confirm_trip_estimate_pk_'}))
+    
     def get_text_from_element(self, td):
         td_text = td.text
         return td_text
@@ -605,6 +613,8 @@ class PcsDocumentDecoder(object):
         
 
 class ReservationsScreenscrapeSource (_ReservationsSourceInterface):
+    # The parser used to build documents from PCS's HTML
+    html_backend = default_backend
     
     def __init__(self,
                  requester = None,
@@ -617,8 +627,8 @@ class ReservationsScreenscrapeSource (_ReservationsSourceInterface):
     def get_pcs_connection(self):
         return PcsConnection()
     
-    def get_html_document(self, response_body):
-        html_document = BeautifulSoup(response_body)
+    def get_html_document(self, response_body, parts=None):
+        html_document = self.html_backend.parse(response_body, only=parts)
         return html_document
     
     @override
@@ -632,7 +642,8 @@ class ReservationsScreenscrapeSource (_ReservationsSourceInterface):
             pcs_body, pcs_head = \
                 self.requester.request_past_reservations_from_pcs(conn, sessionid, year_month.year, year_month.month)
         
-        reservations_html_doc = self.get_html_document(pcs_body)
+        reservations_html_doc = self.get_html_document(pcs_body,
+            self.decoder.LOG_DOC_PARTS)
         reservations = \
             self.decoder.build_reservation_log_from_log_doc(
                 reservations_html_doc)
@@ -687,7 +698,8 @@ class ReservationsScreenscrapeSource (_ReservationsSourceInterface):
             self.requester.request_cancel_reservation_from_pcs(
                 conn, sessionid, liveid, transactionid, vehicleid, start_time, end_time)
         
-        conf_html_doc = self.get_html_document(pcs_body)
+        conf_html_doc = self.get_html_document(pcs_body,
+            self.decoder.CONFIRMATION_DOC_PARTS)
         logid, start_time, end_time, vehicleid, modelname, podid, podname, memo, pricetotal = \
             self.decoder.decode_reservation_info_from_confirmation_doc(
                 conf_html_doc)
@@ -699,7 +711,8 @@ class ReservationsScreenscrapeSource (_ReservationsSourceInterface):
             self.requester.request_confirm_reservation_from_pcs(
                 conn, sessionid, liveid)
         
-        conf_html_doc = self.get_html_document(pcs_body)
+        conf_html_doc = self.get_html_document(pcs_body,
+            self.decoder.CONFIRMATION_DOC_PARTS)
         logid, start_time, end_time, vehicleid, modelname, podid, podname, memo, pricetotal = \
             self.decoder.decode_reservation_info_from_confirmation_doc(
                 conf_html_doc)
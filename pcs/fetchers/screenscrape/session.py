@@ -4,9 +4,11 @@ import Cookie as cookielib
 import HTMLParser as htmlparserlib
 
 from pcs.data.session import Session
+from pcs.fetchers import Fetch
 from pcs.fetchers import _SessionSourceInterface
 from pcs.fetchers import SessionExpiredError
 from pcs.fetchers import SessionLoginError
+from pcs.fetchers.screenscrape import record_pcs_response
 from pcs.fetchers.screenscrape import ScreenscrapeParseError
 from pcs.fetchers.screenscrape.pcsconnection import PcsConnection
 from util.abstract import override
@@ -19,10 +21,11 @@ class SessionScreenscrapeSource (_SessionSourceInterface):
     SIMPLE_FAILURE_DOCUMENT = "<html><head><title>Please Login</title></head><body></body></html>"
     
     def __init__(self, host="reservations.phillycarshare.org",
-                 path="/index.php"):
+                 path="/index.php", login_scheme="https"):
         super(SessionScreenscrapeSource, self).__init__()
         self.__host = host
         self.__path = path
+        self.__login_scheme = login_scheme
     
     def login_to_pcs(self, conn, userid, password):
         """
@@ -35,11 +38,21 @@ class SessionScreenscrapeSource (_SessionSourceInterface):
         parameters = urllib.urlencode({
             'login[name]': userid,
             'login[password]': password})
-        response = conn.request('https://' + self.__host + self.__path, "POST",
+        response = conn.request(
+            self.__login_scheme + '://' + self.__host + self.__path, "POST",
             parameters, {})
         
         return (response.read(), response.getheaders())
     
+    def reconnect_request(self, sessionid):
+        """
+        @return: The (url, method, data, headers) of a request that loads the
+          session with the given id.
+        """
+        headers = {
+            'Cookie': 'sid=%s' % sessionid}
+        return ('http://' + self.__host + self.__path, "POST", {}, headers)
+    
     def reconnect_to_pcs(self, conn, sessionid):
         """
         Attempts to load a session from the connection with the given session
@@ -48,10 +61,8 @@ class SessionScreenscrapeSource (_SessionSourceInterface):
         @return: The server response.  If reconnection failed, the response
           body should be identifiable as an invalid session.
         """
-        headers = {
-            'Cookie': 'sid=%s' % sessionid}
-        response = conn.request('http://' + self.__host + self.__path, "POST", 
-            {}, headers)
+        url, method, data, headers = self.reconnect_request(sessionid)
+        response = conn.request(url, method, data, headers)
         
         return (response.read(), response.getheaders())
     
@@ -126,8 +137,7 @@ class SessionScreenscrapeSource (_SessionSourceInterface):
         
         pcs_login_body, pcs_login_headers = \
             self.login_to_pcs(conn, userid, password)
-        self._body = pcs_login_body
-        self._headers = pcs_login_headers
+        record_pcs_response(pcs_login_body, pcs_login_headers)
         
         if self.body_is_valid_session(pcs_login_body):
             return self.create_session_from_login_response(
@@ -135,20 +145,28 @@ class SessionScreenscrapeSource (_SessionSourceInterface):
         else:
             raise SessionLoginError('Incorrect user id/password combinantion.')
     
+    def session_from_reconnect_response(self, response_body, response_headers, userid, sessionid):
+        if self.body_is_valid_session(response_body):
+            return self.create_session_from_reconnect_response(
+                userid, sessionid, response_body, response_headers)
+        else:
+            raise SessionExpiredError('Your session has expired.')
+    
     @override
     def fetch_session(self, userid, sessionid):
         conn = self.create_host_connection()
         
         pcs_reconnect_body, pcs_reconnect_headers = \
             self.reconnect_to_pcs(conn, sessionid)
-        self._body = pcs_reconnect_body
-        self._headers = pcs_reconnect_headers
+        record_pcs_response(pcs_reconnect_body, pcs_reconnect_headers)
         
-        if self.body_is_valid_session(pcs_reconnect_body):
-            return self.create_session_from_reconnect_response(
-                userid, sessionid, pcs_reconnect_body, pcs_reconnect_headers)
-        else:
-            raise SessionExpiredError('Your session has expired.')
+        return self.session_from_reconnect_response(
+            pcs_reconnect_body, pcs_reconnect_headers, userid, sessionid)
+    
+    @override
+    def prepare_session_fetch(self, userid, sessionid):
+        return Fetch(self.reconnect_request(sessionid),
+                     self.session_from_reconnect_response, userid, sessionid)
 
 class SessionParseError (Exception):
     pass
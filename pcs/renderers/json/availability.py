@@ -1,56 +1,74 @@
-import datetime
-import os
-
-from google.appengine.ext.webapp import template
-
 from pcs.renderers import _AvailabilityViewInterface
+from pcs.renderers.json.encoding import date
+from pcs.renderers.json.encoding import dumps
+from pcs.renderers.json.encoding import lookup
+from pcs.renderers.json.encoding import number
+from pcs.renderers.json.encoding import text
 from util.abstract import override
-from util.TimeZone import to_xchange_time
 
 class AvailabilityJsonView (_AvailabilityViewInterface):
-    def __init__(self, render_method=template.render):
-        self.render_method = render_method
+    def format_location_data(self, location):
+        location_id = lookup(location, 'id')
+        if isinstance(location_id, tuple):
+            location_id = '%s,%s' % location_id
+        
+        return {
+            'id' : text(location_id),
+            'name' : text(lookup(location, 'name')),
+        }
+    
+    def format_vehicle_data(self, vehicle):
+        return {
+            'id' : text(lookup(vehicle, 'id')),
+            'pod' : {
+                'id' : text(lookup(vehicle, 'pod', 'id')),
+                'name' : text(lookup(vehicle, 'pod', 'name')),
+            },
+            'model' : {
+                'id' : text(lookup(vehicle, 'model', 'id')),
+                'name' : text(lookup(vehicle, 'model', 'name')),
+            },
+        }
+    
+    def format_vehicle_availability_data(self, vehicle_availability):
+        return {
+            'vehicle' : self.format_vehicle_data(
+                lookup(vehicle_availability, 'vehicle')),
+            'earliest' : date(lookup(vehicle_availability, 'earliest')),
+            'latest' : date(lookup(vehicle_availability, 'latest')),
+            'availability' : text(lookup(vehicle_availability, 'availability')),
+        }
     
     @override
     def render_location_availability(self, session, location, start_time, end_time, vehicle_availabilities):
         """
         Return a response with vehicle availability near a given location
         """
-        class LocationCopy (object):
-            def __init__(self, location):
-                self.name = location.name
-                if isinstance(location.id, tuple):
-                    self.id = '%s,%s' % location.id
-                else:
-                    self.id = location.id
-        
-        values = {
-            'session': session,
-            'location': location if isinstance(location, str) else LocationCopy(location),
-            'start_time': start_time,
-            'end_time': end_time,
-            'start_stamp': to_xchange_time(start_time),
-            'end_stamp': to_xchange_time(end_time),
-            'vehicle_availabilities': vehicle_availabilities
-        }
-        
-        path = os.path.join(os.path.dirname(__file__), 'location_availability.json')
-        response = self.render_method(path, values)
-        return response
+        data = {'location_availability':{
+            'location' : self.format_location_data(location),
+            'start_time' : date(start_time),
+            'end_time' : date(end_time),
+            'vehicle_availabilities' : [
+                self.format_vehicle_availability_data(vehicle_availability)
+                for vehicle_availability in vehicle_availabilities],
+        }}
+        return dumps(data)
     
     @override
     def render_vehicle_availability(self, session, vehicle_availability):
         """
         Return a response with the availability of the given vehicle
         """
-        values = {
-            'session': session,
-            'vehicle': vehicle_availability.vehicle,
-            'start_time': vehicle_availability.start_time,
-            'end_time': vehicle_availability.end_time,
-            'price': vehicle_availability.price
-        }
+        vehicle_data = self.format_vehicle_data(vehicle_availability.vehicle)
+        del vehicle_data['model']['id']
         
-        path = os.path.join(os.path.dirname(__file__), 'vehicle_availability.json')
-        response = self.render_method(path, values)
-        return response
+        data = {'vehicle_availability':{
+            'start_time' : date(vehicle_availability.start_time),
+            'end_time' : date(vehicle_availability.end_time),
+            'vehicle' : vehicle_data,
+            'price' : {
+                'total_amount' : number(
+                    lookup(vehicle_availability.price, 'total_amount')),
+            },
+        }}
+        return dumps(data)
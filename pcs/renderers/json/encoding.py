@@ -0,0 +1,63 @@
+"""
+Helpers for the JSON views.  Responses are written compactly, with no
+whitespace between tokens; clients that want to read them can ask the WSGI
+layer for pretty ones (see pcs.wsgi_handlers.middleware).
+
+The views look up and write their values as the Django templates that they
+used to render through did, so that the values in the responses stay the same.
+"""
+try:
+    import json
+except ImportError:
+    from django.utils import simplejson as json
+
+# The templates wrote times with the date filter, as "Y-m-d\TH:i".
+DATE_FORMAT = '%Y-%m-%dT%H:%M'
+
+COMPACT_SEPARATORS = (',', ':')
+
+def dumps(data):
+    """
+    @return: The data as compact JSON.
+    """
+    # Sorting the keys would keep json from using its C encoder, which is
+    # several times faster.
+    return json.dumps(data, separators=COMPACT_SEPARATORS)
+
+def lookup(obj, *names):
+    """
+    Look up obj.name1.name2..., as a template variable would be.
+    
+    @return: The value, or '' if any of the attributes is missing.
+    """
+    for name in names:
+        try:
+            obj = getattr(obj, name)
+        except AttributeError:
+            return ''
+    return obj
+
+def text(value):
+    """
+    @return: The value as a string, as the templates wrote it (so None is
+      "None").
+    """
+    if not isinstance(value, basestring):
+        value = unicode(value)
+    return value
+
+def date(value):
+    """
+    @return: The date and time as a string, or '' if there's none.
+    """
+    if not value:
+        return ''
+    return value.strftime(DATE_FORMAT)
+
+def number(value):
+    """
+    @return: The value if it's a number, or None.
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, long, float)):
+        return None
+    return value
@@ -1,12 +1,5 @@
-import os
-from google.appengine.ext.webapp import template
-
-try:
-    import json
-except ImportError:
-    from django.utils import simplejson as json
-
 from pcs.renderers import _ErrorViewInterface
+from pcs.renderers.json.encoding import dumps
 from util.abstract import override
 
 class ErrorJsonView (_ErrorViewInterface):
@@ -23,5 +16,5 @@ class ErrorJsonView (_ErrorViewInterface):
             }
         }
         
-        return json.dumps(data);
+        return dumps(data);
 
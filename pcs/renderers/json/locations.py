@@ -1,22 +1,20 @@
-import datetime
-import os
-
-from google.appengine.ext.webapp import template
-
 from pcs.renderers import _LocationsViewInterface
+from pcs.renderers.json.encoding import dumps
+from pcs.renderers.json.encoding import lookup
+from pcs.renderers.json.encoding import text
 from util.abstract import override
-from util.TimeZone import Eastern
 
 class LocationsJsonView (_LocationsViewInterface):
+    def format_location_data(self, location):
+        return {
+            'id' : text(lookup(location, 'id')),
+            'name' : text(lookup(location, 'name')),
+            'is_default' : bool(lookup(location, 'is_default')),
+        }
+    
     @override
     def render_locations(self, session, locations):
+        data = {'locations': [self.format_location_data(location)
+                              for location in locations]}
+        return dumps(data)
         
-        values = {
-            'session': session,
-            'locations': locations,
-        }
-        
-        path = os.path.join(os.path.dirname(__file__), 'locations.json')
-        response = template.render(path, values)
-        return response
-
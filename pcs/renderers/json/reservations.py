@@ -1,12 +1,8 @@
 import datetime
 import os
 
-try:
-    import json
-except ImportError:
-    from django.utils import simplejson as json
-
 from pcs.renderers import _ReservationsViewInterface
+from pcs.renderers.json.encoding import dumps
 from util.abstract import override
 from util.TimeZone import to_isostring
 
@@ -55,8 +51,7 @@ class ReservationsJsonView (_ReservationsViewInterface):
             res_data = self.format_res_data(reservation)
             data['reservation_list']['reservations'].append(res_data)
         
-        # Sort the keys, so that tests are repeatable.
-        return json.dumps(data, sort_keys=True, indent=2)
+        return dumps(data)
     
     @override
     def render_confirmation(self, session, reservation, event):
@@ -65,11 +60,11 @@ class ReservationsJsonView (_ReservationsViewInterface):
             'event' : event
         }}
         
-        return json.dumps(data, sort_keys=True, indent=2)
+        return dumps(data)
     
     @override
     def render_reservation(self, session, reservation):
         data = {'reservation':self.format_res_data(reservation)}
-        return json.dumps(data, sort_keys=True, indent=2)
+        return dumps(data)
 
 
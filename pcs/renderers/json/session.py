@@ -1,7 +1,7 @@
-import os
-from google.appengine.ext.webapp import template
-
 from pcs.renderers import _SessionViewInterface
+from pcs.renderers.json.encoding import dumps
+from pcs.renderers.json.encoding import lookup
+from pcs.renderers.json.encoding import text
 from util.abstract import override
 
 class SessionJsonView (_SessionViewInterface):
@@ -13,11 +13,10 @@ class SessionJsonView (_SessionViewInterface):
         if session is None:
         		raise Exception('No session found.');
         
-        values = {
-            'session': session
-        }
+        data = {'session':{
+            'id' : text(lookup(session, 'id')),
+            'userid' : text(lookup(session, 'user')),
+            'name' : text(lookup(session, 'name')),
+        }}
+        return dumps(data)
         
-        path = os.path.join(os.path.dirname(__file__), 'session.json')
-        response = template.render(path, values)
-        return response
-    
@@ -1,11 +1,7 @@
 from pcs.wsgi_handlers.base import _SessionBasedHandler
 from pcs.wsgi_handlers.base import _TimeRangeBasedHandler
 from pcs.wsgi_handlers.base import WsgiParameterError
-from pcs.fetchers.screenscrape.session import SessionScreenscrapeSource
-from pcs.fetchers.screenscrape.availability import AvailabilityScreenscrapeSource
-from pcs.fetchers.screenscrape.locations import LocationsScreenscrapeSource
-from pcs.renderers.json.availability import AvailabilityJsonView
-from pcs.renderers.json.error import ErrorJsonView
+from pcs.wsgi_handlers.registry import default_registry
 from util.abstract import override
 from util.TimeZone import Eastern
 
@@ -102,12 +98,20 @@ class VehicleAvailabilityHandler (_SessionBasedHandler, _TimeRangeBasedHandler):
         try:
             userid = self.get_user_id()
             sessionid = self.get_session_id()
-            session = self.get_session(userid, sessionid)
             start_time, end_time = self.get_ceiled_time_range()
             
-            vehicle_availability = self.vehicle_source.fetch_vehicle_availability(sessionid, vehicleid, start_time, end_time)
-            price = self.vehicle_source.fetch_vehicle_price_estimate(sessionid, vehicleid, start_time, end_time)
+            # None of these depend on each other, so send them all at once.
+            session_fetch = self.prepare_session_fetch(userid, sessionid)
+            session, vehicle_availability, price = self.fetch_all(
+                self.vehicle_source,
+                session_fetch,
+                self.vehicle_source.prepare_vehicle_availability_fetch(
+                    sessionid, vehicleid, start_time, end_time),
+                self.vehicle_source.prepare_vehicle_price_estimate_fetch(
+                    sessionid, vehicleid, start_time, end_time))
             
+            if session_fetch.request is not None:
+                self.remember_session(session)
             vehicle_availability.price = price
             
             response_body = self.vehicle_view.render_vehicle_availability(
@@ -120,20 +124,30 @@ class VehicleAvailabilityHandler (_SessionBasedHandler, _TimeRangeBasedHandler):
         self.response.set_status(200);
 
 class LocationAvailabilityJsonHandler (LocationAvailabilityHandler):
+    registry = default_registry
+    
     def __init__(self):
+        registry = self.registry
         super(LocationAvailabilityJsonHandler, self).__init__(
-            SessionScreenscrapeSource(),
-            AvailabilityScreenscrapeSource(),
-            LocationsScreenscrapeSource(),
-            AvailabilityJsonView(),
-            ErrorJsonView())
+            registry.session_source(),
+            registry.availability_source(),
+            registry.locations_source(),
+            registry.availability_json_view(),
+            registry.error_json_view())
+        
+        self.session_cache = registry.session_cache
     
 class VehicleAvailabilityJsonHandler (VehicleAvailabilityHandler):
+    registry = default_registry
+    
     def __init__(self):
+        registry = self.registry
         super(VehicleAvailabilityJsonHandler, self).__init__(
-            SessionScreenscrapeSource(),
-            AvailabilityScreenscrapeSource(),
-            AvailabilityJsonView(),
-            ErrorJsonView())
+            registry.session_source(),
+            registry.availability_source(),
+            registry.availability_json_view(),
+            registry.error_json_view())
+        
+        self.session_cache = registry.session_cache
     
 
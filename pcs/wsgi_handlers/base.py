@@ -8,6 +8,12 @@ try:
 except ImportError:
     from django.utils import simplejson as json
 
+from pcs.fetchers import Fetch
+from pcs.fetchers import SessionExpiredError
+from pcs.wsgi_handlers.middleware import etag_matches
+from util.cache import TtlCache
+from util.context import begin_request
+from util.deadline import start_deadline
 from util.TimeZone import Eastern
 from util.TimeZone import from_isostring
 from util.TimeZone import from_timestamp
@@ -15,12 +21,63 @@ from util.TimeZone import from_timestamp
 class WsgiParameterError (Exception):
     pass
 
+class SessionCache (object):
+    """
+    Remembers the sessions that PCS has recently confirmed to be valid, and the
+    session ids that it has recently said are expired, so that not every
+    request has to check with PCS first.
+    """
+    
+    _EXPIRED = object()
+    
+    def __init__(self, ttl=120, expired_ttl=30, max_entries=5000,
+                 stats_name='session_cache'):
+        self.expired_ttl = expired_ttl
+        self.sessions = TtlCache(ttl, max_entries, stats_name)
+    
+    def get(self, sessionid):
+        """
+        @return: The remembered session with the given id, or None.
+        @raise: SessionExpiredError if the session is known to have expired.
+        """
+        session = self.sessions.get(sessionid)
+        if session is self._EXPIRED:
+            raise SessionExpiredError('Your session has expired.')
+        return session
+    
+    def add(self, session):
+        self.sessions.set(session.id, session)
+    
+    def expire(self, sessionid):
+        self.sessions.set(sessionid, self._EXPIRED, self.expired_ttl)
+    
+    def clear(self):
+        self.sessions.clear()
+
+default_session_cache = SessionCache()
+
 class _SessionBasedHandler (object):
+    # Handlers only remember validated sessions if they are given a cache.
+    session_cache = None
+    
+    # The number of seconds that a request has to get everything it needs from
+    # PCS, across all redirects, retries and parallel calls.
+    request_deadline = 20
+    
+    # How much of PCS's last response to log when a request goes wrong; its
+    # pages can be hundreds of KB.
+    logged_pcs_body_length = 2000
+    
     def __init__(self, session_source, error_view):
         super(_SessionBasedHandler, self).__init__()
         
         self.session_source = session_source
         self.error_view = error_view
+        
+        # Handlers are made anew for each request, in the thread that will
+        # handle it.
+        self.context = begin_request()
+        self.deadline = start_deadline(self.request_deadline)
     
     def get_user_id(self):
 #        user_id = self.request.cookies.get('session_user', None)
@@ -42,9 +99,111 @@ class _SessionBasedHandler (object):
         password is available, attempt to find an existing session id to use.
         @return: A valid session or None
         """
-        session = self.session_source.fetch_session(userid, sessionid)
+        if self.session_cache is None:
+            return self.session_source.fetch_session(userid, sessionid)
+        
+        session = self.session_cache.get(sessionid)
+        if session is None:
+            session = self.session_source.fetch_session(userid, sessionid)
+            self.remember_session(session)
         return session
+    
+    def remember_session(self, session):
+        if self.session_cache is not None and session is not None:
+            self.session_cache.add(session)
+    
+    def forget_session(self):
+        """
+        Remember that the current request's session has expired, so that it is
+        not used again.
+        """
+        if self.session_cache is None:
+            return
+        
+        sessionid = self.request.cookies.get('session_id', None)
+        if sessionid is not None:
+            self.session_cache.expire(sessionid)
+    
+    def is_session_expired_error(self, error):
+        """
+        Check whether the given error means that the user's session is no
+        longer valid, whichever source it came from.
+        """
+        if isinstance(error, SessionExpiredError):
+            return True
+        return getattr(error, 'code', None) == 'invalid_session'
+    
+    def client_has_etag(self, etag):
+        """
+        Check whether the request's If-None-Match header lists the given ETag,
+        meaning that the client already has the response.
+        """
+        return etag_matches(self.request.headers.get('If-None-Match'), etag)
+    
+    def respond_not_modified(self, etag):
+        self.response.headers.add_header('ETag', etag)
+        self.response.set_status(304)
+    
+    def prepare_session_fetch(self, userid, sessionid):
+        """
+        @return: A Fetch for the session, like get_session, which needs no
+          request if the session is in the session cache.
+        @raise: SessionExpiredError if the session is known to have expired.
+        """
+        if self.session_cache is not None:
+            session = self.session_cache.get(sessionid)
+            if session is not None:
+                return Fetch.done(session)
+        
+        return self.session_source.prepare_session_fetch(userid, sessionid)
+        
+    def fetch_all(self, source, *fetches):
+        """
+        Have the source send the requests of all of the given Fetches at the
+        same time (see _AvailabilitySourceInterface.fetch_each), rather than
+        one after another.
+        
+        If any fetch fails because the session has expired, the others are
+        abandoned and that error is raised right away.  Otherwise, if any fetch
+        fails, the first failure is raised once all of the fetches are done.
+            
+        @return: A list of the fetches' results, in order.
+        """
+        results = [None] * len(fetches)
+        failures = {}
+            
+        each = source.fetch_each(fetches)
+        try:
+            for index, result in each:
+                if isinstance(result, Exception):
+                    if self.is_session_expired_error(result):
+                        raise result
+                    failures[index] = result
+                results[index] = result
+        finally:
+            each.close()
+        
+        if failures:
+            raise failures[min(failures)]
+        
+        return results
 
+    def describe_pcs_response(self, body, headers):
+        """
+        @return: A description of a response from PCS that is safe to log.  The
+          cookie headers (which carry live session ids) are left out, and the
+          body is cut short.
+        """
+        items = headers.items() if hasattr(headers, 'items') else headers
+        headers = [(name, value) for name, value in items
+                   if name.lower() not in ('cookie', 'set-cookie')]
+        
+        limit = self.logged_pcs_body_length
+        if len(body) > limit:
+            body = body[:limit] + '... (%d more bytes)' % (len(body) - limit)
+        
+        return 'Last PCS response: %s\n\n%s' % (headers, body)
+    
     def generate_error(self, error):
         import traceback
         
@@ -57,7 +216,21 @@ class _SessionBasedHandler (object):
             + 'Arguments: %s\n\n' % (self.request.arguments()) \
             + '%s: %s\n\n' % (type(error).__name__, error) \
             + 'Traceback:\n' + tb_str
-        logging.error(detailed_error)
+        
+        # The last thing PCS said is only worth logging, not sending back.
+        pcs_response = self.context.get('pcs_response')
+        if pcs_response is not None:
+            logging.error(detailed_error + '\n\n'
+                          + self.describe_pcs_response(*pcs_response))
+        else:
+            logging.error(detailed_error)
+        
+        if self.is_session_expired_error(error):
+            self.forget_session()
+        
+        # Errors go out with a 200 like everything else, so say they're not
+        # to be kept (or tagged for conditional GETs).
+        self.response.headers.add_header('Cache-Control', 'no-store')
         
         code = error.code if hasattr(error, 'code') else None
         return self.error_view.render_error(code, str(error), detailed_error)
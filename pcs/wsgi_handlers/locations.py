@@ -1,9 +1,6 @@
 from pcs.wsgi_handlers.base import _SessionBasedHandler
 from pcs.wsgi_handlers.base import WsgiParameterError
-from pcs.fetchers.screenscrape.session import SessionScreenscrapeSource
-from pcs.fetchers.screenscrape.locations import LocationsScreenscrapeSource
-from pcs.renderers.json.error import ErrorJsonView
-from pcs.renderers.json.locations import LocationsJsonView
+from pcs.wsgi_handlers.registry import default_registry
 
 class LocationsHandler (_SessionBasedHandler):
     """
@@ -19,14 +16,34 @@ class LocationsHandler (_SessionBasedHandler):
         self.locations_source = locations_source
         self.locations_view = locations_view
     
+    def get_locations_etag(self, sessionid):
+        """
+        @return: The ETag of the session's locations response, if the source
+          can tell which version of the profiles it would be made from, or
+          None.
+        """
+        version = self.locations_source.fetch_location_profiles_version(sessionid)
+        if version is None:
+            return None
+        return '"locations-%s"' % version
+    
     def get(self):
         try:
             userid = self.get_user_id()
             sessionid = self.get_session_id()
             
             session = self.get_session(userid, sessionid)
+            
+            # If the client already has these profiles, don't render them.
+            etag = self.get_locations_etag(sessionid)
+            if etag is not None and self.client_has_etag(etag):
+                self.respond_not_modified(etag)
+                return
+            
             locations = self.locations_source.fetch_location_profiles(sessionid)
             response_body = self.locations_view.render_locations(session, locations)
+            if etag is not None:
+                self.response.headers.add_header('ETag', etag)
         except Exception, e:
             response_body = self.generate_error(e)
         
@@ -34,11 +51,16 @@ class LocationsHandler (_SessionBasedHandler):
         self.response.set_status(200);
 
 class LocationsJsonHandler (LocationsHandler):
+    registry = default_registry
+    
     def __init__(self):
+        registry = self.registry
         super(LocationsJsonHandler, self).__init__(
-            SessionScreenscrapeSource(),
-            LocationsScreenscrapeSource(),
-            LocationsJsonView(),
-            ErrorJsonView())
+            registry.session_source(),
+            registry.locations_source(),
+            registry.locations_json_view(),
+            registry.error_json_view())
+        
+        self.session_cache = registry.session_cache
     
 
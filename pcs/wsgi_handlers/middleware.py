@@ -0,0 +1,317 @@
+"""
+WSGI middleware that the application's responses pass through on their way
+out:
+    
+    application = GzipMiddleware(ConditionalGetMiddleware(
+        PrettyJsonMiddleware(StatsMiddleware(application, is_admin))))
+
+StatsMiddleware answers requests for /stats.json with the application's
+metrics, for the clients that it is told to allow.  The JSON views write compact responses.  PrettyJsonMiddleware indents
+them for requests that ask for it (with ?pretty=1), ConditionalGetMiddleware
+tags them with ETags and answers clients that already have them with a 304,
+and GzipMiddleware compresses them for clients that accept it.
+"""
+import cgi
+import gzip
+import hashlib
+import StringIO
+
+try:
+    import json
+except ImportError:
+    from django.utils import simplejson as json
+
+from util import metrics
+
+def call_application(application, environ, start_response):
+    """
+    Call a WSGI application, holding on to its response instead of sending it.
+    
+    @return: The (status, headers, exc_info, body) that it responded with.
+    """
+    response = []
+    chunks = []
+    def capture(status, headers, exc_info=None):
+        response[:] = [status, list(headers), exc_info]
+        return chunks.append
+    
+    result = application(environ, capture)
+    try:
+        for chunk in result:
+            chunks.append(chunk)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    
+    status, headers, exc_info = response
+    return status, headers, exc_info, ''.join(chunks)
+
+def get_header(headers, name):
+    for header_name, value in headers:
+        if header_name.lower() == name.lower():
+            return value
+    return None
+
+def is_no_store(headers):
+    cache_control = get_header(headers, 'Cache-Control') or ''
+    return 'no-store' in cache_control.lower()
+
+def replace_header(headers, name, value):
+    """
+    @return: The headers, with any called name replaced by the given one.
+    """
+    headers = [(header_name, header_value)
+               for header_name, header_value in headers
+               if header_name.lower() != name.lower()]
+    headers.append((name, value))
+    return headers
+
+def accepts_gzip(accept_encoding):
+    """
+    @return: Whether an Accept-Encoding header allows gzip (or any) encoding.
+    """
+    for coding in (accept_encoding or '').split(','):
+        parts = [part.strip() for part in coding.split(';')]
+        if parts[0] not in ('gzip', '*'):
+            continue
+        
+        quality = 1.0
+        for param in parts[1:]:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0
+        return quality > 0
+    return False
+
+def body_etag(body):
+    """
+    @return: A strong ETag for the given body.
+    """
+    return '"%s"' % hashlib.sha1(body).hexdigest()
+
+def etag_matches(if_none_match, etag):
+    """
+    @return: Whether an If-None-Match header lists the given ETag (or is *).
+    """
+    if not if_none_match or etag is None:
+        return False
+    
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag == '*' or tag == etag:
+            return True
+    return False
+
+def gzip_etag(etag):
+    """
+    @return: The ETag for the gzipped version of a body with the given ETag.
+      The two are different representations, so they mustn't share a strong
+      ETag.
+    """
+    return etag[:-1] + '-gzip"'
+
+def pretty_etag(etag):
+    """
+    @return: The ETag for the indented version of a body with the given ETag.
+    """
+    return etag[:-1] + '-pretty"'
+
+def gzip_body(body, level):
+    buf = StringIO.StringIO()
+    gzip_file = gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=level)
+    gzip_file.write(body)
+    gzip_file.close()
+    return buf.getvalue()
+
+class GzipMiddleware (object):
+    """
+    Compresses the bodies of responses, for clients that accept gzip.  Bodies
+    smaller than min_size aren't worth it, and are sent as they are.
+    
+    The size of each body, and of what was sent for it, is counted in the
+    stats_name metrics.
+    """
+    
+    def __init__(self, application, min_size=256, level=6,
+                 stats_name='response_sizes'):
+        self.application = application
+        self.min_size = min_size
+        self.level = level
+        self.stats = metrics.counters(stats_name, 'responses', 'compressed',
+                                      'body_bytes', 'sent_bytes')
+    
+    def __call__(self, environ, start_response):
+        # Clients send back the ETags of the gzipped bodies that they have,
+        # but the application only knows the ETags of the bodies it wrote.
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and '-gzip"' in if_none_match:
+            environ = dict(environ)
+            environ['HTTP_IF_NONE_MATCH'] = if_none_match.replace('-gzip"', '"')
+        
+        status, headers, exc_info, body = \
+            call_application(self.application, environ, start_response)
+        etag = get_header(headers, 'ETag')
+        
+        body_bytes = len(body)
+        if accepts_gzip(environ.get('HTTP_ACCEPT_ENCODING')) \
+           and body_bytes >= self.min_size \
+           and get_header(headers, 'Content-Encoding') is None:
+            body = gzip_body(body, self.level)
+            headers = replace_header(headers, 'Content-Encoding', 'gzip')
+            headers = replace_header(headers, 'Content-Length', str(len(body)))
+            if etag is not None:
+                headers = replace_header(headers, 'ETag', gzip_etag(etag))
+            self.stats.increment('compressed')
+        
+        elif status.startswith('304') and etag is not None \
+             and etag_matches(if_none_match, gzip_etag(etag)):
+            # What the client has is gzipped, so say so.
+            headers = replace_header(headers, 'ETag', gzip_etag(etag))
+        
+        # Whether the body is compressed depends on the request, so caches
+        # must keep the two apart.
+        vary = get_header(headers, 'Vary')
+        if vary is None:
+            headers.append(('Vary', 'Accept-Encoding'))
+        elif 'accept-encoding' not in vary.lower():
+            headers = replace_header(headers, 'Vary', vary + ', Accept-Encoding')
+        
+        self.stats.increment('responses')
+        self.stats.increment('body_bytes', body_bytes)
+        self.stats.increment('sent_bytes', len(body))
+        
+        if exc_info is None:
+            start_response(status, headers)
+        else:
+            start_response(status, headers, exc_info)
+        return [body]
+
+class ConditionalGetMiddleware (object):
+    """
+    Tags each successful GET (or HEAD) response with an ETag, unless the
+    application already has, by hashing its body.  Requests whose
+    If-None-Match header lists the response's ETag get a 304, with no body,
+    instead.  Responses marked Cache-Control: no-store (error payloads, which
+    the handlers send with a 200) are left alone.
+    
+    Applications that can tell that a response hasn't changed without making
+    it (from a cache's version of its data, say) can send the 304 themselves;
+    these are counted in the stats_name metrics along with the rest.
+    """
+    
+    def __init__(self, application, stats_name='conditional_get'):
+        self.application = application
+        self.stats = metrics.counters(stats_name, 'tagged', 'not_modified')
+    
+    def __call__(self, environ, start_response):
+        if environ.get('REQUEST_METHOD', 'GET') not in ('GET', 'HEAD'):
+            return self.application(environ, start_response)
+        
+        status, headers, exc_info, body = \
+            call_application(self.application, environ, start_response)
+        
+        if status.startswith('200') and not is_no_store(headers):
+            etag = get_header(headers, 'ETag')
+            if etag is None:
+                etag = body_etag(body)
+                headers.append(('ETag', etag))
+            self.stats.increment('tagged')
+            
+            if etag_matches(environ.get('HTTP_IF_NONE_MATCH'), etag):
+                status = '304 Not Modified'
+                body = ''
+                headers = [(name, value) for name, value in headers
+                           if name.lower() not in ('content-length',
+                                                   'content-type')]
+        
+        if status.startswith('304'):
+            self.stats.increment('not_modified')
+        
+        if exc_info is None:
+            start_response(status, headers)
+        else:
+            start_response(status, headers, exc_info)
+        return [body]
+
+class PrettyJsonMiddleware (object):
+    """
+    Indents JSON responses for requests that ask for it with a true pretty
+    parameter (pretty=1 or pretty=true).  Other responses are left alone.
+    
+    An ETag that the application gave an indented body gets a -pretty suffix,
+    the way GzipMiddleware marks gzipped bodies, so that the compact and the
+    indented bodies don't share a strong ETag.
+    """
+    
+    def __init__(self, application, param='pretty'):
+        self.application = application
+        self.param = param
+    
+    def wants_pretty(self, environ):
+        values = cgi.parse_qs(environ.get('QUERY_STRING', '')).get(self.param)
+        return bool(values) and values[0].lower() in ('1', 'true', 'yes')
+    
+    def __call__(self, environ, start_response):
+        if not self.wants_pretty(environ):
+            return self.application(environ, start_response)
+        
+        # As with gzip, the application only knows the ETags of the compact
+        # bodies that it wrote.
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and '-pretty"' in if_none_match:
+            environ = dict(environ)
+            environ['HTTP_IF_NONE_MATCH'] = if_none_match.replace('-pretty"', '"')
+        
+        status, headers, exc_info, body = \
+            call_application(self.application, environ, start_response)
+        etag = get_header(headers, 'ETag')
+        
+        try:
+            data = json.loads(body)
+        except ValueError:
+            if status.startswith('304') and etag is not None \
+               and etag_matches(if_none_match, pretty_etag(etag)):
+                headers = replace_header(headers, 'ETag', pretty_etag(etag))
+        else:
+            body = json.dumps(data, sort_keys=True, indent=2)
+            if get_header(headers, 'Content-Length') is not None:
+                headers = replace_header(headers, 'Content-Length',
+                                         str(len(body)))
+            if etag is not None:
+                headers = replace_header(headers, 'ETag', pretty_etag(etag))
+        
+        if exc_info is None:
+            start_response(status, headers)
+        else:
+            start_response(status, headers, exc_info)
+        return [body]
+
+class StatsMiddleware (object):
+    """
+    Answers GET requests for the given path with the current values of all of
+    the util.metrics counters, as JSON.  The metrics say a lot about the
+    service, so only requests for which is_allowed(environ) is true (from
+    admins, say) are answered.  Other requests are passed on to the
+    application, as though the path weren't there.
+    """
+    
+    def __init__(self, application, is_allowed, path='/stats.json'):
+        self.application = application
+        self.is_allowed = is_allowed
+        self.path = path
+    
+    def __call__(self, environ, start_response):
+        if environ.get('PATH_INFO') != self.path \
+           or environ.get('REQUEST_METHOD', 'GET') not in ('GET', 'HEAD') \
+           or not self.is_allowed(environ):
+            return self.application(environ, start_response)
+        
+        body = json.dumps(metrics.snapshot())
+        start_response('200 OK', [('Content-Type', 'application/json'),
+                                  ('Content-Length', str(len(body))),
+                                  ('Cache-Control', 'no-store')])
+        return [body]
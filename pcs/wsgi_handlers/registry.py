@@ -0,0 +1,112 @@
+"""
+The objects that handlers share for the life of the process.  Sources, views
+and caches are built the first time a handler asks for them, and the same
+objects are handed to every handler after that:
+    
+    registry = default_registry
+    handler = LocationsHandler(registry.session_source(),
+                               registry.locations_source(),
+                               registry.locations_json_view(),
+                               registry.error_json_view())
+
+Everything handed out by a registry is shared by concurrent requests, so it
+must not keep any per-request state.
+"""
+import threading
+
+from pcs.fetchers.screenscrape.availability import AvailabilityScreenscrapeSource
+from pcs.fetchers.screenscrape.availability import default_vehicle_cache
+from pcs.fetchers.screenscrape.locations import default_profile_cache
+from pcs.fetchers.screenscrape.locations import LocationsScreenscrapeSource
+from pcs.fetchers.screenscrape.pcsconnection import default_pool
+from pcs.fetchers.screenscrape.reservations import ReservationsScreenscrapeSource
+from pcs.fetchers.screenscrape.session import SessionScreenscrapeSource
+from pcs.renderers.json.availability import AvailabilityJsonView
+from pcs.renderers.json.error import ErrorJsonView
+from pcs.renderers.json.locations import LocationsJsonView
+from pcs.renderers.json.reservations import ReservationsJsonView
+from pcs.renderers.json.session import SessionJsonView
+from pcs.wsgi_handlers.base import default_session_cache
+
+class ApplicationRegistry (object):
+    """
+    Builds each of the application's sources and views once, and keeps hold of
+    the caches and the connection pool that they (and the handlers) use.
+    """
+    
+    def __init__(self, session_cache=default_session_cache,
+                 profile_cache=default_profile_cache,
+                 vehicle_cache=default_vehicle_cache,
+                 connection_pool=default_pool):
+        self.session_cache = session_cache
+        self.profile_cache = profile_cache
+        self.vehicle_cache = vehicle_cache
+        
+        # Every PcsConnection in the process draws on this pool.
+        self.connection_pool = connection_pool
+        
+        self.__lock = threading.Lock()
+        self.__objects = {}
+    
+    def get(self, name, create):
+        """
+        @return: The object registered under name.  If there is none yet, one
+          is made by calling create, and registered.
+        """
+        obj = self.__objects.get(name)
+        if obj is not None:
+            return obj
+        
+        self.__lock.acquire()
+        try:
+            obj = self.__objects.get(name)
+            if obj is None:
+                obj = create()
+                self.__objects[name] = obj
+            return obj
+        finally:
+            self.__lock.release()
+    
+    def clear(self):
+        """
+        Forget every object built so far; they will be built again when next
+        asked for.
+        """
+        self.__lock.acquire()
+        try:
+            self.__objects.clear()
+        finally:
+            self.__lock.release()
+    
+    def session_source(self):
+        return self.get('session_source', SessionScreenscrapeSource)
+    
+    def availability_source(self):
+        return self.get('availability_source',
+            lambda: AvailabilityScreenscrapeSource(
+                vehicle_cache=self.vehicle_cache))
+    
+    def locations_source(self):
+        return self.get('locations_source',
+            lambda: LocationsScreenscrapeSource(
+                profile_cache=self.profile_cache))
+    
+    def reservations_source(self):
+        return self.get('reservations_source', ReservationsScreenscrapeSource)
+    
+    def session_json_view(self):
+        return self.get('session_json_view', SessionJsonView)
+    
+    def availability_json_view(self):
+        return self.get('availability_json_view', AvailabilityJsonView)
+    
+    def locations_json_view(self):
+        return self.get('locations_json_view', LocationsJsonView)
+    
+    def reservations_json_view(self):
+        return self.get('reservations_json_view', ReservationsJsonView)
+    
+    def error_json_view(self):
+        return self.get('error_json_view', ErrorJsonView)
+
+default_registry = ApplicationRegistry()
@@ -1,10 +1,7 @@
 from pcs.wsgi_handlers.base import _SessionBasedHandler
 from pcs.wsgi_handlers.base import _TimeRangeBasedHandler
 from pcs.wsgi_handlers.base import WsgiParameterError
-from pcs.fetchers.screenscrape.session import SessionScreenscrapeSource
-from pcs.fetchers.screenscrape.reservations import ReservationsScreenscrapeSource
-from pcs.renderers.json.error import ErrorJsonView
-from pcs.renderers.json.reservations import ReservationsJsonView
+from pcs.wsgi_handlers.registry import default_registry
 from util.TimeZone import Eastern
 from util.TimeZone import from_isostring
 
@@ -153,18 +150,28 @@ class ReservationHandler (_SessionBasedHandler, _TimeRangeBasedHandler):
 
 
 class ReservationsJsonHandler (ReservationsHandler):
+    registry = default_registry
+    
     def __init__(self):
+        registry = self.registry
         super(ReservationsJsonHandler, self).__init__(
-            SessionScreenscrapeSource(),
-            ReservationsScreenscrapeSource(),
-            ReservationsJsonView(),
-            ErrorJsonView())
+            registry.session_source(),
+            registry.reservations_source(),
+            registry.reservations_json_view(),
+            registry.error_json_view())
+        
+        self.session_cache = registry.session_cache
 
 class ReservationJsonHandler (ReservationHandler):
+    registry = default_registry
+    
     def __init__(self):
+        registry = self.registry
         super(ReservationJsonHandler, self).__init__(
-            SessionScreenscrapeSource(),
-            ReservationsScreenscrapeSource(),
-            ReservationsJsonView(),
-            ErrorJsonView())
+            registry.session_source(),
+            registry.reservations_source(),
+            registry.reservations_json_view(),
+            registry.error_json_view())
+
+        self.session_cache = registry.session_cache
 
@@ -5,9 +5,7 @@ except ImportError:
 
 from pcs.wsgi_handlers.base import _SessionBasedHandler
 from pcs.wsgi_handlers.base import WsgiParameterError
-from pcs.renderers.json.error import ErrorJsonView
-from pcs.renderers.json.session import SessionJsonView
-from pcs.fetchers.screenscrape.session import SessionScreenscrapeSource
+from pcs.wsgi_handlers.registry import default_registry
 from util.abstract import override
 
 class SessionHandler (_SessionBasedHandler):
@@ -69,6 +67,7 @@ class SessionHandler (_SessionBasedHandler):
         try:
             userid, password = self.get_credentials()
             session = self.session_source.create_session(userid, password)
+            self.remember_session(session)
             
             response_body = self.session_view.render_session(session)
             self.save_session(session)
@@ -80,8 +79,13 @@ class SessionHandler (_SessionBasedHandler):
         self.response.set_status(200);
 
 class SessionJsonHandler (SessionHandler):
+    registry = default_registry
+    
     def __init__(self):
-        super(SessionJsonHandler, self).__init__(SessionScreenscrapeSource(), 
-                                                 SessionJsonView(),
-                                                 ErrorJsonView())
+        registry = self.registry
+        super(SessionJsonHandler, self).__init__(registry.session_source(), 
+                                                 registry.session_json_view(),
+                                                 registry.error_json_view())
+
+        self.session_cache = registry.session_cache
 
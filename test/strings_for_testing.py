@@ -1236,3 +1236,5 @@ try{var pageTracker = _gat._getTracker("UA-16737291-1");pageTracker._trackPagevi
  
 </body> 
 </html> '''
+
+RESULTS_FOR_VEHICLES_NEAR_LOCATION = r'''{"pods":["<div class=\"pod_top\"><div class=\"pod_head\"><h4 ><a class=\"text\" href=\"my_fleet.php?mv_action=show&_r=16&pk=30005\"   onclick=\"MV.controls.results.show_pod_details(30005); return false;\" >47th & Baltimore - 0.08 mile(s)</a></h4></div></div><div class=\"pod_bot \" id=\"page_result_1\"><div id=\"time_line\"><img width=\"439\" height=\"25\" src=\"skin/base_images/day_guage.gif\" /><span class=\"pod_estimates_images\"><img src=\"/skin/base_images/hourly_cost.gif\" /></span></div><div class=\"list_left\"><div class=\"v_img\"><a href=\"http://www.phillycarshare.org/cars/tacoma\" target=\"_blank\"><img style=\"border: 0;\" src=\"/images/client_images/toyota_tacoma_thumb.gif\"/></a></div><div class=\"v_name\"><h4>Tacoma Pickup</h4></div><div class=\"v_amenities\"><ul></ul></div></div><div class=\"list_mid\"><div class=\"time\"><ul class=\"segments\"><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"free\" /><li class=\"free pad_end\" /></ul></li><li ><ul ><li class=\"free pad_end\" /><li class=\"good\" /><li class=\"good\" /><li class=\"good pad_end\" /></ul></li><li ><ul ><li class=\"good pad_end\" /><li class=\"good\" /><li class=\"good\" /><li class=\"good pad_end\" /></ul></li><li ><ul ><li class=\"good pad_end\" /><li class=\"free\" /><li class=\"free\" /><li class=\"free pad_end\" /></ul></li><li ><ul ><li class=\"free pad_end\" /><li class=\"free\" /><li class=\"free\" /><li class=\"free pad_end\" /></ul></li><li ><ul ><li class=\"free pad_end\" /><li class=\"free\" /><li class=\"free\" /><li class=\"free pad_end\" /></ul></li></ul></div><div class=\"brick\" style=\"width:32px; margin-left: 333px; -margin-left: 164px;\"></div><div class=\"timestamp\"><p class=\"good\">Available</p></div></div><div class=\"list_right\"><div class=\"reserve\"><a href=\"javascript:MV.controls.reserve.lightbox.create('1282540500', '1282547700', '91800598', '');\">Select<span id=\"estimate_stack_894\" class=\"est\"></span></a></div><div id=\"rates_stack_894\" class=\"price\"></div></div></div><div class=\"pod_bot \" id=\"page_result_2\"><div class=\"list_left\"><div class=\"v_img\"><img style=\"border: 0;\" src=\"/images/client_images/prius_lift_thumb.gif\"/></div><div class=\"v_name\"><h4>Prius Liftback</h4></div><div class=\"v_amenities\"><ul><li><img src=\"/skin/base_images/hybrid.gif\" label=\"Hybrid\" title=\"Hybrid\"/></li>n<li><img src=\"/skin/base_images/folding_seat.gif\" label=\"Folding Rear Seats\" title=\"Folding Rear Seats\"/></li></ul></div></div><div class=\"list_mid\"><div class=\"time\"><ul class=\"segments\"><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"free\" /><li class=\"free pad_end\" /></ul></li><li ><ul ><li class=\"free pad_end\" /><li class=\"good\" /><li class=\"good\" /><li class=\"good pad_end\" /></ul></li><li ><ul ><li class=\"good pad_end\" /><li class=\"good\" /><li class=\"good\" /><li class=\"good pad_end\" /></ul></li><li ><ul ><li class=\"good pad_end\" /><li class=\"free\" /><li class=\"free\" /><li class=\"free pad_end\" /></ul></li><li ><ul ><li class=\"free pad_end\" /><li class=\"free\" /><li class=\"free\" /><li class=\"free pad_end\" /></ul></li><li ><ul ><li class=\"free pad_end\" /><li class=\"free\" /><li class=\"free\" /><li class=\"free pad_end\" /></ul></li></ul></div><div class=\"brick\" style=\"width:32px; margin-left: 333px; -margin-left: 164px;\"></div><div class=\"timestamp\"><p class=\"good\">Available</p></div></div><div class=\"list_right\"><div class=\"reserve\"><a href=\"javascript:MV.controls.reserve.lightbox.create('1282540500', '1282547700', '96692246', '');\">Select<span id=\"estimate_stack_956\" class=\"est\"></span></a></div><div id=\"rates_stack_956\" class=\"price\"></div></div></div>","<div class=\"pod_top\"><div class=\"pod_head\"><h4 ><a class=\"text\" href=\"my_fleet.php?mv_action=show&_r=16&pk=12174212\"   onclick=\"MV.controls.results.show_pod_details(12174212); return false;\" >46th & Baltimore - 0.2 mile(s)</a></h4></div></div><div class=\"pod_bot \" id=\"page_result_3\"><div class=\"list_left\"><div class=\"v_img\"><a href=\"http://www.phillycarshare.org/cars/element\" target=\"_blank\"><img style=\"border: 0;\" src=\"/images/client_images/honda_element_thumb.gif\"/></a></div><div class=\"v_name\"><h4>Honda Element</h4></div><div class=\"v_amenities\"><ul><li><img src=\"/skin/base_images/awd.gif\" label=\"All Wheel Drive\" title=\"All Wheel Drive\"/></li>n<li><img src=\"/skin/base_images/folding_seat.gif\" label=\"Folding Rear Seats\" title=\"Folding Rear Seats\"/></li></ul></div></div><div class=\"list_mid\"><div class=\"time\"><ul class=\"segments\"><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"free\" /><li class=\"free pad_end\" /></ul></li><li ><ul ><li class=\"free pad_end\" /><li class=\"good\" /><li class=\"good\" /><li class=\"good pad_end\" /></ul></li><li ><ul ><li class=\"good pad_end\" /><li class=\"good\" /><li class=\"good\" /><li class=\"good pad_end\" /></ul></li><li ><ul ><li class=\"good pad_end\" /><li class=\"free\" /><li class=\"free\" /><li class=\"free pad_end\" /></ul></li><li ><ul ><li class=\"free pad_end\" /><li class=\"free\" /><li class=\"free\" /><li class=\"free pad_end\" /></ul></li><li ><ul ><li class=\"free pad_end\" /><li class=\"free\" /><li class=\"free\" /><li class=\"free pad_end\" /></ul></li></ul></div><div class=\"brick\" style=\"width:32px; margin-left: 333px; -margin-left: 164px;\"></div><div class=\"timestamp\"><p class=\"good\">Available</p></div></div><div class=\"list_right\"><div class=\"reserve\"><a href=\"javascript:MV.controls.reserve.lightbox.create('1282540500', '1282547700', '130868710', '');\">Select<span id=\"estimate_stack_1195\" class=\"est\"></span></a></div><div id=\"rates_stack_1195\" class=\"price\"></div></div></div><div class=\"pod_bot \" id=\"page_result_4\"><div class=\"list_left\"><div class=\"v_img\"><img style=\"border: 0;\" src=\"/images/client_images/prius_lift_thumb.gif\"/></div><div class=\"v_name\"><h4>Prius Liftback</h4></div><div class=\"v_amenities\"><ul><li><img src=\"/skin/base_images/hybrid.gif\" label=\"Hybrid\" title=\"Hybrid\"/></li>n<li><img src=\"/skin/base_images/folding_seat.gif\" label=\"Folding Rear Seats\" title=\"Folding Rear Seats\"/></li></ul></div></div><div class=\"list_mid\"><div class=\"time\"><ul class=\"segments\"><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"bad pad_end\" /></ul></li><li ><ul ><li class=\"bad pad_end\" /><li class=\"bad\" /><li class=\"bad\" /><li class=\"free pad_end\" /></ul></li><li ><ul ><li class=\"free pad_end\" /><li class=\"good\" /><li class=\"good\" /><li class=\"good pad_end\" /></ul></li><li ><ul ><li class=\"good pad_end\" /><li class=\"good\" /><li class=\"good\" /><li class=\"good pad_end\" /></ul></li><li ><ul ><li class=\"good pad_end\" /><li class=\"free\" /><li class=\"free\" /><li class=\"free pad_end\" /></ul></li><li ><ul ><li class=\"free pad_end\" /><li class=\"free\" /><li class=\"free\" /><li class=\"free pad_end\" /></ul></li><li ><ul ><li class=\"free pad_end\" /><li class=\"free\" /><li class=\"free\" /><li class=\"free pad_end\" /></ul></li></ul></div><div class=\"brick\" style=\"width:32px; margin-left: 333px; -margin-left: 164px;\"></div><div class=\"timestamp\"><p class=\"good\">Available</p></div></div><div class=\"list_right\"><div class=\"reserve\"><a href=\"javascript:MV.controls.reserve.lightbox.create('1282540500', '1282547700', '73484842', '');\">Select<span id=\"estimate_stack_734\" class=\"est\"></span></a></div><div id=\"rates_stack_734\" class=\"price\"></div></div></div>","<div class=\"pod_top\"><div class=\"pod_head\"><h4><a class=\"text\" href=\"my_fleet.php?mv_action=show&amp;_r=8&amp;pk=30005\" onclick=\"MV.controls.results.show_pod_details(30005); return false;\">47th &amp; Baltimore - 0.08 mile(s)</a></h4></div></div><div class=\"pod_bot pod_bot_maybe\" id=\"page_result_1\"><div id=\"time_line\"><img width=\"439\" height=\"25\" src=\"skin/base_images/day_guage.gif\"><span class=\"pod_estimates_images\"><img src=\"/skin/base_images/hourly_cost.gif\"></span></div><div class=\"list_left\"><div class=\"v_img\"><a href=\"http://www.phillycarshare.org/cars/prius\" target=\"_blank\"><img style=\"border: 0;\" src=\"/images/client_images/prius_lift_thumb.gif\"></a></div><div class=\"v_name\"><h4>Prius Liftback</h4></div><div class=\"v_amenities\"><ul><li><img src=\"/skin/base_images/hybrid.gif\" label=\"Hybrid\" title=\"Hybrid\"></li><li><img src=\"/skin/base_images/folding_seat.gif\" label=\"Folding Rear Seats\" title=\"Folding Rear Seats\"></li></ul></div></div><div class=\"list_mid\"><div class=\"time\"><ul class=\"segments\"><li><ul><li class=\"bad pad_end\"></li><li class=\"bad\"></li><li class=\"bad\"></li><li class=\"bad pad_end\"></li></ul></li><li><ul><li class=\"bad pad_end\"></li><li class=\"bad\"></li><li class=\"bad\"></li><li class=\"bad pad_end\"></li></ul></li><li><ul><li class=\"bad pad_end\"></li><li class=\"bad\"></li><li class=\"bad\"></li><li class=\"bad pad_end\"></li></ul></li><li><ul><li class=\"bad pad_end\"></li><li class=\"bad\"></li><li class=\"bad\"></li><li class=\"bad pad_end\"></li></ul></li><li><ul><li class=\"bad pad_end\"></li><li class=\"bad\"></li><li class=\"bad\"></li><li class=\"bad pad_end\"></li></ul></li><li><ul><li class=\"bad pad_end\"></li><li class=\"bad\"></li><li class=\"bad\"></li><li class=\"bad pad_end\"></li></ul></li><li><ul><li class=\"bad pad_end\"></li><li class=\"bad\"></li><li class=\"bad\"></li><li class=\"bad pad_end\"></li></ul></li><li><ul><li class=\"bad pad_end\"></li><li class=\"bad\"></li><li class=\"bad\"></li><li class=\"bad pad_end\"></li></ul></li><li><ul><li class=\"slct_bkd pad_end\"></li><li class=\"slct_bkd\"></li><li class=\"slct_bkd\"></li><li class=\"slct_bkd pad_end\"></li></ul></li><li><ul><li class=\"slct_bkd pad_end\"></li><li class=\"good\"></li><li class=\"good\"></li><li class=\"good pad_end\"></li></ul></li><li><ul><li class=\"good pad_end\"></li><li class=\"good\"></li><li class=\"good\"></li><li class=\"good pad_end\"></li></ul></li><li><ul><li class=\"free pad_end\"></li><li class=\"free\"></li><li class=\"free\"></li><li class=\"free pad_end\"></li></ul></li><li><ul><li class=\"free pad_end\"></li><li class=\"free\"></li><li class=\"free\"></li><li class=\"free pad_end\"></li></ul></li><li><ul><li class=\"free pad_end\"></li><li class=\"free\"></li><li class=\"free\"></li><li class=\"free pad_end\"></li></ul></li><li><ul><li class=\"free pad_end\"></li><li class=\"free\"></li><li class=\"free\"></li><li class=\"free pad_end\"></li></ul></li><li><ul><li class=\"free pad_end\"></li><li class=\"free\"></li><li class=\"free\"></li><li class=\"free pad_end\"></li></ul></li><li><ul><li class=\"free pad_end\"></li><li class=\"free\"></li><li class=\"free\"></li><li class=\"free pad_end\"></li></ul></li><li><ul><li class=\"free pad_end\"></li><li class=\"free\"></li><li class=\"free\"></li><li class=\"free pad_end\"></li></ul></li><li><ul><li class=\"free pad_end\"></li><li class=\"free\"></li><li class=\"free\"></li><li class=\"free pad_end\"></li></ul></li><li><ul><li class=\"free pad_end\"></li><li class=\"free\"></li><li class=\"free\"></li><li class=\"free pad_end\"></li></ul></li><li><ul><li class=\"free pad_end\"></li><li class=\"free\"></li><li class=\"free\"></li><li class=\"free pad_end\"></li></ul></li><li><ul><li class=\"free pad_end\"></li><li class=\"free\"></li><li class=\"free\"></li><li class=\"free pad_end\"></li></ul></li><li><ul><li class=\"free pad_end\"></li><li class=\"free\"></li><li class=\"free\"></li><li class=\"free pad_end\"></li></ul></li><li><ul><li class=\"free pad_end\"></li><li class=\"free\"></li><li class=\"free\"></li><li class=\"free pad_end\"></li></ul></li></ul></div><div class=\"brick\" style=\"width:50px; margin-left: 141px; -margin-left: 68px;\"></div><div class=\"timestamp\"><p class=\"maybe\">Available from 3:15 pm on 08/24</p></div></div><div class=\"list_right\"><div class=\"reserve\"><a href=\"javascript:MV.controls.reserve.lightbox.create('1282672800', '1282683600', '96692246', '');\">Select<span id=\"estimate_stack_956\" class=\"est\">$22.47</span></a></div><div id=\"rates_stack_956\" class=\"price\"><div><nobr><strong>$4.45</strong></nobr><br><nobr></nobr></div></div></div></div>"]}'''
@@ -54,3 +54,51 @@ class OverrideTest (unittest.TestCase):
         
         self.fail('Derived.x should have caused an OverrideException.')
 
+    def testShouldKeepErroringOnEachCallToAnInvalidOverride(self):
+        # Given...
+        class Base (object):
+            def x(self, a, b=2):
+                return a+b
+        
+        class Derived (Base):
+            @override
+            def x(self, a):
+                return 5
+        
+        i = Derived()
+        
+        # When...
+        self.assertRaises(OverrideException, i.x, 1)
+        
+        # Then...
+        self.assertRaises(OverrideException, i.x, 1)
+    
+    def testShouldOnlyInspectMethodsOnTheFirstCallForEachClass(self):
+        # Given...
+        import util.abstract
+        
+        class Base (object):
+            def x(self, a, b=2):
+                return a+b
+        
+        class Derived (Base):
+            @override
+            def x(self, a, b):
+                return 5
+        
+        i = Derived()
+        i.x(1,2)
+        
+        def getargspec(func):
+            self.fail('Should not inspect %s again.' % func.__name__)
+        
+        # When...
+        real_getargspec = util.abstract.inspect.getargspec
+        util.abstract.inspect.getargspec = getargspec
+        try:
+            result = Derived().x(1,2)
+        finally:
+            util.abstract.inspect.getargspec = real_getargspec
+        
+        # Then...
+        self.assertEqual(result, 5)
@@ -2,11 +2,17 @@ import unittest
 import datetime
 import new
 
+try:
+    import json
+except ImportError:
+    from django.utils import simplejson as json
+
 from pcs.wsgi_handlers.base import WsgiParameterError
 from pcs.wsgi_handlers.appengine.availability import VehicleAvailabilityHandler
 from pcs.wsgi_handlers.appengine.availability import LocationAvailabilityHandler
 from pcs.wsgi_handlers.appengine.availability import LocationAvailabilityJsonHandler
 from pcs.fetchers import _AvailabilitySourceInterface
+from pcs.fetchers import Fetch
 from pcs.fetchers import _LocationsSourceInterface
 from pcs.fetchers import _SessionSourceInterface
 from pcs.fetchers.screenscrape import ScreenscrapeFetchError
@@ -16,6 +22,7 @@ from pcs.fetchers.screenscrape.pcsconnection import PcsConnection
 from pcs.renderers import _AvailabilityViewInterface
 from pcs.renderers import _ErrorViewInterface
 from pcs.renderers.json.availability import AvailabilityJsonView
+from util.htmlparsing import backends
 from util.testing import patch
 from util.testing import Stub
 from util.TimeZone import Eastern
@@ -32,10 +39,17 @@ class StubRequest (dict):
         return []
 
 # A fake response class
+class StubHeaders (object):
+    def __init__(self):
+        self.header_list = []
+    def add_header(self, key, val):
+        self.header_list.append((key,val))
+
 import StringIO
 class StubResponse (object):
     def __init__(self):
         self.out = StringIO.StringIO()
+        self.headers = StubHeaders()
     def set_status(self, status):
         self.status = status
 
@@ -121,13 +135,13 @@ class VehicleAvailabilityHandlerTest (unittest.TestCase):
             return 1, 100
         
         @patch(handler)
-        def get_session(self, userid, sessionid):
+        def prepare_session_fetch(self, userid, sessionid):
             self.userid = userid
             self.sessionid = sessionid
-            return 'my session'
+            return Fetch.done('my session')
         
         @patch(self.vehicle_source)
-        def fetch_vehicle_availability(self, sessionid, vehicleid, start_time, end_time):
+        def prepare_vehicle_availability_fetch(self, sessionid, vehicleid, start_time, end_time):
             self.vehicle_sessionid = sessionid
             self.vehicle_vehicleid = vehicleid
             self.vehicle_start_time = start_time
@@ -135,15 +149,20 @@ class VehicleAvailabilityHandlerTest (unittest.TestCase):
             class StubObject (object):
                 pass
             self.vehicle_return = StubObject()
-            return self.vehicle_return
+            return Fetch.done(self.vehicle_return)
         
         @patch(self.vehicle_source)
-        def fetch_vehicle_price_estimate(self, sessionid, vehicleid, start_time, end_time):
+        def prepare_vehicle_price_estimate_fetch(self, sessionid, vehicleid, start_time, end_time):
             self.price_sessionid = sessionid
             self.price_vehicleid = vehicleid
             self.price_start_time = start_time
             self.price_end_time = end_time
-            return 'my price estimate'
+            return Fetch.done('my price estimate')
+        
+        @patch(self.vehicle_source)
+        def fetch_each(self, fetches):
+            for index, fetch in enumerate(fetches):
+                yield index, fetch.result
         
         @patch(self.vehicle_view)
         def render_vehicle_availability(self, session, vehicle_availability):
@@ -225,7 +244,184 @@ class VehicleAvailabilityHandlerTest (unittest.TestCase):
         
         response = handler.response.out.getvalue()
         self.assertEqual(response, "My Exception")
+        self.assertEqual(handler.response.headers.header_list,
+                         [('Cache-Control', 'no-store')])
+    
+    def testShouldSendTheSessionVehicleAndPriceRequestsTogether(self):
+        handler = VehicleAvailabilityHandler(self.session_source, self.vehicle_source, 
+                                 self.vehicle_view, self.error_view)
+        handler.request = self.request
+        handler.response = self.response
+        
+        @patch(handler)
+        def get_user_id(self):
+            return 'user1234'
+        
+        @patch(handler)
+        def get_session_id(self):
+            return 'ses1234'
+        
+        @patch(handler)
+        def get_ceiled_time_range(self):
+            return 1, 100
+        
+        def parse(body, headers):
+            return body
+        
+        @patch(self.session_source)
+        def prepare_session_fetch(self, userid, sessionid):
+            return Fetch(('http://localhost/session', 'POST', {}, {}), parse)
+        
+        @patch(self.vehicle_source)
+        def prepare_vehicle_availability_fetch(self, sessionid, vehicleid, start_time, end_time):
+            class StubObject (object):
+                pass
+            return Fetch(('http://localhost/vehicle', 'POST', 'vehicle', {}),
+                         lambda body, headers: StubObject())
+        
+        @patch(self.vehicle_source)
+        def prepare_vehicle_price_estimate_fetch(self, sessionid, vehicleid, start_time, end_time):
+            return Fetch(('http://localhost/price', 'GET', {}, {}), parse)
         
+        @patch(self.vehicle_source)
+        def fetch_each(self, fetches):
+            self.sent = [fetch.request[0] for fetch in fetches]
+            for index, fetch in enumerate(fetches):
+                yield index, fetch.parse_response('my ' + fetch.request[0][17:], {})
+        
+        @patch(self.vehicle_view)
+        def render_vehicle_availability(self, session, vehicle_availability):
+            self.session = session
+            self.price = vehicle_availability.price
+            return 'my vehicle availability body'
+        
+        @patch(self.error_view)
+        def render_error(self, error_code, error_msg, error_detail):
+            return str(error_msg)
+        
+        handler.get('veh1234')
+        
+        self.assertEqual(self.response.out.getvalue(), 'my vehicle availability body')
+        self.assertEqual(self.vehicle_source.sent, ['http://localhost/session',
+            'http://localhost/vehicle', 'http://localhost/price'])
+        self.assertEqual(self.vehicle_view.session, 'my session')
+        self.assertEqual(self.vehicle_view.price, 'my price')
+    
+    def testShouldNotFetchASessionThatIsCached(self):
+        from pcs.wsgi_handlers.base import SessionCache
+        handler = VehicleAvailabilityHandler(self.session_source, self.vehicle_source, 
+                                 self.vehicle_view, self.error_view)
+        handler.session_cache = SessionCache(stats_name='test_session_cache')
+        
+        class StubSession (object):
+            id = 'ses1234'
+        session = StubSession()
+        handler.session_cache.add(session)
+        
+        fetch = handler.prepare_session_fetch('user1234', 'ses1234')
+        
+        self.assertEqual(fetch.request, None)
+        self.assert_(fetch.result is session)
+    
+    def testShouldRespondWithExpiredSessionErrorBeforeOtherFailures(self):
+        handler = VehicleAvailabilityHandler(self.session_source, self.vehicle_source, 
+                                 self.vehicle_view, self.error_view)
+        handler.request = self.request
+        handler.response = self.response
+        
+        @patch(handler)
+        def get_user_id(self):
+            return 'user1234'
+        
+        @patch(handler)
+        def get_session_id(self):
+            return 'ses1234'
+        
+        @patch(handler)
+        def get_ceiled_time_range(self):
+            return 1, 100
+        
+        @patch(handler)
+        def prepare_session_fetch(self, userid, sessionid):
+            return Fetch.done('my session')
+        
+        @patch(self.vehicle_source)
+        def prepare_vehicle_availability_fetch(self, sessionid, vehicleid, start_time, end_time):
+            return Fetch.done(None)
+        
+        @patch(self.vehicle_source)
+        def prepare_vehicle_price_estimate_fetch(self, sessionid, vehicleid, start_time, end_time):
+            return Fetch.done(None)
+        
+        @patch(self.vehicle_source)
+        def fetch_each(self, fetches):
+            yield 0, 'my session'
+            yield 1, Exception('Price estimate failed')
+            yield 2, ScreenscrapeFetchError('Your session is invalid.', 'invalid_session')
+        
+        @patch(self.error_view)
+        def render_error(self, error_code, error_msg, error_detail):
+            return error_code
+        
+        handler.get('veh1234')
+        
+        self.assertEqual(self.response.out.getvalue(), 'invalid_session')
+    
+    def testShouldStopWaitingForTheOtherFetchesOnceTheSessionHasExpired(self):
+        handler = VehicleAvailabilityHandler(self.session_source, self.vehicle_source, 
+                                 self.vehicle_view, self.error_view)
+        handler.request = self.request
+        handler.response = self.response
+        
+        @patch(handler)
+        def get_user_id(self):
+            return 'user1234'
+        
+        @patch(handler)
+        def get_session_id(self):
+            return 'ses1234'
+        
+        @patch(handler)
+        def get_ceiled_time_range(self):
+            return 1, 100
+        
+        @patch(handler)
+        def prepare_session_fetch(self, userid, sessionid):
+            return Fetch.done(None)
+        
+        @patch(self.vehicle_source)
+        def prepare_vehicle_availability_fetch(self, sessionid, vehicleid, start_time, end_time):
+            return Fetch.done(None)
+        
+        @patch(self.vehicle_source)
+        def prepare_vehicle_price_estimate_fetch(self, sessionid, vehicleid, start_time, end_time):
+            return Fetch.done(None)
+        
+        # Given a session fetch that comes back expired while the others are
+        # still pending...
+        @patch(self.vehicle_source)
+        def fetch_each(self, fetches):
+            try:
+                yield 0, ScreenscrapeFetchError('Your session is invalid.', 'invalid_session')
+                self.waited_for_the_rest = True
+                yield 1, 'my vehicle availability'
+                yield 2, 'my price estimate'
+            finally:
+                self.abandoned = True
+        
+        @patch(self.error_view)
+        def render_error(self, error_code, error_msg, error_detail):
+            return error_code
+        
+        # When the handler runs...
+        self.vehicle_source.waited_for_the_rest = False
+        self.vehicle_source.abandoned = False
+        handler.get('veh1234')
+        
+        # Then it reports the expired session without waiting on the others.
+        self.assertEqual(self.response.out.getvalue(), 'invalid_session')
+        self.assert_(not self.vehicle_source.waited_for_the_rest)
+        self.assert_(self.vehicle_source.abandoned)
 
 class VehicleAvailabilityHandlerAndScreenscrapeSourceTest (unittest.TestCase):
     
@@ -238,6 +434,7 @@ class VehicleAvailabilityHandlerAndScreenscrapeSourceTest (unittest.TestCase):
         import StringIO
         class StubResponse (object):
             out = StringIO.StringIO()
+            headers = StubHeaders()
             def set_status(self, status):
                 self.status = status
         
@@ -851,6 +1048,68 @@ class AvailabilityScreenscrapeSourceTest (unittest.TestCase):
         # Then...
         self.assertEqual([va.vehicle.model.name for va in vehicle_availabilities], ['Tacoma Pickup','Prius Liftback','Honda Element','Prius Liftback'])
     
+    def testStreamingParserShouldFindTheSameVehiclesAsTheDocumentParser(self):
+        from strings_for_testing import RESULTS_FOR_VEHICLES_NEAR_LOCATION
+        json_data = self.source.get_json_data(RESULTS_FOR_VEHICLES_NEAR_LOCATION)
+        start_time = datetime.datetime(2010, 8, 24, 11, 15, tzinfo=Eastern)
+        end_time = datetime.datetime(2010, 8, 24, 14, 15, tzinfo=Eastern)
+        
+        def describe(vehicle_availability):
+            description = dict(vars(vehicle_availability))
+            vehicle = description.pop('vehicle')
+            description['vehicle_id'] = vehicle.id
+            description['model_name'] = vehicle.model.name
+            description['pod_id'] = vehicle.pod.id
+            description['pod_name'] = vehicle.pod.name
+            return description
+        
+        expected = self.source.create_vehicles_from_pcs_availability_doc(
+            self.source.get_html_data(json_data), start_time, end_time)
+        actual = self.source.generate_vehicles_from_pod_fragments(
+            self.source.get_pod_fragments(json_data), start_time, end_time)
+        
+        expected = [describe(vav) for vav in expected]
+        actual = [describe(vav) for vav in actual]
+        self.assertEqual(len(actual), 5)
+        self.assertEqual(actual, expected)
+        self.assertEqual(actual[4]['pod_name'], '47th &amp; Baltimore')
+        self.assertEqual(actual[4]['availability'], 'part')
+    
+    def testShouldOnlyStreamThePodFragmentsWithTheBeautifulSoupBackend(self):
+        # Given...
+        from strings_for_testing import RESULTS_FOR_VEHICLES_NEAR_LOCATION
+        json_data = self.source.get_json_data(RESULTS_FOR_VEHICLES_NEAR_LOCATION)
+        start_time = datetime.datetime(2010, 8, 24, 11, 15, tzinfo=Eastern)
+        end_time = datetime.datetime(2010, 8, 24, 14, 15, tzinfo=Eastern)
+        
+        used = []
+        
+        streamed = self.source.generate_vehicles_from_pod_fragments
+        @patch(self.source)
+        def generate_vehicles_from_pod_fragments(self, pod_fragments, start_time, end_time):
+            used.append('stream')
+            return streamed(pod_fragments, start_time, end_time)
+        
+        from_tree = self.source.create_vehicles_from_pcs_availability_doc
+        @patch(self.source)
+        def create_vehicles_from_pcs_availability_doc(self, pcs_results_doc, start_time, end_time):
+            used.append('tree')
+            return from_tree(pcs_results_doc, start_time, end_time)
+        
+        for name, backend in backends.items():
+            self.source.html_backend = backend
+            del used[:]
+            
+            # When...
+            vehicles = self.source.create_vehicles_from_pcs_availability_data(json_data, start_time, end_time)
+            
+            # Then...
+            self.assertEqual(len(vehicles), 5)
+            if name == 'beautifulsoup':
+                self.assertEqual(used, ['stream'])
+            else:
+                self.assertEqual(used, ['tree'])
+    
     def testShouldCorrectlyParseAvailabilityFromStipulationAboutEarliestAvailability(self):
         source = AvailabilityScreenscrapeSource()
         class StubVehicle (object):
@@ -1321,6 +1580,93 @@ class AvailabilityScreenscrapeSourceTest (unittest.TestCase):
         start_time = end_time = current_time()
         self.source.fetch_vehicle_availability(sessionid, vehicleid, start_time, end_time)
 
+    def testShouldOnlyRequestVehicleAvailabilityOnceWhenCached(self):
+        from strings_for_testing import VEHICLE_AVAIL_FOR_NEW_RESERVATION
+        from util.cache import LruCache
+        conn = StubConnection()
+        self.source.vehicle_cache = LruCache(max_bytes=1024, ttl=60)
+        
+        @patch(self.source)
+        def create_host_connection(self):
+            return conn
+        
+        @patch(conn)
+        def request(self, url, method, data, headers):
+            self.requests = getattr(self, 'requests', 0) + 1
+            class StubResponse (object):
+                def getheaders(self): return {}
+                def read(self): return VEHICLE_AVAIL_FOR_NEW_RESERVATION
+            return StubResponse()
+        
+        sessionid = 'ses1234'
+        vehicleid = '96692246'
+        start_time = end_time = current_time()
+        first = self.source.fetch_vehicle_availability(sessionid, vehicleid, start_time, end_time)
+        second = self.source.fetch_vehicle_availability(sessionid, vehicleid, start_time, end_time)
+        
+        self.assertEqual(conn.requests, 1)
+        self.assertEqual(second.vehicle.model.name, 'Prius Liftback')
+        self.assert_(first is not second)
+
+    def testShouldSendTheRequestsOfAllFetchesInOneBatch(self):
+        from strings_for_testing import VEHICLE_AVAIL_FOR_NEW_RESERVATION
+        conn = StubConnection()
+        
+        @patch(self.source)
+        def create_host_connection(self):
+            return conn
+        
+        @patch(conn)
+        def request_each(self, batch_requests):
+            self.batch = batch_requests
+            class StubResponse (object):
+                def getheaders(self): return {}
+                def read(self): return VEHICLE_AVAIL_FOR_NEW_RESERVATION
+            yield 1, ScreenscrapeFetchError('Price failed')
+            yield 0, StubResponse()
+        
+        start_time = end_time = current_time()
+        vehicle_fetch = self.source.prepare_vehicle_availability_fetch(
+            'ses1234', '96692246', start_time, end_time)
+        price_fetch = self.source.prepare_vehicle_price_estimate_fetch(
+            'ses1234', '96692246', start_time, end_time)
+        
+        results = dict(self.source.fetch_each([vehicle_fetch, price_fetch]))
+        vehicle_availability, price_error = results[0], results[1]
+        
+        self.assertEqual(conn.batch, [vehicle_fetch.request, price_fetch.request])
+        self.assertEqual(vehicle_fetch.request[0], 'http://res.pcs.org/vehicle.php')
+        self.assertEqual(vehicle_availability.vehicle.model.name, 'Prius Liftback')
+        self.assertEqual(str(price_error), 'Price failed')
+    
+    def testShouldNotRequestACachedVehicleAvailability(self):
+        from strings_for_testing import VEHICLE_AVAIL_FOR_NEW_RESERVATION
+        from util.cache import LruCache
+        self.source.vehicle_cache = LruCache(max_bytes=1024, ttl=60)
+        conn = StubConnection()
+        
+        @patch(self.source)
+        def create_host_connection(self):
+            return conn
+        
+        @patch(conn)
+        def request_each(self, batch_requests):
+            self.requests = getattr(self, 'requests', 0) + len(batch_requests)
+            class StubResponse (object):
+                def getheaders(self): return {}
+                def read(self): return VEHICLE_AVAIL_FOR_NEW_RESERVATION
+            for index in range(len(batch_requests)):
+                yield index, StubResponse()
+        
+        start_time = end_time = current_time()
+        for _ in range(2):
+            fetch = self.source.prepare_vehicle_availability_fetch(
+                'ses1234', '96692246', start_time, end_time)
+            [(_, vehicle_availability)] = list(self.source.fetch_each([fetch]))
+        
+        self.assertEqual(conn.requests, 1)
+        self.assertEqual(vehicle_availability.vehicle.model.name, 'Prius Liftback')
+
 class LocationAvailabilityJsonHandlerTest (unittest.TestCase):
     def testShouldBeInitializedWithJsonViewsAndScreenscrapeSources(self):
         handler = LocationAvailabilityJsonHandler()
@@ -1341,26 +1687,26 @@ class LocationAvailabilityJsonHandlerTest (unittest.TestCase):
 
 
 class AvailabilityJsonViewTest (unittest.TestCase):
-    def testShouldPassVariablesToTheTemplateCorrectly(self):
-        self.path = None
-        self.values = None
-        
-        def stub_render_method(stub_path, stub_values):
-            self.path = stub_path
-            self.values = stub_values
-            return 'the rendering'
+    def testShouldEscapeStringsSoThatTheResponseIsValidJson(self):
+        class StubData (object):
+            pass
         
-        session = 'my session'
-        location = 'my location'
+        # Given...
+        location = StubData()
+        location.id = 'l1'
+        location.name = '30th & "Walnut"\\Chestnut'
         start_time = datetime.datetime(2010,11,1,tzinfo=Eastern)
         end_time = datetime.datetime(2011,1,1,tzinfo=Eastern)
-        vehicle_availabilities = ['v1','v2']
-        view = AvailabilityJsonView(stub_render_method)
+        view = AvailabilityJsonView()
         
-        rendering = view.render_location_availability(session, location, start_time, end_time, vehicle_availabilities)
+        # When...
+        rendering = view.render_location_availability(None, location, start_time, end_time, [])
         
-        self.assertEqual(self.values, {'session':'my session', 'location':'my location', 'start_time':datetime.datetime(2010,11,1,tzinfo=Eastern), 'end_time':datetime.datetime(2011,1,1,tzinfo=Eastern), 'start_stamp': 1288584000, 'end_stamp': 1293858000, 'vehicle_availabilities':['v1','v2']})
-        self.assertEqual(rendering, 'the rendering')
+        # Then...
+        data = json.loads(rendering)
+        self.assertEqual(data['location_availability']['location']['name'],
+                         '30th & "Walnut"\\Chestnut')
+        self.assertEqual(data['location_availability']['vehicle_availabilities'], [])
     
     def testShouldRenderVehicleAvailabilityCorrectly(self):
         class StubData (object):
@@ -1386,7 +1732,7 @@ class AvailabilityJsonViewTest (unittest.TestCase):
         view = AvailabilityJsonView()
         rendering = view.render_vehicle_availability(session, vav)
 
-        self.assertEqual(rendering, 
+        self.assertEqual(json.loads(rendering), json.loads(
 '''{"vehicle_availability" : {
 	"start_time" : "2010-11-01T02:30",
 	"end_time" : "2011-01-01T05:15",
@@ -1400,7 +1746,7 @@ class AvailabilityJsonViewTest (unittest.TestCase):
 	"price" : {
 		"total_amount" : 2.0 }
 }}
-''')
+'''))
     
     def testShouldRenderLocationAvailabilityCorrectly(self):
     		class StubData (object):
@@ -1446,7 +1792,7 @@ class AvailabilityJsonViewTest (unittest.TestCase):
     		view = AvailabilityJsonView()
     		rendering = view.render_location_availability(session, location, start_time, end_time, vehicle_availabilities)
     		
-    		self.assertEqual(
+    		self.assertEqual(json.loads(
 """{"location_availability" : {
 	"location" : {
 		"id" : "location id",
@@ -1500,8 +1846,8 @@ class AvailabilityJsonViewTest (unittest.TestCase):
 
 	]
 }}
-""",
-    		rendering)
+"""),
+    		json.loads(rendering))
     
     def testShouldRenderCoordinateAvailabilityCorrectly(self):
     		class StubData (object):
@@ -1528,7 +1874,7 @@ class AvailabilityJsonViewTest (unittest.TestCase):
     		view = AvailabilityJsonView()
     		rendering = view.render_location_availability(session, location, start_time, end_time, vehicle_availabilities)
     		
-    		self.assertEqual(
+    		self.assertEqual(json.loads(
 """{"location_availability" : {
 	"location" : {
 		"id" : "lat,lon",
@@ -1554,5 +1900,5 @@ class AvailabilityJsonViewTest (unittest.TestCase):
 
 	]
 }}
-""",
-    		rendering)
+"""),
+    		json.loads(rendering))
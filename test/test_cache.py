@@ -0,0 +1,122 @@
+import unittest
+
+from util.cache import LruCache
+from util.cache import TtlCache
+
+class StubClock (object):
+    def __init__(self):
+        self.now = 1000.0
+    def __call__(self):
+        return self.now
+
+class TtlCacheTest (unittest.TestCase):
+    def setUp(self):
+        self.clock = StubClock()
+        self.cache = TtlCache(ttl=10, timer=self.clock)
+    
+    def testShouldReturnStoredValueUntilItExpires(self):
+        self.cache.set('ses1234', 'my session')
+        
+        self.clock.now += 9
+        self.assertEqual(self.cache.get('ses1234'), 'my session')
+        
+        self.clock.now += 1
+        self.assertEqual(self.cache.get('ses1234'), None)
+        self.assertEqual(len(self.cache), 0)
+    
+    def testShouldUseGivenTtlInsteadOfDefault(self):
+        self.cache.set('ses1234', 'my session', ttl=2)
+        
+        self.clock.now += 2
+        self.assertEqual(self.cache.get('ses1234', 'nothing'), 'nothing')
+    
+    def testShouldForgetDeletedValues(self):
+        self.cache.set('ses1234', 'my session')
+        self.cache.delete('ses1234')
+        self.cache.delete('ses5678')
+        
+        self.assertEqual(self.cache.get('ses1234'), None)
+    
+    def testShouldEvictTheEntryClosestToExpiringWhenFull(self):
+        cache = TtlCache(ttl=10, max_entries=2, timer=self.clock)
+        cache.set('a', 1)
+        cache.set('b', 2, ttl=5)
+        cache.set('c', 3)
+        
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.stats.get('evicted'), 1)
+    
+    def testShouldDropExpiredEntriesBeforeEvictingLiveOnes(self):
+        cache = TtlCache(ttl=10, max_entries=2, timer=self.clock)
+        cache.set('a', 1, ttl=1)
+        cache.set('b', 2)
+        self.clock.now += 1
+        cache.set('c', 3)
+        
+        self.assertEqual(cache.get('b'), 2)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.stats.get('evicted'), 0)
+    
+    def testShouldCountHitsAndMisses(self):
+        self.assertEqual(self.cache.hit_rate(), None)
+        
+        self.cache.set('ses1234', 'my session')
+        self.cache.get('ses1234')
+        self.cache.get('ses1234')
+        self.cache.get('ses5678')
+        self.cache.get('ses1234')
+        
+        self.assertEqual(self.cache.stats.get('hits'), 3)
+        self.assertEqual(self.cache.stats.get('misses'), 1)
+        self.assertEqual(self.cache.hit_rate(), 0.75)
+
+class LruCacheTest (unittest.TestCase):
+    def setUp(self):
+        self.clock = StubClock()
+        self.cache = LruCache(max_bytes=10, ttl=10, timer=self.clock)
+    
+    def testShouldEvictLeastRecentlyUsedValuesToStayWithinBudget(self):
+        self.cache.set('a', 'aaaa')
+        self.cache.set('b', 'bbbb')
+        self.cache.get('a')
+        self.cache.set('c', 'cccc')
+        
+        self.assertEqual(self.cache.get('a'), 'aaaa')
+        self.assertEqual(self.cache.get('b'), None)
+        self.assertEqual(self.cache.get('c'), 'cccc')
+        self.assertEqual(self.cache.size(), 8)
+        self.assertEqual(self.cache.stats.get('evicted'), 1)
+    
+    def testShouldExpireValuesAfterTheirTtl(self):
+        self.cache.set('a', 'aaaa', ttl=1)
+        self.cache.set('b', 'bbbb')
+        
+        self.clock.now += 1
+        self.assertEqual(self.cache.get('a'), None)
+        self.assertEqual(self.cache.get('b'), 'bbbb')
+        self.assertEqual(self.cache.size(), 4)
+    
+    def testShouldUseGivenSizeInsteadOfSizeof(self):
+        self.cache.set('a', 'aaaa', size=7)
+        self.cache.set('b', 'bbbb', size=7)
+        
+        self.assertEqual(len(self.cache), 1)
+        self.assertEqual(self.cache.get('b'), 'bbbb')
+    
+    def testShouldNotStoreValuesLargerThanTheWholeCache(self):
+        self.cache.set('a', 'aaaa')
+        self.cache.set('b', 'b' * 11)
+        
+        self.assertEqual(self.cache.get('a'), 'aaaa')
+        self.assertEqual(self.cache.get('b'), None)
+    
+    def testShouldReplaceValuesSetUnderTheSameKey(self):
+        self.cache.set('a', 'aaaa')
+        self.cache.set('a', 'aaaaaa')
+        
+        self.assertEqual(self.cache.get('a'), 'aaaaaa')
+        self.assertEqual(self.cache.size(), 6)
+        self.assertEqual(self.cache.stats.get('entries'), 1)
+        self.assertEqual(self.cache.stats.get('bytes'), 6)
@@ -0,0 +1,127 @@
+import datetime
+import os
+import tempfile
+import unittest
+
+from util.testing import patch
+
+from pcs.fetchers.screenscrape.availability import AvailabilityScreenscrapeSource
+from pcs.fetchers.screenscrape.cassette import Cassette
+from pcs.fetchers.screenscrape.pcsconnection import PcsConnection
+from pcs.fetchers.screenscrape.pcsconnection import PcsConnectionError
+from pcs.fetchers.screenscrape.pcsconnection import PcsResponse
+from pcs.fetchers.screenscrape.session import SessionScreenscrapeSource
+from util.TimeZone import Eastern
+
+class CassetteTest (unittest.TestCase):
+    def setUp(self):
+        self.conn = PcsConnection()
+        self.conn.backend = PcsConnection.HTTPLIB_BACKEND
+        self.conn.coalescer = None
+        self.conn.breakers = None
+        self.conn.rate_limiter = None
+        
+        self.sent = []
+        test = self
+        
+        @patch(self.conn)
+        def request_with_httplib(self, url, method, data, headers):
+            test.sent.append(url)
+            return PcsResponse(200, 'body of %s \xe9' % url, [('x-pcs', 'yes')])
+    
+    def testShouldPlayBackRecordedResponsesWithoutContactingPcs(self):
+        # Given...
+        self.conn.cassette = Cassette(Cassette.RECORD)
+        self.conn.request('http://localhost/a', 'GET', {}, {'Cookie': 'sid=ses1234'})
+        
+        # When...
+        self.conn.cassette.mode = Cassette.REPLAY
+        response = self.conn.request('http://localhost/a', 'GET', {}, {'Cookie': 'sid=ses5678'})
+        
+        # Then...
+        self.assertEqual(self.sent, ['http://localhost/a'])
+        self.assertEqual(response.read(), 'body of http://localhost/a \xe9')
+        self.assertEqual(response.getheader('X-PCS'), 'yes')
+    
+    def testShouldSaveAndLoadTheRecordedResponses(self):
+        self.conn.cassette = Cassette(Cassette.RECORD)
+        self.conn.request('http://localhost/a', 'POST', 'x=1', {})
+        
+        fd, path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        try:
+            self.conn.cassette.save(path)
+            self.conn.cassette = Cassette.load(path)
+        finally:
+            os.remove(path)
+        
+        response = self.conn.request('http://localhost/a', 'POST', 'x=1', {})
+        self.assertEqual(response.read(), 'body of http://localhost/a \xe9')
+        self.assertEqual(len(self.sent), 1)
+    
+    def testShouldNotSaveCredentialsOrSessionCookiesFromALogin(self):
+        # Given...
+        @patch(self.conn)
+        def request_with_httplib(self, url, method, data, headers):
+            return PcsResponse(200,
+                '<html><head><title>My Message Manager</title></head></html>',
+                [('set-cookie', 'sid=ses1234; path=/'), ('x-pcs', 'yes')])
+        
+        source = SessionScreenscrapeSource(host='localhost', login_scheme='http')
+        source.create_host_connection = lambda: self.conn
+        self.conn.cassette = Cassette(Cassette.RECORD)
+        source.create_session('mjumbe', 'my secret')
+        
+        # When...
+        fd, path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        try:
+            self.conn.cassette.save(path)
+            saved = open(path).read()
+            self.conn.cassette = Cassette.load(path)
+        finally:
+            os.remove(path)
+        
+        # Then...
+        self.assert_('secret' not in saved)
+        self.assert_('mjumbe' not in saved)
+        self.assert_('ses1234' not in saved)
+        
+        session = source.create_session('someone', 'else')
+        self.assertEqual(session.id, Cassette.REDACTED)
+    
+    def testShouldTakeAsLongAsTheResponseOriginallyTookTimesTheScale(self):
+        slept = []
+        cassette = Cassette(Cassette.REPLAY, latency_scale=0.5, sleep=slept.append)
+        cassette.add('http://localhost/a', 'GET', {}, {}, 200, 'body', elapsed=3)
+        
+        cassette.play('http://localhost/a', 'GET', {}, {})
+        
+        self.assertEqual(slept, [1.5])
+    
+    def testShouldFailForARequestThatWasNeverRecorded(self):
+        self.conn.cassette = Cassette(Cassette.REPLAY)
+        
+        self.assertRaises(PcsConnectionError,
+            self.conn.request, 'http://localhost/a', 'GET', {}, {})
+    
+    def testSourcesShouldWorkFromResponsesSeededFromTheFixtures(self):
+        from strings_for_testing import RESULTS_FOR_VEHICLES_NEAR_LOCATION
+        
+        start_time = datetime.datetime(2010, 8, 23, 1, 15, tzinfo=Eastern)
+        end_time = datetime.datetime(2010, 8, 23, 3, 15, tzinfo=Eastern)
+        source = AvailabilityScreenscrapeSource(host='localhost')
+        
+        cassette = Cassette(Cassette.REPLAY)
+        url = 'http://localhost/results.php?reservation_id=0&flexible=on&show_everything=on&offset=0&' \
+            + source.get_location_query('loc1234') + '&' \
+            + source.get_time_query(start_time, end_time)
+        cassette.add(url, 'GET', {}, {}, 200, RESULTS_FOR_VEHICLES_NEAR_LOCATION)
+        self.conn.cassette = cassette
+        source.create_host_connection = lambda: self.conn
+        
+        vehicles = source.fetch_available_vehicles_near('ses1234', 'loc1234',
+                                                        start_time, end_time)
+        
+        self.assertEqual(len(vehicles), 5)
+        self.assertEqual(self.sent, [])
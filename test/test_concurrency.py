@@ -0,0 +1,107 @@
+import datetime
+import random
+import threading
+import time
+import unittest
+
+from pcs.fetchers.screenscrape.availability import AvailabilityScreenscrapeSource
+from pcs.fetchers.screenscrape.reservations import ReservationsScreenscrapeSource
+from util.context import begin_request
+from util.context import current_context
+from util.context import use_context
+from util.parallel import WorkerPool
+from util.TimeZone import Eastern
+
+class StubResponse (object):
+    def __init__(self, body):
+        self.body = body
+    def read(self):
+        return self.body
+    def getheaders(self):
+        return [('x-body-for', self.body[:20])]
+
+class StubConnection (object):
+    """
+    Answers each request with the body for the session in its cookie, after a
+    short, random wait so that the threads' requests overlap.
+    """
+    def __init__(self, bodies):
+        self.bodies = bodies
+    def request(self, url, method, data, headers):
+        time.sleep(random.random() * 0.002)
+        sessionid = headers['Cookie'][len('sid='):]
+        return StubResponse(self.bodies[sessionid])
+
+class SharedSourceStressTest (unittest.TestCase):
+    THREADS = 8
+    CALLS_PER_THREAD = 10
+    
+    def run_threads(self, check):
+        failures = []
+        def run(index):
+            begin_request()
+            try:
+                for _ in range(self.CALLS_PER_THREAD):
+                    check(index)
+            except Exception, e:
+                failures.append((index, e))
+            use_context(None)
+        
+        threads = [threading.Thread(target=run, args=(index,))
+                   for index in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(failures, [])
+    
+    def testConcurrentAvailabilitySearchesShouldNotSeeEachOthersVehicles(self):
+        from strings_for_testing import RESULTS_FOR_VEHICLES_NEAR_LOCATION
+        
+        bodies = {}
+        for index in range(self.THREADS):
+            bodies['ses%d' % index] = RESULTS_FOR_VEHICLES_NEAR_LOCATION \
+                .replace('91800598', '9180%04d' % index)
+        conn = StubConnection(bodies)
+        
+        source = AvailabilityScreenscrapeSource()
+        source.create_host_connection = lambda: conn
+        workers = WorkerPool(max_workers=4)
+        
+        start_time = datetime.datetime(2010, 8, 23, 1, 15, tzinfo=Eastern)
+        end_time = datetime.datetime(2010, 8, 23, 3, 15, tzinfo=Eastern)
+        
+        def check(index):
+            # Go through a worker too, as the handlers do.
+            task = workers.submit(source.fetch_available_vehicles_near,
+                                  'ses%d' % index, 'loc1234', start_time, end_time)
+            vehicles = task.result(10)
+            
+            self.assertEqual(len(vehicles), 5)
+            self.assertEqual(vehicles[0].vehicle.id, '9180%04d' % index)
+            
+            body, headers = current_context().get('pcs_response')
+            self.assertEqual(body, bodies['ses%d' % index])
+        
+        self.run_threads(check)
+    
+    def testConcurrentReservationFetchesShouldNotSeeEachOthersReservations(self):
+        from strings_for_testing import ONE_UPCOMING_RESERVATION
+        
+        bodies = {}
+        for index in range(self.THREADS):
+            bodies['ses%d' % index] = ONE_UPCOMING_RESERVATION \
+                .replace('2472498', '%07d' % index)
+        conn = StubConnection(bodies)
+        
+        source = ReservationsScreenscrapeSource()
+        source.get_pcs_connection = lambda: conn
+        
+        def check(index):
+            reservations, page, count = source.fetch_reservations('ses%d' % index)
+            
+            self.assertEqual(len(reservations), 1)
+            self.assertEqual(reservations[0].logid, '%07d' % index)
+        
+        self.run_threads(check)
@@ -4,8 +4,26 @@ import StringIO
 from util.testing import Stub
 from util.testing import patch
 
+from pcs.fetchers.screenscrape import pcsconnection
+from pcs.fetchers.screenscrape.pcsconnection import ContentDecoder
+from pcs.fetchers.screenscrape.pcsconnection import DownloadError
 from pcs.fetchers.screenscrape.pcsconnection import PcsConnection
 from pcs.fetchers.screenscrape.pcsconnection import PcsConnectionError
+from pcs.fetchers.screenscrape.pcsconnection import PcsResponse
+from pcs.fetchers.screenscrape.pcsconnection import PcsUnavailableError
+from util import metrics
+from util.context import begin_request
+from util.context import use_context
+from util.deadline import current_deadline
+from util.deadline import Deadline
+from util.deadline import DeadlineExceededError
+from util.ratelimit import RateLimiter
+from util.retry import CircuitBreaker
+from util.retry import CircuitBreakers
+from util.retry import RetryPolicy
+from util.parallel import Hedger
+from util.parallel import SingleFlight
+from util.parallel import WorkerPool
 class PcsConnectionTest (unittest.TestCase):
     def testShouldParseUrlCorrectly1(self):
         conn = PcsConnection()
@@ -65,3 +83,866 @@ class PcsConnectionTest (unittest.TestCase):
         
         self.assertEqual(https_conn.__class__.__name__, 'HTTPSConnection')
 
+
+from pcs.fetchers.screenscrape.pcsconnection import PcsConnectionPool
+class PcsConnectionPoolTest (unittest.TestCase):
+    class StubHostConnection (object):
+        def __init__(self):
+            self.closed = False
+        def close(self):
+            self.closed = True
+    
+    def create_stub_connection(self, scheme, host):
+        return self.StubHostConnection()
+    
+    def testShouldReuseAReleasedConnectionToTheSameHost(self):
+        pool = PcsConnectionPool(stats_name='test_pool')
+        
+        conn1, reused1 = pool.acquire('http', 'localhost', self.create_stub_connection)
+        pool.release('http', 'localhost', conn1)
+        conn2, reused2 = pool.acquire('http', 'localhost', self.create_stub_connection)
+        
+        self.assert_(conn1 is conn2)
+        self.assertEqual((reused1, reused2), (False, True))
+        self.assertEqual(pool.stats.get('hits'), 1)
+        self.assertEqual(pool.stats.get('misses'), 1)
+    
+    def testShouldNotShareConnectionsBetweenSchemesOrHosts(self):
+        pool = PcsConnectionPool(stats_name='test_pool')
+        
+        conn1, _ = pool.acquire('http', 'localhost', self.create_stub_connection)
+        pool.release('http', 'localhost', conn1)
+        conn2, _ = pool.acquire('https', 'localhost', self.create_stub_connection)
+        conn3, _ = pool.acquire('http', 'otherhost', self.create_stub_connection)
+        
+        self.assert_(conn2 is not conn1)
+        self.assert_(conn3 is not conn1)
+        self.assertEqual(pool.stats.get('misses'), 3)
+    
+    def testShouldCloseConnectionsBeyondTheMaxIdleCount(self):
+        pool = PcsConnectionPool(max_idle=1, stats_name='test_pool')
+        
+        conn1, _ = pool.acquire('http', 'localhost', self.create_stub_connection)
+        conn2, _ = pool.acquire('http', 'localhost', self.create_stub_connection)
+        pool.release('http', 'localhost', conn1)
+        pool.release('http', 'localhost', conn2)
+        
+        self.assert_(not conn1.closed)
+        self.assert_(conn2.closed)
+    
+    def testShouldDropStaleConnections(self):
+        pool = PcsConnectionPool(idle_timeout=-1, stats_name='test_pool')
+        
+        conn1, _ = pool.acquire('http', 'localhost', self.create_stub_connection)
+        pool.release('http', 'localhost', conn1)
+        conn2, reused = pool.acquire('http', 'localhost', self.create_stub_connection)
+        
+        self.assert_(conn1.closed)
+        self.assert_(conn2 is not conn1)
+        self.assert_(not reused)
+        self.assertEqual(pool.stats.get('stale'), 1)
+    
+    def testShouldTimeOutWhenTooManyConnectionsToAHostAreOpen(self):
+        pool = PcsConnectionPool(max_per_host=1, wait_timeout=0, stats_name='test_pool')
+        
+        pool.acquire('http', 'localhost', self.create_stub_connection)
+        
+        try:
+            pool.acquire('http', 'localhost', self.create_stub_connection)
+        except PcsConnectionError:
+            return
+        
+        self.fail('Should not open more than max_per_host connections')
+    
+    def testShouldMakeAFreshConnectionEvenWhenOneIsIdle(self):
+        pool = PcsConnectionPool(max_per_host=1, wait_timeout=0, stats_name='test_pool')
+        
+        conn1, _ = pool.acquire('http', 'localhost', self.create_stub_connection)
+        pool.release('http', 'localhost', conn1)
+        conn2, reused = pool.acquire('http', 'localhost', self.create_stub_connection,
+                                     fresh=True)
+        
+        self.assert_(conn1.closed)
+        self.assert_(conn2 is not conn1)
+        self.assert_(not reused)
+    
+    def testDiscardedConnectionsShouldMakeRoomForNewOnes(self):
+        pool = PcsConnectionPool(max_per_host=1, wait_timeout=0, stats_name='test_pool')
+        
+        conn1, _ = pool.acquire('http', 'localhost', self.create_stub_connection)
+        pool.discard('http', 'localhost', conn1)
+        conn2, _ = pool.acquire('http', 'localhost', self.create_stub_connection)
+        
+        self.assert_(conn1.closed)
+        self.assert_(conn2 is not conn1)
+
+class PcsConnectionHttplibRequestTest (unittest.TestCase):
+    class StubHttplibResponse (object):
+        def __init__(self, status, body, headers, will_close=False):
+            self.status = status
+            self.body = body
+            self.headers = headers
+            self.will_close = will_close
+        def read(self, amt=None):
+            if amt is None:
+                amt = len(self.body)
+            chunk, self.body = self.body[:amt], self.body[amt:]
+            return chunk
+        def getheaders(self):
+            return self.headers
+    
+    def setUp(self):
+        self.conn = PcsConnection()
+        self.conn.backend = PcsConnection.HTTPLIB_BACKEND
+        self.conn.pool = PcsConnectionPool(stats_name='test_pool')
+        self.host_conns = []
+        self.responses = []
+        
+        test = self
+        class StubHostConnection (object):
+            def __init__(self, host):
+                self.host = host
+                self.requests = []
+            def request(self, method, path, data, headers):
+                self.requests.append((method, path, data, headers))
+            def getresponse(self):
+                response = test.responses.pop(0)
+                if isinstance(response, Exception):
+                    raise response
+                return response
+            def close(self):
+                pass
+        
+        @patch(self.conn)
+        def create_host_connection(self, scheme, host):
+            host_conn = StubHostConnection(host)
+            test.host_conns.append(host_conn)
+            return host_conn
+    
+    def testShouldReuseTheSocketForSubsequentRequestsToAHost(self):
+        self.responses = [
+            self.StubHttplibResponse(200, 'body 1', []),
+            self.StubHttplibResponse(200, 'body 2', [])]
+        
+        response1 = self.conn.request('http://localhost/a', 'GET', {}, {})
+        response2 = self.conn.request('http://localhost/b', 'GET', {}, {})
+        
+        self.assertEqual(len(self.host_conns), 1)
+        self.assertEqual([r[1] for r in self.host_conns[0].requests], ['/a', '/b'])
+        self.assertEqual(response1.read(), 'body 1')
+        self.assertEqual(response2.read(), 'body 2')
+    
+    def testShouldFollowRedirectsOverThePooledSocket(self):
+        self.responses = [
+            self.StubHttplibResponse(302, '', [('location', 'http://localhost/b')]),
+            self.StubHttplibResponse(200, 'redirected body', [])]
+        
+        response = self.conn.request('http://localhost/a', 'GET', {}, {})
+        
+        self.assertEqual(len(self.host_conns), 1)
+        self.assertEqual(response.read(), 'redirected body')
+        self.assertEqual(self.conn.pool.stats.get('hits'), 1)
+    
+    def testShouldNotReuseASocketTheServerWillClose(self):
+        self.responses = [
+            self.StubHttplibResponse(200, 'body 1', [], will_close=True),
+            self.StubHttplibResponse(200, 'body 2', [])]
+        
+        self.conn.request('http://localhost/a', 'GET', {}, {})
+        self.conn.request('http://localhost/b', 'GET', {}, {})
+        
+        self.assertEqual(len(self.host_conns), 2)
+    
+    def testShouldRetryOnAFreshSocketWhenAPooledOneHasGoneAway(self):
+        import httplib
+        self.responses = [
+            self.StubHttplibResponse(200, 'body 1', []),
+            httplib.BadStatusLine(''),
+            self.StubHttplibResponse(200, 'body 2', [])]
+        
+        self.conn.request('http://localhost/a', 'GET', {}, {})
+        response = self.conn.request('http://localhost/b', 'GET', {}, {})
+        
+        self.assertEqual(len(self.host_conns), 2)
+        self.assertEqual(response.read(), 'body 2')
+    
+    def testShouldSendWritesOnAFreshSocket(self):
+        self.responses = [
+            self.StubHttplibResponse(200, 'body 1', []),
+            self.StubHttplibResponse(200, 'body 2', [])]
+        
+        self.conn.request('http://localhost/a', 'GET', {}, {})
+        response = self.conn.request('http://localhost/b', 'POST', 'reserve=1', {})
+        
+        self.assertEqual(len(self.host_conns), 2)
+        self.assertEqual([r[0] for r in self.host_conns[1].requests], ['POST'])
+        self.assertEqual(response.read(), 'body 2')
+    
+    def testShouldNotResendAWriteThatFails(self):
+        import httplib
+        self.responses = [
+            httplib.BadStatusLine(''),
+            self.StubHttplibResponse(200, 'body 2', [])]
+        
+        try:
+            self.conn.request('http://localhost/b', 'POST', 'reserve=1', {})
+        except PcsConnectionError:
+            pass
+        else:
+            self.fail('Should not have succeeded')
+        
+        self.assertEqual(len(self.host_conns), 1)
+        self.assertEqual(self.conn.pool.stats.get('discarded'), 1)
+    
+    def testShouldAskForAndDecompressAGzippedBody(self):
+        import gzip
+        body = '<html>' + 'reservation ' * 2000 + '</html>'
+        compressed = StringIO.StringIO()
+        gzip_file = gzip.GzipFile(fileobj=compressed, mode='wb')
+        gzip_file.write(body)
+        gzip_file.close()
+        compressed = compressed.getvalue()
+        
+        self.conn.READ_CHUNK_SIZE = 100
+        self.conn.transfer_stats = metrics.Counters('test_transfer')
+        self.responses = [self.StubHttplibResponse(200, compressed,
+            [('content-encoding', 'gzip')])]
+        
+        response = self.conn.request('http://localhost/my_reservations.php', 'GET', {}, {})
+        
+        self.assertEqual(response.read(), body)
+        method, path, data, headers = self.host_conns[0].requests[0]
+        self.assertEqual(headers['Accept-Encoding'], 'gzip, deflate')
+        self.assertEqual(self.conn.transfer_stats.get('wire_bytes'), len(compressed))
+        self.assertEqual(self.conn.transfer_stats.get('body_bytes'), len(body))
+
+class PcsConnectionIdleSocketTest (unittest.TestCase):
+    """
+    Talks to a real server that, like PCS, closes sockets that sit idle for
+    less time than the pool would keep them.
+    """
+    def setUp(self):
+        import BaseHTTPServer
+        import threading
+        
+        class IdleClosingHandler (BaseHTTPServer.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            timeout = 0.2
+            def do_GET(self):
+                self.respond('got')
+            def do_POST(self):
+                length = int(self.headers.getheader('content-length') or 0)
+                self.respond('posted ' + self.rfile.read(length))
+            def respond(self, body):
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            def log_message(self, *args):
+                pass
+        
+        self.server = BaseHTTPServer.HTTPServer(('localhost', 0), IdleClosingHandler)
+        thread = threading.Thread(target=self.server.serve_forever,
+                                  kwargs={'poll_interval': 0.05})
+        thread.setDaemon(True)
+        thread.start()
+        self.url = 'http://localhost:%s/' % self.server.server_address[1]
+        
+        self.conn = PcsConnection()
+        self.conn.backend = PcsConnection.HTTPLIB_BACKEND
+        self.conn.pool = PcsConnectionPool(idle_timeout=15, stats_name='test_pool')
+        self.conn.coalescer = None
+        self.conn.breakers = None
+        self.conn.rate_limiter = None
+    
+    def tearDown(self):
+        self.conn.pool.clear()
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def testShouldSendAPostAfterTheServerHasClosedAnIdleSocket(self):
+        import time
+        self.conn.request(self.url + 'a', 'GET', {}, {})
+        time.sleep(0.5)
+        
+        response = self.conn.request(self.url + 'b', 'POST', 'reserve=1', {})
+        
+        self.assertEqual(response.read(), 'posted reserve=1')
+    
+    def testShouldResendAGetAfterTheServerHasClosedAnIdleSocket(self):
+        import time
+        self.conn.request(self.url + 'a', 'GET', {}, {})
+        time.sleep(0.5)
+        
+        response = self.conn.request(self.url + 'b', 'GET', {}, {})
+        
+        self.assertEqual(response.read(), 'got')
+        self.assertEqual(self.conn.pool.stats.get('hits'), 1)
+
+class ContentDecoderTest (unittest.TestCase):
+    def testShouldDecompressDeflateBodiesWithOrWithoutTheZlibWrapper(self):
+        import zlib
+        body = 'location ' * 100
+        wrapped = zlib.compress(body)
+        raw = wrapped[2:-4]
+        
+        for compressed in (wrapped, raw):
+            decoder = ContentDecoder('deflate')
+            chunks = [decoder.decompress(compressed[i:i+10])
+                      for i in range(0, len(compressed), 10)]
+            self.assertEqual(''.join(chunks) + decoder.flush(), body)
+    
+    def testShouldRejectUnknownEncodings(self):
+        self.assertRaises(PcsConnectionError, ContentDecoder, 'br')
+
+class PcsConnectionCoalescingTest (unittest.TestCase):
+    def setUp(self):
+        self.conn = PcsConnection()
+        self.conn.backend = PcsConnection.HTTPLIB_BACKEND
+        self.conn.coalescer = SingleFlight()
+    
+    def testShouldOnlyShareResponsesToReadOnlyRequests(self):
+        conn = self.conn
+        
+        self.assert_(conn.is_read_only('http://localhost/results.php', 'GET', {}))
+        self.assert_(conn.is_read_only('http://localhost/lightbox.php', 'POST',
+            'default%5Bstack_pk%5D=96692246&mv_action=add'))
+        self.assert_(not conn.is_read_only('http://localhost/lightbox.php', 'POST',
+            'mv_action=add'))
+        self.assert_(not conn.is_read_only('http://localhost/lightbox.php?mv_action=add', 'POST',
+            'add%5Bstack_pk%5D=96692246'))
+    
+    def testConcurrentIdenticalRequestsShouldShareOneRoundTrip(self):
+        import threading
+        import time
+        release = threading.Event()
+        sent = []
+        
+        @patch(self.conn)
+        def request_with_httplib(self, url, method, data, headers):
+            sent.append(url)
+            release.wait(5)
+            return PcsResponse(200, 'body', [])
+        
+        workers = WorkerPool(max_workers=3)
+        tasks = [workers.submit(self.conn.request, 'http://localhost/a', 'GET',
+                                {}, {'Cookie': 'sid=ses1234'})
+                 for _ in range(3)]
+        while self.conn.coalescer.stats.get('coalesced') < 2:
+            time.sleep(0.01)
+        release.set()
+        
+        self.assertEqual([task.result(5).read() for task in tasks], ['body'] * 3)
+        self.assertEqual(sent, ['http://localhost/a'])
+    
+    def testShouldNotShareResponsesBetweenSessions(self):
+        conn = self.conn
+        
+        self.assertNotEqual(
+            conn.get_coalescing_key('http://localhost/a', 'GET', {}, {'Cookie': 'sid=ses1234'}),
+            conn.get_coalescing_key('http://localhost/a', 'GET', {}, {'Cookie': 'sid=ses5678'}))
+        self.assertEqual(
+            conn.get_coalescing_key('http://localhost/a', 'POST', 'mv_action=add', {}),
+            None)
+
+class PcsConnectionRetryTest (unittest.TestCase):
+    def setUp(self):
+        self.conn = PcsConnection()
+        self.conn.backend = PcsConnection.HTTPLIB_BACKEND
+        self.conn.coalescer = None
+        self.conn.breakers = CircuitBreakers(failure_threshold=3)
+        
+        self.slept = []
+        self.conn.read_retry_policy = RetryPolicy(retries=2, base_delay=0.1,
+            sleep=self.slept.append, random=lambda: 1.0)
+        self.conn.write_retry_policy = RetryPolicy(retries=0,
+            sleep=self.slept.append)
+    
+    def patch_failures(self, count):
+        import socket
+        sent = []
+        
+        @patch(self.conn)
+        def request_with_httplib(self, url, method, data, headers):
+            sent.append(url)
+            if len(sent) <= count:
+                raise socket.error('Connection refused')
+            return PcsResponse(200, 'body', [])
+        
+        return sent
+    
+    def testShouldRetryReadOnlyRequestsWithBackoff(self):
+        sent = self.patch_failures(2)
+        
+        response = self.conn.request('http://localhost/a', 'GET', {}, {})
+        
+        self.assertEqual(response.read(), 'body')
+        self.assertEqual(len(sent), 3)
+        self.assertEqual(self.slept, [0.1, 0.2])
+    
+    def testShouldNotRetryRequestsThatMayChangeSomething(self):
+        sent = self.patch_failures(1)
+        
+        try:
+            self.conn.request('http://localhost/lightbox.php', 'POST', 'mv_action=add', {})
+        except PcsConnectionError:
+            self.assertEqual(len(sent), 1)
+            return
+        
+        self.fail('Should not have retried the request')
+    
+    def testShouldFailFastOnceTheBreakerHasOpened(self):
+        sent = self.patch_failures(10)
+        
+        # Given three failed attempts...
+        try:
+            self.conn.request('http://localhost/a', 'GET', {}, {})
+        except PcsConnectionError:
+            pass
+        
+        # When...
+        try:
+            self.conn.request('http://localhost/a', 'GET', {}, {})
+        
+        # Then...
+        except PcsUnavailableError:
+            self.assertEqual(len(sent), 3)
+            self.assertEqual(self.conn.breakers.stats.get('rejected'), 1)
+            return
+        
+        self.fail('Should not have contacted PCS while the breaker is open')
+    
+    def testServerErrorsShouldCountAgainstTheBreaker(self):
+        @patch(self.conn)
+        def request_with_httplib(self, url, method, data, headers):
+            return PcsResponse(503, 'down for maintenance', [])
+        
+        for _ in range(3):
+            response = self.conn.request('http://localhost/a', 'GET', {}, {})
+            self.assertEqual(response.status, 503)
+        
+        self.assertEqual(self.conn.get_breaker('http://localhost/a').state(),
+                         CircuitBreaker.OPEN)
+    
+    def testOneFailingEndpointShouldNotBlockTheOthers(self):
+        @patch(self.conn)
+        def request_with_httplib(self, url, method, data, headers):
+            if '/results.php' in url:
+                return PcsResponse(503, 'down for maintenance', [])
+            return PcsResponse(200, 'body', [])
+        
+        for _ in range(3):
+            self.conn.request('http://localhost/results.php?offset=0', 'GET', {}, {})
+        
+        self.assertRaises(PcsUnavailableError, self.conn.request,
+            'http://localhost/results.php?offset=10', 'GET', {}, {})
+        response = self.conn.request('http://localhost/my_reservations.php', 'GET', {}, {})
+        self.assertEqual(response.read(), 'body')
+        self.assertEqual(self.conn.breakers.stats.get('open'), 1)
+
+class PcsConnectionDeadlineTest (unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.context = begin_request()
+        self.context.set('deadline', Deadline(15, timer=lambda: self.now))
+        
+        self.conn = PcsConnection()
+        self.conn.backend = PcsConnection.HTTPLIB_BACKEND
+        self.conn.coalescer = None
+        self.conn.breakers = None
+    
+    def tearDown(self):
+        use_context(None)
+    
+    def testEachHopShouldDrawOnTheRequestsRemainingTime(self):
+        test = self
+        timeouts = []
+        
+        @patch(self.conn)
+        def request_with_httplib(self, url, method, data, headers):
+            timeouts.append(self.get_timeout())
+            test.now += 8
+            if url.endswith('/a'):
+                return PcsResponse(302, '', [('location', 'http://localhost/b')])
+            return PcsResponse(200, 'body', [])
+        
+        self.conn.request('http://localhost/a', 'GET', {}, {})
+        
+        self.assertEqual(timeouts, [10, 7])
+    
+    def testShouldStopRetryingWhenTheRequestIsOutOfTime(self):
+        import socket
+        test = self
+        sent = []
+        
+        @patch(self.conn)
+        def request_with_httplib(self, url, method, data, headers):
+            sent.append(url)
+            test.now += 10
+            raise socket.error('timed out')
+        
+        self.conn.read_retry_policy = RetryPolicy(retries=5, sleep=lambda delay: None)
+        
+        self.assertRaises(DeadlineExceededError,
+            self.conn.request, 'http://localhost/a', 'GET', {}, {})
+        self.assertEqual(len(sent), 2)
+    
+    def testShouldLimitTheDeadlinesOfABatchOfRequests(self):
+        deadlines = []
+        
+        @patch(self.conn)
+        def request_each_with_threads(self, batch_requests):
+            for index, request in enumerate(batch_requests):
+                deadlines.append(request[4])
+                yield index, None
+        
+        self.now += 10
+        self.conn.request_many([
+            ('http://localhost/a', 'GET', {}, {}),
+            ('http://localhost/b', 'GET', {}, {}, 2)])
+        
+        self.assertEqual(deadlines, [5, 2])
+
+class PcsConnectionHedgingTest (unittest.TestCase):
+    def setUp(self):
+        self.conn = PcsConnection()
+        self.conn.backend = PcsConnection.HTTPLIB_BACKEND
+        self.conn.coalescer = None
+        self.conn.breakers = None
+        self.conn.hedger = Hedger(initial_delay=0, max_rate=1)
+        
+        self.sent = []
+        test = self
+        
+        @patch(self.conn)
+        def request_with_httplib(self, url, method, data, headers):
+            test.sent.append(url)
+            return PcsResponse(200, 'body', [])
+    
+    def testShouldOnlyHedgeReadOnlyRequests(self):
+        self.conn.request('http://localhost/lightbox.php', 'POST', 'mv_action=add', {})
+        self.assertEqual(self.conn.hedger.stats.get('calls'), 0)
+        
+        self.conn.request('http://localhost/results.php', 'GET', {}, {})
+        self.assertEqual(self.conn.hedger.stats.get('calls'), 1)
+
+class PcsConnectionRateLimitTest (unittest.TestCase):
+    def setUp(self):
+        self.conn = PcsConnection()
+        self.conn.backend = PcsConnection.HTTPLIB_BACKEND
+        self.conn.coalescer = None
+        self.conn.breakers = None
+        
+        self.slept = []
+        self.conn.rate_limiter = RateLimiter({'search': (1, 1)},
+            timer=lambda: 1000.0, sleep=self.slept.append)
+        
+        @patch(self.conn)
+        def request_with_httplib(self, url, method, data, headers):
+            return PcsResponse(200, 'body', [])
+    
+    def tearDown(self):
+        use_context(None)
+    
+    def testShouldClassifyRequestsByEndpoint(self):
+        conn = self.conn
+        
+        self.assertEqual(conn.get_endpoint_class('http://localhost/results.php?offset=0'), 'search')
+        self.assertEqual(conn.get_endpoint_class('http://localhost/lightbox.php'), 'lightbox')
+        self.assertEqual(conn.get_endpoint_class('http://localhost/ajax_estimate.php?slider=true'), 'estimate')
+        self.assertEqual(conn.get_endpoint_class('http://localhost/my_reservations.php'), 'reservations')
+        self.assertEqual(conn.get_endpoint_class('http://localhost/index.php'), 'other')
+    
+    def testShouldQueueRequestsWhenTheBucketIsEmpty(self):
+        self.conn.request('http://localhost/results.php', 'GET', {}, {})
+        self.conn.request('http://localhost/results.php', 'GET', {}, {})
+        
+        self.assertEqual(self.slept, [1.0])
+    
+    def testShouldGiveUpWhenTheWaitWouldOutlastTheDeadline(self):
+        context = begin_request()
+        context.set('deadline', Deadline(0.5))
+        
+        self.conn.request('http://localhost/results.php', 'GET', {}, {})
+        self.assertRaises(DeadlineExceededError,
+            self.conn.request, 'http://localhost/results.php', 'GET', {}, {})
+
+class PcsConnectionRequestManyTest (unittest.TestCase):
+    def setUp(self):
+        self.conn = PcsConnection()
+        self.conn.backend = PcsConnection.HTTPLIB_BACKEND
+    
+    def testShouldReturnResponsesInTheOrderOfTheRequests(self):
+        import time
+        @patch(self.conn)
+        def request(self, url, method, data, headers):
+            if url.endswith('slow'):
+                time.sleep(0.1)
+            return url
+        
+        responses = self.conn.request_many([
+            ('http://localhost/slow', 'GET', {}, {}),
+            ('http://localhost/fast', 'GET', {}, {})])
+        
+        self.assertEqual(responses, ['http://localhost/slow', 'http://localhost/fast'])
+    
+    def testShouldMakeTheRequestsAtTheSameTime(self):
+        import threading
+        all_started = threading.Event()
+        started = []
+        
+        @patch(self.conn)
+        def request(self, url, method, data, headers):
+            started.append(url)
+            if len(started) == 3:
+                all_started.set()
+            all_started.wait(5)
+            return all_started.isSet()
+        
+        responses = self.conn.request_many([
+            ('http://localhost/a', 'GET', {}, {}),
+            ('http://localhost/b', 'POST', 'data', {}),
+            ('http://localhost/c', 'GET', {}, {})])
+        
+        self.assertEqual(responses, [True, True, True])
+    
+    def testShouldGiveBackEachResponseAsItArrives(self):
+        import threading
+        release = threading.Event()
+        
+        @patch(self.conn)
+        def request(self, url, method, data, headers):
+            if url.endswith('slow'):
+                release.wait(5)
+            return url
+        
+        responses = self.conn.request_each([
+            ('http://localhost/slow', 'GET', {}, {}),
+            ('http://localhost/fast', 'GET', {}, {})])
+        
+        self.assertEqual(responses.next(), (1, 'http://localhost/fast'))
+        release.set()
+        self.assertEqual(responses.next(), (0, 'http://localhost/slow'))
+    
+    def testShouldNotSendRequestsThatAreStillQueuedWhenTheCallerStops(self):
+        import threading
+        import time
+        release = threading.Event()
+        sent = []
+        self.conn.workers = WorkerPool(max_workers=1)
+        
+        @patch(self.conn)
+        def request(self, url, method, data, headers):
+            sent.append(url)
+            if url.endswith('slow'):
+                release.wait(5)
+            return url
+        
+        # Given a batch in which one request is slow, and another is queued
+        # behind it (there's only one worker)...
+        started_at = time.time()
+        responses = self.conn.request_each([
+            ('http://localhost/session', 'GET', {}, {}),
+            ('http://localhost/slow', 'GET', {}, {}),
+            ('http://localhost/queued', 'GET', {}, {})])
+        
+        # When the caller stops after the first response...
+        index, response = responses.next()
+        responses.close()
+        release.set()
+        
+        # Then it hasn't had to wait for the slow one, and the queued one is
+        # never sent.
+        self.assertEqual(response, 'http://localhost/session')
+        self.assert_(time.time() - started_at < 1)
+        time.sleep(0.1)
+        self.assert_('http://localhost/queued' not in sent)
+    
+    def testShouldReturnAnErrorForEachFailedRequest(self):
+        @patch(self.conn)
+        def request(self, url, method, data, headers):
+            if url.endswith('bad'):
+                raise PcsConnectionError('My Exception')
+            return 'good response'
+        
+        responses = self.conn.request_many([
+            ('http://localhost/bad', 'GET', {}, {}),
+            ('http://localhost/good', 'GET', {}, {})])
+        
+        self.assert_(isinstance(responses[0], PcsConnectionError))
+        self.assertEqual(responses[1], 'good response')
+    
+    def testShouldGiveUpOnARequestWhenItsDeadlinePasses(self):
+        import threading
+        release = threading.Event()
+        
+        @patch(self.conn)
+        def request(self, url, method, data, headers):
+            if url.endswith('slow'):
+                release.wait(5)
+            return 'response'
+        
+        responses = self.conn.request_many([
+            ('http://localhost/slow', 'GET', {}, {}, 0.05),
+            ('http://localhost/fast', 'GET', {}, {}, 5)])
+        release.set()
+        
+        self.assert_(isinstance(responses[0], DeadlineExceededError))
+        self.assertEqual(responses[0].code, 'timeout')
+        self.assertEqual(responses[1], 'response')
+    
+    def testShouldGiveEachRequestItsOwnDeadline(self):
+        @patch(self.conn)
+        def request(self, url, method, data, headers):
+            return current_deadline().seconds
+        
+        context = begin_request()
+        request_deadline = Deadline(15)
+        context.set('deadline', request_deadline)
+        try:
+            responses = self.conn.request_many([
+                ('http://localhost/a', 'GET', {}, {}, 2),
+                ('http://localhost/b', 'GET', {}, {}, 20)])
+        finally:
+            use_context(None)
+        
+        self.assertEqual(responses[0], 2)
+        self.assert_(14 < responses[1] <= 15)
+        self.assert_(context.get('deadline') is request_deadline)
+    
+    def testShouldKeepTheCodesOfErrorsThatHaveThem(self):
+        @patch(self.conn)
+        def request(self, url, method, data, headers):
+            if url.endswith('late'):
+                raise DeadlineExceededError('Out of time')
+            raise ValueError('Unexpected')
+        
+        responses = self.conn.request_many([
+            ('http://localhost/late', 'GET', {}, {}),
+            ('http://localhost/odd', 'GET', {}, {})])
+        
+        self.assertEqual(responses[0].code, 'timeout')
+        self.assert_(isinstance(responses[1], PcsConnectionError))
+    
+    def testShouldReturnAnErrorForRequestsMadeAfterTheDeadline(self):
+        now = [1000.0]
+        context = begin_request()
+        context.set('deadline', Deadline(15, timer=lambda: now[0]))
+        now[0] += 15
+        try:
+            responses = self.conn.request_many([
+                ('http://localhost/a', 'GET', {}, {})])
+        finally:
+            use_context(None)
+        
+        self.assert_(isinstance(responses[0], DeadlineExceededError))
+
+class PcsConnectionGaeRequestManyTest (unittest.TestCase):
+    class StubRpc (object):
+        def __init__(self, deadline):
+            self.deadline = deadline
+            self.result = None
+        def get_result(self):
+            if isinstance(self.result, Exception):
+                raise self.result
+            return self.result
+    
+    class StubUrlfetchResponse (object):
+        def __init__(self, status_code, content, headers=None):
+            self.status_code = status_code
+            self.content = content
+            self.headers = headers or {}
+    
+    def setUp(self):
+        self.conn = PcsConnection()
+        self.conn.backend = PcsConnection.GAE_BACKEND
+        self.conn.breakers = CircuitBreakers(failure_threshold=3)
+        self.conn.rate_limiter = None
+        self.rpcs = []
+        self.results = {}
+        
+        test = self
+        class StubUrlfetch (object):
+            def create_rpc(self, deadline=None):
+                rpc = test.StubRpc(deadline)
+                test.rpcs.append(rpc)
+                return rpc
+            def make_fetch_call(self, rpc, url, payload=None, method='GET',
+                                headers={}, follow_redirects=True):
+                rpc.url = url
+                rpc.result = test.results[url]
+        
+        self.real_urlfetch = pcsconnection.gaeurlfetch
+        pcsconnection.gaeurlfetch = StubUrlfetch()
+    
+        # The stub RPCs all finish as soon as they're made.
+        @patch(self.conn)
+        def wait_for_any_rpc(self, rpcs):
+            return rpcs[0]
+    
+    def tearDown(self):
+        pcsconnection.gaeurlfetch = self.real_urlfetch
+    
+    def testShouldStartEveryFetchBeforeCollectingAnyWithItsOwnDeadline(self):
+        self.results = {
+            'http://localhost/a': self.StubUrlfetchResponse(200, 'body a'),
+            'http://localhost/b': self.StubUrlfetchResponse(200, 'body b')}
+        
+        responses = self.conn.request_many([
+            ('http://localhost/a', 'GET', {}, {}, 2),
+            ('http://localhost/b', 'GET', {}, {})])
+        
+        self.assertEqual([rpc.url for rpc in self.rpcs],
+                         ['http://localhost/a', 'http://localhost/b'])
+        self.assert_(1 < self.rpcs[0].deadline <= 2)
+        self.assert_(9 < self.rpcs[1].deadline <= 10)
+        self.assertEqual([response.read() for response in responses],
+                         ['body a', 'body b'])
+    
+    def testShouldReturnAnErrorForARequestThatCantBeSentInTime(self):
+        self.results = {
+            'http://localhost/b': self.StubUrlfetchResponse(200, 'body b')}
+        
+        @patch(self.conn)
+        def wait_for_rate_limit(self, url):
+            if url.endswith('/a'):
+                raise DeadlineExceededError('Gave up on %s' % url)
+        
+        responses = self.conn.request_many([
+            ('http://localhost/a', 'GET', {}, {}),
+            ('http://localhost/b', 'GET', {}, {})])
+        
+        self.assertEqual(responses[0].code, 'timeout')
+        self.assertEqual(responses[1].read(), 'body b')
+        self.assertEqual(len(self.rpcs), 1)
+    
+    def testShouldCollectEachFetchAsItFinishesAndAbandonTheRest(self):
+        self.results = {
+            'http://localhost/a': self.StubUrlfetchResponse(200, 'body a'),
+            'http://localhost/b': self.StubUrlfetchResponse(200, 'body b')}
+        
+        @patch(self.conn)
+        def wait_for_any_rpc(self, rpcs):
+            return rpcs[-1]
+        
+        responses = self.conn.request_each([
+            ('http://localhost/a', 'GET', {}, {}),
+            ('http://localhost/b', 'GET', {}, {})])
+        index, response = responses.next()
+        responses.close()
+        
+        self.assertEqual((index, response.read()), (1, 'body b'))
+        self.assertEqual(len(self.rpcs), 2)
+    
+    def testShouldCountFailedFetchesAgainstTheBreaker(self):
+        self.results = {
+            'http://localhost/a': DownloadError('Connection refused'),
+            'http://localhost/b': self.StubUrlfetchResponse(200, 'body b')}
+        
+        responses = self.conn.request_many([
+            ('http://localhost/a', 'GET', {}, {}),
+            ('http://localhost/b', 'GET', {}, {})])
+        
+        self.assert_(isinstance(responses[0], PcsConnectionError))
+        self.assertEqual(responses[1].read(), 'body b')
+        self.assertEqual(self.conn.breakers.stats.get('failures'), 1)
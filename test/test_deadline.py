@@ -0,0 +1,60 @@
+import unittest
+
+from util.context import begin_request
+from util.context import current_context
+from util.context import use_context
+from util.deadline import call_with_deadline
+from util.deadline import current_deadline
+from util.deadline import Deadline
+from util.deadline import DeadlineExceededError
+from util.deadline import start_deadline
+from util.parallel import WorkerPool
+
+class DeadlineTest (unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.deadline = Deadline(20, timer=lambda: self.now)
+    
+    def testShouldLimitTimeoutsToTheTimeRemaining(self):
+        self.assertEqual(self.deadline.limit(10), 10)
+        
+        self.now += 15
+        
+        self.assertEqual(self.deadline.remaining(), 5)
+        self.assertEqual(self.deadline.limit(10), 5)
+        self.assertEqual(self.deadline.limit(), 5)
+    
+    def testShouldRaiseOnceTheTimeHasRunOut(self):
+        self.now += 20
+        
+        self.assert_(self.deadline.expired())
+        self.assertRaises(DeadlineExceededError, self.deadline.limit, 10)
+
+class CurrentDeadlineTest (unittest.TestCase):
+    def tearDown(self):
+        use_context(None)
+    
+    def testShouldHaveNoDeadlineOutsideOfARequest(self):
+        use_context(None)
+        
+        self.assertEqual(current_deadline(), None)
+    
+    def testShouldFollowTheRequestOntoWorkerThreads(self):
+        begin_request()
+        deadline = start_deadline(20)
+        
+        task = WorkerPool(max_workers=1).submit(current_deadline)
+        
+        self.assert_(task.result(5) is deadline)
+    
+    def testShouldCallAFunctionWithAnotherDeadline(self):
+        context = begin_request()
+        context.set('user', 'user1')
+        deadline = start_deadline(20)
+        other_deadline = Deadline(5)
+        
+        seen = call_with_deadline(other_deadline,
+            lambda: (current_deadline(), current_context().get('user')))
+        
+        self.assertEqual(seen, (other_deadline, 'user1'))
+        self.assert_(current_deadline() is deadline)
@@ -0,0 +1,58 @@
+import datetime
+import unittest
+
+from benchmarks.generators import confirmation_page
+from benchmarks.generators import lightbox_page
+from benchmarks.generators import reservations_page
+from benchmarks.generators import results_payload
+from pcs.fetchers.screenscrape.availability import AvailabilityScreenscrapeSource
+from pcs.fetchers.screenscrape.reservations import PcsDocumentDecoder
+from pcs.fetchers.screenscrape.reservations import ReservationsScreenscrapeSource
+from util.TimeZone import Eastern
+
+class GeneratorsTest (unittest.TestCase):
+    def setUp(self):
+        self.availability = AvailabilityScreenscrapeSource()
+        self.reservations = ReservationsScreenscrapeSource()
+        self.decoder = PcsDocumentDecoder()
+    
+    def testReservationsPageShouldHaveTheRowsAndPageLinksAskedFor(self):
+        body = reservations_page(rows=25, page_links=12, current_page=3)
+        doc = self.reservations.get_html_document(body, self.decoder.LOG_DOC_PARTS)
+        
+        reservations = self.decoder.build_reservation_log_from_log_doc(doc)
+        
+        self.assertEqual(len(set(r.logid for r in reservations)), 25)
+        self.assertEqual(self.decoder.decode_page_info_from_log_doc(doc), (3, 12))
+    
+    def testResultsPayloadShouldHaveThePodsAndVehiclesAskedFor(self):
+        start_time = datetime.datetime(2010, 8, 23, 1, 15, tzinfo=Eastern)
+        end_time = start_time + datetime.timedelta(hours=2)
+        fragments = self.availability.get_pod_fragments(
+            self.availability.get_json_data(results_payload(pods=7, vehicles_per_pod=3)))
+        
+        vehicles = list(self.availability.generate_vehicles_from_pod_fragments(
+            fragments, start_time, end_time))
+        
+        self.assertEqual(len(vehicles), 21)
+        self.assertEqual(len(set(va.vehicle.pod.id for va in vehicles)), 7)
+        self.assertEqual(len(set(va.vehicle.id for va in vehicles)), 21)
+    
+    def testLightboxPageShouldStillDecodeWithManyTimeOptions(self):
+        body = lightbox_page('1234', time_options=500)
+        
+        vehicleid, podid, pod_name, model_name = \
+            self.availability.decode_vehicle_info_from_availability_block(
+                self.availability.get_html_vehicle_data(body))
+        
+        self.assertEqual(body.count('<option'), 1000)
+        self.assertEqual(vehicleid, '1234')
+    
+    def testConfirmationPageShouldStillDecodeWithFiller(self):
+        body = confirmation_page(filler=50)
+        doc = self.reservations.get_html_document(body,
+            self.decoder.CONFIRMATION_DOC_PARTS)
+        
+        info = self.decoder.decode_reservation_info_from_confirmation_doc(doc)
+        
+        self.assertEqual(info[0], '2516709')
@@ -0,0 +1,153 @@
+import datetime
+import unittest
+
+from pcs.fetchers.screenscrape import ScreenscrapeFetchError
+from pcs.fetchers.screenscrape.reservations import PcsDocumentDecoder
+from util.htmlparsing import backends
+from util.TimeZone import Eastern
+
+class _HtmlBackendTests (object):
+    """
+    Tests that every backend must pass; each backend gets its own TestCase
+    below.
+    """
+    backend = None
+    
+    def setUp(self):
+        self.decoder = PcsDocumentDecoder()
+    
+    def testShouldFindElementsByNameAndAttributes(self):
+        doc = self.backend.parse(r'''<div><p class="a">One</p><div><p class="b">Two</p><p class="a">Three</p></div></div>''')
+        
+        self.assertEqual(doc.find('p', {'class':'b'}).text, 'Two')
+        self.assertEqual([p.text for p in doc.findAll('p', {'class':'a'})],
+                         ['One', 'Three'])
+        self.assertEqual(doc.find('p', {'class':'c'}), None)
+    
+    def testShouldOnlyFindChildrenWhenNotRecursive(self):
+        doc = self.backend.parse(r'''<table><tr><td>1</td><td><table><tr><td>2</td></tr></table></td></tr></table>''')
+        
+        row = doc.find('tr')
+        self.assertEqual(len(row.findAll('td', recursive=False)), 2)
+        self.assertEqual(len(row.findAll('td')), 3)
+    
+    def testShouldLeaveEntitiesInTextAlone(self):
+        doc = self.backend.parse(r'''<b>A &amp; B</b>''')
+        
+        self.assertEqual(doc.find('b').text, 'A &amp; B')
+    
+    def testShouldDecodeEntitiesInAttributes(self):
+        doc = self.backend.parse(r'''<a href="page.php?a=1&amp;b=2">link</a>''')
+        
+        self.assertEqual(doc.find('a')['href'], 'page.php?a=1&b=2')
+        self.assertEqual(doc.find('a').get('title'), None)
+    
+    def testShouldDecodePageInfoFromLogDoc(self):
+        from strings_for_testing import PAST_RESERVATIONS_SECOND_OF_FIVE_PAGES
+        
+        doc = self.backend.parse(PAST_RESERVATIONS_SECOND_OF_FIVE_PAGES)
+        cur_page, num_pages = self.decoder.decode_page_info_from_log_doc(doc)
+        
+        self.assertEqual(cur_page, 2)
+        self.assertEqual(num_pages, 5)
+    
+    def testShouldBuildReservationLogFromLogDoc(self):
+        from strings_for_testing import ONE_UPCOMING_RESERVATION
+        
+        doc = self.backend.parse(ONE_UPCOMING_RESERVATION)
+        reservations = self.decoder.build_reservation_log_from_log_doc(doc)
+        
+        self.assertEqual(len(reservations), 1)
+        reservation = reservations[0]
+        self.assertEqual(reservation.logid, '2472498')
+        self.assertEqual(reservation.start_time, datetime.datetime(2010,9,15,6,0,tzinfo=Eastern))
+        self.assertEqual(reservation.price.total_amount, 3.24)
+        self.assertEqual(reservation.vehicle.model.name, 'Prius Liftback')
+        self.assertEqual(reservation.vehicle.pod.name, '47th & Baltimore')
+    
+    def testShouldDecodeReservationInfoFromConfirmationDoc(self):
+        from strings_for_testing import NEW_RESERVATION_CONFIRMATION
+        
+        doc = self.backend.parse(NEW_RESERVATION_CONFIRMATION)
+        logid, start_time, end_time, vehicleid, modelname, podid, podname, memo, pricetotal = \
+            self.decoder.decode_reservation_info_from_confirmation_doc(doc)
+        
+        self.assertEqual(logid, '2516709')
+        self.assertEqual(modelname, 'Prius Liftback')
+        self.assertEqual(podname, '47th & Baltimore')
+        self.assertEqual(vehicleid, '96692246')
+        self.assertEqual(podid, '30005')
+        self.assertEqual(start_time, datetime.datetime(2010,10,31,2,45,tzinfo=Eastern))
+        self.assertEqual(memo, 'testing')
+        self.assertEqual(pricetotal, 3.24)
+    
+    def testShouldDecodeLightboxDocuments(self):
+        from strings_for_testing import RESERVATION_LIGHTBOX_WITH_NO_VEHICLE_INFO
+        from strings_for_testing import NEW_RESERVATION_REDIRECT_SCRIPT
+        from strings_for_testing import RESERVATION_LIGHTBOX_WITH_CONFLICTING_TIME
+        
+        doc = self.backend.parse(RESERVATION_LIGHTBOX_WITH_NO_VEHICLE_INFO)
+        self.assertEqual(
+            self.decoder.decode_transaction_id_from_lightbox_block('add', doc), '5')
+        
+        doc = self.backend.parse(NEW_RESERVATION_REDIRECT_SCRIPT)
+        self.assertEqual(
+            self.decoder.decode_reservation_liveid_from_redirect_script_element(doc), '149385106')
+        
+        doc = self.backend.parse(RESERVATION_LIGHTBOX_WITH_CONFLICTING_TIME)
+        try:
+            self.decoder.verify_no_error_in_lightbox_doc(doc)
+        except ScreenscrapeFetchError, e:
+            self.assertEqual(e.code, 'time_period_conflict')
+            return
+        
+        self.fail('Expected fetch error.')
+
+    def testShouldDecodeLogDocsParsedFromOnlyTheirParts(self):
+        from strings_for_testing import PAST_RESERVATIONS_SECOND_OF_FIVE_PAGES
+        
+        doc = self.backend.parse(PAST_RESERVATIONS_SECOND_OF_FIVE_PAGES,
+                                 only=self.decoder.LOG_DOC_PARTS)
+        whole_doc = self.backend.parse(PAST_RESERVATIONS_SECOND_OF_FIVE_PAGES)
+        
+        self.assertEqual(self.decoder.decode_page_info_from_log_doc(doc), (2, 5))
+        reservations = self.decoder.build_reservation_log_from_log_doc(doc)
+        whole_reservations = self.decoder.build_reservation_log_from_log_doc(whole_doc)
+        self.assertEqual([(r.logid, r.start_time, r.vehicle.pod.name) for r in reservations],
+                         [(r.logid, r.start_time, r.vehicle.pod.name) for r in whole_reservations])
+    
+    def testShouldDecodeConfirmationDocsParsedFromOnlyTheirParts(self):
+        from strings_for_testing import NEW_RESERVATION_CONFIRMATION
+        
+        doc = self.backend.parse(NEW_RESERVATION_CONFIRMATION,
+                                 only=self.decoder.CONFIRMATION_DOC_PARTS)
+        whole_doc = self.backend.parse(NEW_RESERVATION_CONFIRMATION)
+        
+        self.assertEqual(
+            self.decoder.decode_reservation_info_from_confirmation_doc(doc),
+            self.decoder.decode_reservation_info_from_confirmation_doc(whole_doc))
+
+class BeautifulSoupBackendTest (_HtmlBackendTests, unittest.TestCase):
+    backend = backends['beautifulsoup']
+    
+    def testShouldOnlyBuildTheNamedParts(self):
+        doc = self.backend.parse(r'''<html><head><script>var a = "<b>";</script></head><body><div id="nav"><b>Home</b></div><table id="main"><tr><td><b>1</b></td></tr></table></body></html>''',
+                                 only=[('table', {'id':'main'})])
+        
+        self.assertEqual(doc.find('body'), None)
+        self.assertEqual(doc.find('div'), None)
+        self.assertEqual([b.text for b in doc.findAll('b')], ['1'])
+
+if 'lxml' in backends:
+    class LxmlBackendTest (_HtmlBackendTests, unittest.TestCase):
+        backend = backends['lxml']
+        
+        def testShouldParseUnicodeDocumentsThatDeclareAnEncoding(self):
+            doc = self.backend.parse(u'''<?xml version="1.0" encoding="utf-8"?><html><body><p>caf\xe9</p></body></html>''')
+            
+            self.assertEqual(doc.find('p').text, u'caf\xe9')
+        
+        def testShouldParseDocumentsWithNoElements(self):
+            doc = self.backend.parse('Nobody')
+            
+            self.assertEqual(doc.find('tbody'), None)
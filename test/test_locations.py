@@ -2,6 +2,12 @@ import unittest
 import datetime
 import new
 
+try:
+    import json
+except ImportError:
+    from django.utils import simplejson as json
+
+from pcs.data.location import LocationProfile
 from pcs.data.session import Session
 from pcs.wsgi_handlers.appengine.locations import LocationsHandler
 from pcs.wsgi_handlers.appengine.locations import LocationsJsonHandler
@@ -29,9 +35,14 @@ class StubRequest (dict):
 
 # A fake response class
 import StringIO
+class StubResponseHeaders (dict):
+    def add_header(self, name, value):
+        self[name] = value
+
 class StubResponse (object):
     def __init__(self):
         self.out = StringIO.StringIO()
+        self.headers = StubResponseHeaders()
     def set_status(self, status):
         self.status = status
 
@@ -47,6 +58,8 @@ class LocationHandlerTest (unittest.TestCase):
         class StubLocationsSource (object):
             def fetch_location_profiles(self, sessionid):
                 pass
+            def fetch_location_profiles_version(self, sessionid):
+                return None
         StubLocationsSource = Stub(_LocationsSourceInterface)(StubLocationsSource)
         
         # A generator for a representation (view) of the availability information
@@ -155,7 +168,51 @@ class LocationHandlerTest (unittest.TestCase):
         self.assertEqual(self.handler.sessionid, 'ses1234')
         self.assert_('SessionExpiredError' in response_body, 'Should contain SessionExpiredError: %r' % response_body)
     
+    def testShouldTagTheResponseWithTheVersionOfTheProfiles(self):
+        # Given...
+        self.handler.get_session_id = lambda: 'ses1234'
+        self.handler.get_session = lambda userid, sessionid: 'my session'
+        
+        @patch(self.locations_source)
+        def fetch_location_profiles_version(self, sessionid):
+            return 'v1'
+        
+        @patch(self.locations_source)
+        def fetch_location_profiles(self, sessionid):
+            return 'my locations'
+        
+        # When...
+        self.handler.get()
+        
+        # Then...
+        self.assertEqual(self.handler.response.headers['ETag'], '"locations-v1"')
+        self.assertEqual(self.handler.response.out.getvalue(), 'Success')
+    
+    def testShouldNotRenderProfilesThatTheClientAlreadyHas(self):
+        # Given...
+        self.handler.get_session_id = lambda: 'ses1234'
+        self.handler.get_session = lambda userid, sessionid: 'my session'
+        self.handler.request.headers['If-None-Match'] = '"locations-v1"'
+        
+        @patch(self.locations_source)
+        def fetch_location_profiles_version(self, sessionid):
+            return 'v1'
+        
+        @patch(self.locations_view)
+        def render_locations(self, session, locations):
+            self.rendered = True
+        
+        # When...
+        self.handler.get()
+        
+        # Then...
+        self.assertEqual(self.handler.response.status, 304)
+        self.assertEqual(self.handler.response.headers['ETag'], '"locations-v1"')
+        self.assertEqual(self.handler.response.out.getvalue(), '')
+        self.assert_(not hasattr(self.locations_view, 'rendered'))
+    
 
+from pcs.fetchers.screenscrape.locations import LocationProfileCache
 from pcs.fetchers.screenscrape.locations import LocationsScreenscrapeSource
 class LocationsScreenscrapeSourceTest (unittest.TestCase):
     def testShouldConstructExpectedLocationProfilesFromPcsConnectionContent(self):
@@ -252,6 +309,144 @@ class LocationsScreenscrapeSourceTest (unittest.TestCase):
         self.assertEqual(location.desc, 'Walnut St &amp; S 33rd St, Philadelphia, PA 19104, USA')
         self.assertEqual(location.id, '25782103')
     
+    def testShouldOnlyDownloadLocationProfilesOnceWhenCached(self):
+        # Given...
+        source = LocationsScreenscrapeSource(profile_cache=LocationProfileCache())
+        @patch(source)
+        def download_location_profiles(self, sessionid):
+            self.downloads = getattr(self, 'downloads', 0) + 1
+            house = LocationProfile('My House', '18065565', '')
+            house.is_default = False
+            job = LocationProfile('My Job', '25782103', '')
+            job.is_default = True
+            return [house, job]
+        
+        # When...
+        locations = source.fetch_location_profiles('123abc')
+        default_location = source.fetch_location_profile('123abc', None)
+        location = source.fetch_location_profile('123abc', '18065565')
+        
+        # Then...
+        self.assertEqual(source.downloads, 1)
+        self.assertEqual(len(locations), 2)
+        self.assertEqual(default_location.name, 'My Job')
+        self.assertEqual(location.name, 'My House')
+    
+    def testShouldRefreshOldLocationProfilesInTheBackground(self):
+        # Given...
+        import threading
+        refreshed = threading.Event()
+        source = LocationsScreenscrapeSource(
+            profile_cache=LocationProfileCache(refresh_after=0))
+        @patch(source)
+        def download_location_profiles(self, sessionid):
+            self.downloads = getattr(self, 'downloads', 0) + 1
+            if self.downloads > 1:
+                refreshed.set()
+            house = LocationProfile('My House %s' % self.downloads, '18065565', '')
+            house.is_default = True
+            return [house]
+        
+        # When...
+        first = source.fetch_location_profile('123abc', None)
+        second = source.fetch_location_profile('123abc', None)
+        refreshed.wait(5)
+        
+        # Then...
+        self.assertEqual(first.name, 'My House 1')
+        self.assertEqual(second.name, 'My House 1')
+        self.assert_(refreshed.isSet())
+    
+    def testShouldRefreshOutsideOfTheRequestThatNoticedItWasDue(self):
+        # Given...
+        import threading
+        from util.context import begin_request
+        from util.context import use_context
+        from util.deadline import current_deadline
+        from util.deadline import start_deadline
+        refreshed = threading.Event()
+        source = LocationsScreenscrapeSource(
+            profile_cache=LocationProfileCache(refresh_after=0))
+        @patch(source)
+        def download_location_profiles(self, sessionid):
+            self.downloads = getattr(self, 'downloads', 0) + 1
+            if self.downloads > 1:
+                self.refresh_deadline = current_deadline()
+                refreshed.set()
+            house = LocationProfile('My House', '18065565', '')
+            house.is_default = True
+            return [house]
+        
+        # When...
+        begin_request()
+        try:
+            start_deadline(0.01)
+            source.fetch_location_profile('123abc', None)
+            source.fetch_location_profile('123abc', None)
+        finally:
+            use_context(None)
+        refreshed.wait(5)
+        
+        # Then...
+        self.assert_(refreshed.isSet())
+        self.assertEqual(source.refresh_deadline, None)
+    
+    def testShouldNotRefreshInTheRequestWhereThreadsAreUnavailable(self):
+        # Given...
+        class StubWorkerPool (object):
+            def submit_in_background(self, function, *args, **kwds):
+                return None
+        source = LocationsScreenscrapeSource(
+            profile_cache=LocationProfileCache(refresh_after=0,
+                                               workers=StubWorkerPool()))
+        @patch(source)
+        def download_location_profiles(self, sessionid):
+            self.downloads = getattr(self, 'downloads', 0) + 1
+            house = LocationProfile('My House %s' % self.downloads, '18065565', '')
+            house.is_default = True
+            return [house]
+        
+        # When...
+        first = source.fetch_location_profile('123abc', None)
+        second = source.fetch_location_profile('123abc', None)
+        
+        # Then...
+        self.assertEqual(source.downloads, 1)
+        self.assertEqual(second.name, 'My House 1')
+    
+    def testShouldOnlyGiveANewVersionWhenTheProfilesChange(self):
+        # Given...
+        cache = LocationProfileCache()
+        source = LocationsScreenscrapeSource(profile_cache=cache)
+        @patch(source)
+        def download_location_profiles(self, sessionid):
+            house = LocationProfile(self.house_name, '18065565', '')
+            house.is_default = True
+            return [house]
+        source.house_name = 'My House'
+        
+        # When...
+        first = source.fetch_location_profiles_version('123abc')
+        cache.forget('123abc')
+        reloaded = source.fetch_location_profiles_version('123abc')
+        other_process = LocationsScreenscrapeSource(
+            profile_cache=LocationProfileCache())
+        other_process.download_location_profiles = source.download_location_profiles
+        elsewhere = other_process.fetch_location_profiles_version('123abc')
+        other_session = source.fetch_location_profiles_version('456def')
+        
+        source.house_name = 'My New House'
+        cache.forget('123abc')
+        changed = source.fetch_location_profiles_version('123abc')
+        
+        # Then...
+        self.assert_(first is not None)
+        self.assertEqual(reloaded, first)
+        self.assertEqual(elsewhere, first)
+        self.assertNotEqual(other_session, first)
+        self.assertNotEqual(changed, first)
+        self.assertEqual(LocationsScreenscrapeSource().fetch_location_profiles_version('123abc'), None)
+    
     def testShouldReturnRequestedCustomLocation(self):
         # Given...
         source = LocationsScreenscrapeSource()
@@ -328,7 +523,7 @@ class LocationsJsonViewTest (unittest.TestCase):
     		view = LocationsJsonView()
     		rendering = view.render_locations(session, locations)
     		
-    		self.assertEqual(
+    		self.assertEqual(json.loads(
 """{"locations" : [
 
 	{
@@ -350,5 +545,5 @@ class LocationsJsonViewTest (unittest.TestCase):
 	}
 
 ]}
-""",
-    		rendering)
+"""),
+    		json.loads(rendering))
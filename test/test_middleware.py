@@ -0,0 +1,221 @@
+import gzip
+import StringIO
+import unittest
+
+try:
+    import json
+except ImportError:
+    from django.utils import simplejson as json
+
+from pcs.wsgi_handlers.middleware import accepts_gzip
+from pcs.wsgi_handlers.middleware import body_etag
+from pcs.wsgi_handlers.middleware import ConditionalGetMiddleware
+from pcs.wsgi_handlers.middleware import GzipMiddleware
+from pcs.wsgi_handlers.middleware import PrettyJsonMiddleware
+from pcs.wsgi_handlers.middleware import StatsMiddleware
+from util import metrics
+
+def make_app(body, headers=None):
+    def app(environ, start_response):
+        start_response('200 OK', list(headers or [('Content-Type', 'application/json')]))
+        return [body]
+    return app
+
+def call(app, environ):
+    response = {}
+    def start_response(status, headers, exc_info=None):
+        response['status'] = status
+        response['headers'] = dict(headers)
+    response['body'] = ''.join(app(environ, start_response))
+    return response
+
+def gunzip(body):
+    return gzip.GzipFile(fileobj=StringIO.StringIO(body)).read()
+
+class GzipMiddlewareTest (unittest.TestCase):
+    def setUp(self):
+        self.body = json.dumps({'locations': [{'id': 'l%s' % index, 'name': 'Location'}
+                                              for index in range(50)]})
+    
+    def testShouldCompressBodiesForClientsThatAcceptGzip(self):
+        app = GzipMiddleware(make_app(self.body), stats_name='test_sizes')
+        
+        response = call(app, {'HTTP_ACCEPT_ENCODING': 'deflate, gzip'})
+        
+        self.assertEqual(response['headers']['Content-Encoding'], 'gzip')
+        self.assertEqual(response['headers']['Content-Length'], str(len(response['body'])))
+        self.assertEqual(response['headers']['Vary'], 'Accept-Encoding')
+        self.assertEqual(gunzip(response['body']), self.body)
+    
+    def testShouldLeaveBodiesAloneForOtherClients(self):
+        app = GzipMiddleware(make_app(self.body), stats_name='test_sizes')
+        
+        response = call(app, {})
+        
+        self.assert_('Content-Encoding' not in response['headers'])
+        self.assertEqual(response['body'], self.body)
+    
+    def testShouldNotCompressSmallBodies(self):
+        app = GzipMiddleware(make_app('{}'), stats_name='test_sizes')
+        
+        response = call(app, {'HTTP_ACCEPT_ENCODING': 'gzip'})
+        
+        self.assertEqual(response['body'], '{}')
+    
+    def testShouldCountTheSizesBeforeAndAfterCompression(self):
+        app = GzipMiddleware(make_app(self.body), stats_name='test_sizes')
+        
+        compressed = call(app, {'HTTP_ACCEPT_ENCODING': 'gzip'})
+        call(app, {})
+        
+        self.assertEqual(app.stats.snapshot(), {
+            'responses': 2,
+            'compressed': 1,
+            'body_bytes': 2 * len(self.body),
+            'sent_bytes': len(self.body) + len(compressed['body']),
+        })
+    
+    def testShouldRespectAQualityOfZero(self):
+        self.assert_(accepts_gzip('gzip;q=0.5'))
+        self.assert_(accepts_gzip('*'))
+        self.assert_(not accepts_gzip('gzip;q=0'))
+        self.assert_(not accepts_gzip('deflate'))
+        self.assert_(not accepts_gzip(None))
+
+    def testShouldGiveGzippedBodiesTheirOwnETag(self):
+        app = GzipMiddleware(ConditionalGetMiddleware(make_app(self.body)),
+                             stats_name='test_sizes')
+        etag = body_etag(self.body)
+        
+        response = call(app, {'HTTP_ACCEPT_ENCODING': 'gzip'})
+        again = call(app, {'HTTP_ACCEPT_ENCODING': 'gzip',
+                           'HTTP_IF_NONE_MATCH': response['headers']['ETag']})
+        
+        self.assertEqual(response['headers']['ETag'], etag[:-1] + '-gzip"')
+        self.assertEqual(again['status'], '304 Not Modified')
+        self.assertEqual(again['headers']['ETag'], response['headers']['ETag'])
+
+class ConditionalGetMiddlewareTest (unittest.TestCase):
+    def testShouldTagResponsesWithAHashOfTheirBodies(self):
+        app = ConditionalGetMiddleware(make_app('{"a":1}'), stats_name='test_conditional')
+        
+        response = call(app, {'REQUEST_METHOD': 'GET'})
+        
+        self.assertEqual(response['headers']['ETag'], body_etag('{"a":1}'))
+        self.assertEqual(response['body'], '{"a":1}')
+    
+    def testShouldAnswerClientsThatHaveTheBodyWithNotModified(self):
+        app = ConditionalGetMiddleware(make_app('{"a":1}'), stats_name='test_conditional')
+        
+        response = call(app, {'REQUEST_METHOD': 'GET',
+                              'HTTP_IF_NONE_MATCH': '"other", %s' % body_etag('{"a":1}')})
+        
+        self.assertEqual(response['status'], '304 Not Modified')
+        self.assertEqual(response['body'], '')
+        self.assertEqual(app.stats.get('not_modified'), 1)
+    
+    def testShouldKeepAnETagThatTheApplicationGave(self):
+        app = ConditionalGetMiddleware(make_app('{"a":1}', [('ETag', '"v1"')]),
+                                       stats_name='test_conditional')
+        
+        response = call(app, {'REQUEST_METHOD': 'GET', 'HTTP_IF_NONE_MATCH': '"v1"'})
+        
+        self.assertEqual(response['status'], '304 Not Modified')
+        self.assertEqual(response['headers']['ETag'], '"v1"')
+    
+    def testShouldLeaveResponsesThatMustNotBeStoredAlone(self):
+        app = ConditionalGetMiddleware(
+            make_app('{"error":{}}', [('Cache-Control', 'no-store')]),
+            stats_name='test_conditional')
+        
+        response = call(app, {'REQUEST_METHOD': 'GET',
+                              'HTTP_IF_NONE_MATCH': body_etag('{"error":{}}')})
+        
+        self.assertEqual(response['status'], '200 OK')
+        self.assert_('ETag' not in response['headers'])
+        self.assertEqual(response['body'], '{"error":{}}')
+    
+    def testShouldLeaveOtherMethodsAlone(self):
+        app = ConditionalGetMiddleware(make_app('{"a":1}'), stats_name='test_conditional')
+        
+        response = call(app, {'REQUEST_METHOD': 'POST',
+                              'HTTP_IF_NONE_MATCH': body_etag('{"a":1}')})
+        
+        self.assert_('ETag' not in response['headers'])
+        self.assertEqual(response['body'], '{"a":1}')
+
+class PrettyJsonMiddlewareTest (unittest.TestCase):
+    def testShouldIndentJsonWhenAskedTo(self):
+        app = PrettyJsonMiddleware(make_app('{"b":[1,2],"a":"x"}'))
+        
+        response = call(app, {'QUERY_STRING': 'pretty=1'})
+        
+        self.assertEqual(response['body'],
+            json.dumps({'a': 'x', 'b': [1, 2]}, sort_keys=True, indent=2))
+    
+    def testShouldLeaveJsonCompactOtherwise(self):
+        app = PrettyJsonMiddleware(make_app('{"b":[1,2],"a":"x"}'))
+        
+        response = call(app, {'QUERY_STRING': 'pretty=0'})
+        
+        self.assertEqual(response['body'], '{"b":[1,2],"a":"x"}')
+    
+    def testShouldLeaveBodiesThatArentJsonAlone(self):
+        app = PrettyJsonMiddleware(make_app('<html></html>'))
+        
+        response = call(app, {'QUERY_STRING': 'pretty=true'})
+        
+        self.assertEqual(response['body'], '<html></html>')
+
+    def testShouldGiveIndentedBodiesTheirOwnETag(self):
+        # Given...
+        def app(environ, start_response):
+            # Like the locations handler, answer with a 304 itself.
+            if environ.get('HTTP_IF_NONE_MATCH') == '"v1"':
+                start_response('304 Not Modified', [('ETag', '"v1"')])
+                return ['']
+            start_response('200 OK', [('Content-Type', 'application/json'),
+                                      ('ETag', '"v1"')])
+            return ['{"b":[1,2],"a":"x"}']
+        app = ConditionalGetMiddleware(PrettyJsonMiddleware(app),
+                                       stats_name='test_conditional')
+        
+        # When...
+        pretty = call(app, {'QUERY_STRING': 'pretty=1'})
+        again = call(app, {'QUERY_STRING': 'pretty=1',
+                           'HTTP_IF_NONE_MATCH': pretty['headers']['ETag']})
+        compact = call(app, {'HTTP_IF_NONE_MATCH': pretty['headers']['ETag']})
+        
+        # Then...
+        self.assertEqual(pretty['headers']['ETag'], '"v1-pretty"')
+        self.assertEqual(again['status'], '304 Not Modified')
+        self.assertEqual(again['headers']['ETag'], '"v1-pretty"')
+        self.assertEqual(compact['status'], '200 OK')
+        self.assertEqual(compact['headers']['ETag'], '"v1"')
+        self.assertEqual(compact['body'], '{"b":[1,2],"a":"x"}')
+
+class StatsMiddlewareTest (unittest.TestCase):
+    def testShouldAnswerWithTheCurrentMetrics(self):
+        stats = metrics.counters('test_stats', 'hits')
+        stats.increment('hits', 3)
+        app = StatsMiddleware(make_app('{}'), lambda environ: True)
+        
+        response = call(app, {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/stats.json'})
+        
+        self.assertEqual(response['status'], '200 OK')
+        self.assertEqual(response['headers']['Cache-Control'], 'no-store')
+        self.assertEqual(json.loads(response['body'])['test_stats'], {'hits': 3})
+    
+    def testShouldPassOtherRequestsOnToTheApplication(self):
+        app = StatsMiddleware(make_app('{"a":1}'), lambda environ: True)
+        
+        response = call(app, {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/locations.json'})
+        
+        self.assertEqual(response['body'], '{"a":1}')
+    
+    def testShouldPassRequestsThatArentAllowedOnToTheApplication(self):
+        app = StatsMiddleware(make_app('{"a":1}'), lambda environ: False)
+        
+        response = call(app, {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/stats.json'})
+        
+        self.assertEqual(response['body'], '{"a":1}')
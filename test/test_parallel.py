@@ -0,0 +1,291 @@
+import unittest
+import threading
+import time
+
+from util.context import begin_request
+from util.context import current_context
+from util.context import use_context
+from util.deadline import call_with_deadline
+from util.deadline import current_deadline
+from util.deadline import Deadline
+from util.deadline import DeadlineExceededError
+from util.parallel import as_completed
+from util.parallel import Hedger
+from util.parallel import SingleFlight
+from util.parallel import TaskCancelledError
+from util.parallel import TaskTimeoutError
+from util.parallel import WorkerPool
+class WorkerPoolTest (unittest.TestCase):
+    def testShouldReturnTheResultOfTheSubmittedCall(self):
+        workers = WorkerPool(max_workers=2)
+        
+        task = workers.submit(lambda a, b: a + b, 1, b=2)
+        
+        self.assertEqual(task.result(5), 3)
+    
+    def testShouldReraiseTheExceptionOfTheSubmittedCall(self):
+        workers = WorkerPool(max_workers=2)
+        
+        def fail():
+            raise ValueError('My Exception')
+        task = workers.submit(fail)
+        
+        self.assertRaises(ValueError, task.result, 5)
+        self.assert_(isinstance(task.exception(5), ValueError))
+    
+    def testShouldRunCallsAtTheSameTime(self):
+        workers = WorkerPool(max_workers=3)
+        all_started = threading.Event()
+        started = []
+        
+        def wait_for_the_others():
+            started.append(True)
+            if len(started) == 3:
+                all_started.set()
+            return all_started.wait(5) or all_started.isSet()
+        
+        tasks = [workers.submit(wait_for_the_others) for _ in range(3)]
+        
+        self.assertEqual([task.result(5) for task in tasks], [True, True, True])
+    
+    def testShouldNotStartMoreThanMaxWorkersThreads(self):
+        workers = WorkerPool(max_workers=1)
+        release = threading.Event()
+        
+        first = workers.submit(release.wait, 5)
+        second = workers.submit(lambda: 'second')
+        
+        self.assert_(not second.wait(0.1))
+        release.set()
+        self.assertEqual(second.result(5), 'second')
+    
+    def testCancelledTaskShouldNotRun(self):
+        workers = WorkerPool(max_workers=1)
+        release = threading.Event()
+        ran = []
+        
+        workers.submit(release.wait, 5)
+        task = workers.submit(ran.append, True)
+        
+        self.assert_(task.cancel())
+        release.set()
+        
+        self.assertRaises(TaskCancelledError, task.result, 5)
+        time.sleep(0.1)
+        self.assertEqual(ran, [])
+    
+    def testShouldTimeOutWaitingForASlowCall(self):
+        workers = WorkerPool(max_workers=1)
+        release = threading.Event()
+        
+        task = workers.submit(release.wait, 5)
+        
+        self.assertRaises(TaskTimeoutError, task.result, 0.05)
+        release.set()
+    
+    def testShouldNotRunABackgroundCallWhereThreadsAreUnavailable(self):
+        class UnstartableThread (threading.Thread):
+            def start(self):
+                raise RuntimeError("can't start new thread")
+        
+        workers = WorkerPool(max_workers=1)
+        ran = []
+        real_thread = threading.Thread
+        threading.Thread = UnstartableThread
+        try:
+            background = workers.submit_in_background(ran.append, 'background')
+            inline = workers.submit(ran.append, 'inline')
+        finally:
+            threading.Thread = real_thread
+        
+        self.assertEqual(background, None)
+        self.assert_(inline.done())
+        self.assertEqual(ran, ['inline'])
+
+    def testShouldRunCallsInTheSubmittingThreadsContext(self):
+        workers = WorkerPool(max_workers=1)
+        
+        context = begin_request()
+        try:
+            task = workers.submit(current_context)
+            self.assert_(task.result(5) is context)
+        finally:
+            use_context(None)
+        
+        task = workers.submit(current_context)
+        self.assertEqual(task.result(5), None)
+
+class AsCompletedTest (unittest.TestCase):
+    def testShouldYieldTasksInTheOrderTheyFinish(self):
+        workers = WorkerPool(max_workers=2)
+        release = threading.Event()
+        
+        slow = workers.submit(lambda: release.wait(5) and 'slow')
+        fast = workers.submit(lambda: 'fast')
+        
+        finished = as_completed([slow, fast], timeout=5)
+        self.assert_(finished.next() is fast)
+        release.set()
+        self.assert_(finished.next() is slow)
+
+class SingleFlightTest (unittest.TestCase):
+    def testConcurrentCallsWithTheSameKeyShouldShareOneCall(self):
+        flight = SingleFlight()
+        workers = WorkerPool(max_workers=3)
+        release = threading.Event()
+        calls = []
+        
+        def fetch(url):
+            calls.append(url)
+            release.wait(5)
+            return 'body of %s' % url
+        
+        tasks = [workers.submit(flight.do, 'key', fetch, '/a') for _ in range(3)]
+        while flight.stats.get('coalesced') < 2:
+            time.sleep(0.01)
+        release.set()
+        
+        self.assertEqual([task.result(5) for task in tasks], ['body of /a'] * 3)
+        self.assertEqual(calls, ['/a'])
+        self.assertEqual(flight.stats.get('calls'), 1)
+    
+    def testShouldMakeANewCallOnceTheLastHasFinished(self):
+        flight = SingleFlight()
+        calls = []
+        
+        def fetch():
+            calls.append(1)
+            raise ValueError('My Exception')
+        
+        self.assertRaises(ValueError, flight.do, 'key', fetch)
+        self.assertRaises(ValueError, flight.do, 'key', fetch)
+        self.assertEqual(len(calls), 2)
+
+    def testShouldOnlyWaitAsLongAsTheCallersOwnDeadline(self):
+        flight = SingleFlight()
+        workers = WorkerPool(max_workers=2)
+        release = threading.Event()
+        
+        def fetch():
+            release.wait(5)
+            return 'body'
+        
+        # Given a call that's under way for a request with plenty of time...
+        leader = call_with_deadline(Deadline(30), workers.submit,
+                                    flight.do, 'key', fetch)
+        while flight.stats.get('calls') < 1:
+            time.sleep(0.01)
+        
+        # When a request with less time waits on it...
+        follower = call_with_deadline(Deadline(0.1), workers.submit,
+                                      flight.do, 'key', fetch)
+        
+        # Then that request gives up on its own, and the call carries on.
+        self.assertRaises(DeadlineExceededError, follower.result, 5)
+        self.assert_(not leader.done())
+        release.set()
+        self.assertEqual(leader.result(5), 'body')
+    
+    def testShouldNotPassOnAFailureThatWasTheFirstCallersOwn(self):
+        flight = SingleFlight()
+        workers = WorkerPool(max_workers=2)
+        release = threading.Event()
+        deadlines = []
+        
+        def fetch():
+            deadlines.append(current_deadline())
+            release.wait(5)
+            current_deadline().limit()
+            return 'body'
+        
+        # Given a call made for a request that runs out of time...
+        leader = call_with_deadline(Deadline(0.1), workers.submit,
+                                    flight.do, 'key', fetch)
+        while flight.stats.get('calls') < 1:
+            time.sleep(0.01)
+        
+        # ...and a request with plenty of time waiting on it...
+        follower = call_with_deadline(Deadline(30), workers.submit,
+                                      flight.do, 'key', fetch)
+        while flight.stats.get('coalesced') < 1:
+            time.sleep(0.01)
+        time.sleep(0.2)
+        release.set()
+        
+        # Then only the first request fails, and the call is made again for
+        # the other.
+        self.assertRaises(DeadlineExceededError, leader.result, 5)
+        self.assertEqual(follower.result(5), 'body')
+        self.assertEqual([deadline.seconds for deadline in deadlines], [0.1, 30])
+        self.assertEqual(flight.stats.get('calls'), 2)
+    
+    def testShouldNotPassOnACancelledCall(self):
+        flight = SingleFlight()
+        workers = WorkerPool(max_workers=2)
+        release = threading.Event()
+        calls = []
+        
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            if len(calls) == 1:
+                raise TaskCancelledError('Task was cancelled')
+            return 'body'
+        
+        leader = workers.submit(flight.do, 'key', fetch)
+        while flight.stats.get('calls') < 1:
+            time.sleep(0.01)
+        follower = workers.submit(flight.do, 'key', fetch)
+        while flight.stats.get('coalesced') < 1:
+            time.sleep(0.01)
+        release.set()
+        
+        self.assertRaises(TaskCancelledError, leader.result, 5)
+        self.assertEqual(follower.result(5), 'body')
+        self.assertEqual(len(calls), 2)
+
+class HedgerTest (unittest.TestCase):
+    def testShouldNotHedgeACallThatFinishesInTime(self):
+        hedger = Hedger(initial_delay=1)
+        calls = []
+        
+        def fetch():
+            calls.append(1)
+            return 'body'
+        
+        self.assertEqual(hedger.call(fetch), 'body')
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(hedger.stats.get('hedges_sent'), 0)
+    
+    def testShouldTakeTheHedgesAnswerWhenItComesFirst(self):
+        hedger = Hedger(initial_delay=0.01, max_rate=1)
+        release = threading.Event()
+        calls = []
+        
+        def fetch():
+            calls.append(1)
+            if len(calls) == 1:
+                release.wait(5)
+                return 'slow'
+            return 'fast'
+        
+        self.assertEqual(hedger.call(fetch), 'fast')
+        release.set()
+        self.assertEqual(hedger.stats.get('hedges_sent'), 1)
+        self.assertEqual(hedger.stats.get('hedges_won'), 1)
+    
+    def testShouldHedgeNoMoreThanTheMaxRateOfCalls(self):
+        hedger = Hedger(initial_delay=0, max_rate=0.25)
+        
+        for _ in range(8):
+            hedger.call(time.sleep, 0.01)
+        
+        self.assertEqual(hedger.stats.get('hedges_sent'), 2)
+    
+    def testShouldWaitForThePercentileOfRecentCallTimes(self):
+        hedger = Hedger(percentile=0.9, initial_delay=5, min_samples=10)
+        for seconds in range(10):
+            self.assertEqual(hedger.get_delay(), 5)
+            hedger.record_time(seconds * 0.1)
+        
+        self.assertAlmostEqual(hedger.get_delay(), 0.8)
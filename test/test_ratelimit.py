@@ -0,0 +1,71 @@
+import unittest
+
+from util.ratelimit import RateLimiter
+from util.ratelimit import TokenBucket
+
+class TokenBucketTest (unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.bucket = TokenBucket(rate=2, capacity=3, timer=lambda: self.now)
+    
+    def testShouldLetABurstUpToTheCapacityThroughRightAway(self):
+        self.assertEqual([self.bucket.reserve() for _ in range(3)], [0, 0, 0])
+    
+    def testCallersShouldWaitTheirTurnOnceTheBucketIsEmpty(self):
+        for _ in range(3):
+            self.bucket.reserve()
+        
+        self.assertEqual(self.bucket.reserve(), 0.5)
+        self.assertEqual(self.bucket.reserve(), 1.0)
+    
+    def testShouldRefillAtTheRateButNotBeyondTheCapacity(self):
+        for _ in range(3):
+            self.bucket.reserve()
+        
+        self.now += 100
+        
+        self.assertEqual([self.bucket.reserve() for _ in range(4)], [0, 0, 0, 0.5])
+    
+    def testShouldNotTakeATokenThatWouldArriveTooLate(self):
+        for _ in range(3):
+            self.bucket.reserve()
+        
+        self.assertEqual(self.bucket.reserve(timeout=0.25), None)
+        self.assertEqual(self.bucket.reserve(timeout=0.5), 0.5)
+
+class RateLimiterTest (unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.slept = []
+        self.limiter = RateLimiter(
+            {'search': (1, 1), ('slow.example.com', 'search'): (0.5, 1)},
+            timer=lambda: self.now, sleep=self.slept.append)
+    
+    def testShouldKeepABucketForEachHostAndKindOfRequest(self):
+        self.assert_(self.limiter.acquire(('a.example.com', 'search')))
+        self.assert_(self.limiter.acquire(('b.example.com', 'search')))
+        self.assertEqual(self.slept, [])
+        
+        self.assert_(self.limiter.acquire(('a.example.com', 'search')))
+        self.assertEqual(self.slept, [1.0])
+    
+    def testShouldPreferAHostsOwnLimit(self):
+        self.limiter.acquire(('slow.example.com', 'search'))
+        self.limiter.acquire(('slow.example.com', 'search'))
+        
+        self.assertEqual(self.slept, [2.0])
+    
+    def testShouldNotLimitKindsOfRequestWithNoLimit(self):
+        for _ in range(10):
+            self.assert_(self.limiter.acquire(('a.example.com', 'lightbox')))
+        
+        self.assertEqual(self.slept, [])
+    
+    def testShouldReportTheTimeSpentWaiting(self):
+        key = ('a.example.com', 'search')
+        self.limiter.acquire(key)
+        self.limiter.acquire(key)
+        self.limiter.acquire(key, timeout=1)
+        
+        self.assertEqual(self.limiter.stats.snapshot(),
+            {'calls': 3, 'delayed': 1, 'wait_ms': 1000, 'timeouts': 1})
@@ -0,0 +1,54 @@
+import threading
+import unittest
+
+from pcs.wsgi_handlers.registry import ApplicationRegistry
+from util.cache import LruCache
+from pcs.fetchers.screenscrape.locations import LocationProfileCache
+
+class ApplicationRegistryTest (unittest.TestCase):
+    def setUp(self):
+        self.registry = ApplicationRegistry()
+    
+    def testShouldBuildEachSourceOnlyOnce(self):
+        self.assert_(self.registry.session_source() is self.registry.session_source())
+        self.assert_(self.registry.availability_source() is self.registry.availability_source())
+        self.assert_(self.registry.locations_source() is self.registry.locations_source())
+        self.assert_(self.registry.reservations_source() is self.registry.reservations_source())
+    
+    def testShouldGiveSourcesTheRegistrysCaches(self):
+        vehicle_cache = LruCache(max_bytes=100, ttl=10)
+        profile_cache = LocationProfileCache()
+        registry = ApplicationRegistry(vehicle_cache=vehicle_cache,
+                                       profile_cache=profile_cache)
+        
+        self.assert_(registry.availability_source().vehicle_cache is vehicle_cache)
+        self.assert_(registry.locations_source().profile_cache is profile_cache)
+    
+    def testShouldBuildAnObjectOnceWhenAskedForItByManyThreads(self):
+        built = []
+        start = threading.Event()
+        
+        def create():
+            built.append(object())
+            return built[-1]
+        
+        results = []
+        def get():
+            start.wait()
+            results.append(self.registry.get('thing', create))
+        
+        threads = [threading.Thread(target=get) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(len(built), 1)
+        self.assertEqual(results, built * 10)
+    
+    def testShouldBuildObjectsAgainOnceCleared(self):
+        source = self.registry.session_source()
+        self.registry.clear()
+        
+        self.assert_(self.registry.session_source() is not source)
@@ -2,6 +2,11 @@ import unittest
 import datetime
 import new
 
+try:
+    import json
+except ImportError:
+    from django.utils import simplejson as json
+
 from pcs.wsgi_handlers.base import WsgiParameterError
 from pcs.wsgi_handlers.appengine.reservations import ReservationHandler
 from pcs.wsgi_handlers.appengine.reservations import ReservationsHandler
@@ -535,7 +540,7 @@ class ReservationsScreenscrapeSourceTest (unittest.TestCase):
             return 'my body', 'my head'
         
         @patch(self.source)
-        def get_html_document(self, response_body):
+        def get_html_document(self, response_body, parts=None):
             self.html_body = response_body
             return 'my html doc'
         
@@ -590,7 +595,7 @@ class ReservationsScreenscrapeSourceTest (unittest.TestCase):
             return 'my body', 'my head'
         
         @patch(self.source)
-        def get_html_document(self, response_body):
+        def get_html_document(self, response_body, parts=None):
             self.html_body = response_body
             return 'my html doc'
         
@@ -1283,7 +1288,7 @@ class ReservationsJsonViewTest (unittest.TestCase):
     ]
   }
 }"""
-        self.assertEqual(result, expected)
+        self.assertEqual(json.loads(result), json.loads(expected))
     
     def testShouldPrepareLoggedReservationForJsonDump(self):
         renderer = ReservationsJsonView()
@@ -1397,7 +1402,7 @@ class ReservationsJsonViewTest (unittest.TestCase):
     }
   }
 }"""
-        self.assertEqual(result, expected)
+        self.assertEqual(json.loads(result), json.loads(expected))
     
     def testShouldRenderReservationJson(self):
         renderer = ReservationsJsonView()
@@ -1443,5 +1448,5 @@ class ReservationsJsonViewTest (unittest.TestCase):
     }
   }
 }"""
-        self.assertEqual(result, expected)
+        self.assertEqual(json.loads(result), json.loads(expected))
 
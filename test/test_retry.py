@@ -0,0 +1,109 @@
+import unittest
+
+from util.retry import CircuitBreaker
+from util.retry import CircuitBreakers
+from util.retry import RetryPolicy
+
+class RetryPolicyTest (unittest.TestCase):
+    def testShouldDoubleTheMaximumDelayForEachAttempt(self):
+        policy = RetryPolicy(base_delay=0.1, max_delay=10, random=lambda: 1.0)
+        
+        self.assertAlmostEqual(policy.get_delay(0), 0.1)
+        self.assertAlmostEqual(policy.get_delay(1), 0.2)
+        self.assertAlmostEqual(policy.get_delay(3), 0.8)
+    
+    def testShouldNeverWaitLongerThanTheMaxDelay(self):
+        policy = RetryPolicy(base_delay=0.1, max_delay=0.5, random=lambda: 1.0)
+        
+        self.assertAlmostEqual(policy.get_delay(10), 0.5)
+    
+    def testShouldWaitARandomFractionOfTheDelay(self):
+        slept = []
+        policy = RetryPolicy(base_delay=1, max_delay=10, sleep=slept.append,
+                             random=lambda: 0.25)
+        
+        policy.wait(2)
+        
+        self.assertEqual(slept, [1.0])
+
+class CircuitBreakerTest (unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30,
+                                      timer=lambda: self.now)
+    
+    def testShouldOpenAfterTheThresholdOfConsecutiveFailures(self):
+        breaker = self.breaker
+        
+        breaker.record_failure()
+        breaker.record_failure()
+        self.assert_(breaker.allow_request())
+        
+        breaker.record_failure()
+        self.assert_(not breaker.allow_request())
+        self.assertEqual(breaker.state(), CircuitBreaker.OPEN)
+        self.assertEqual(breaker.stats.snapshot(),
+            {'open': 1, 'failures': 3, 'opened': 1, 'rejected': 1})
+    
+    def testASuccessShouldResetTheFailureCount(self):
+        breaker = self.breaker
+        
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        
+        self.assert_(breaker.allow_request())
+    
+    def testShouldLetOneTrialRequestThroughAfterTheResetTimeout(self):
+        breaker = self.breaker
+        for _ in range(3):
+            breaker.record_failure()
+        
+        self.now += 30
+        
+        self.assert_(breaker.allow_request())
+        self.assertEqual(breaker.state(), CircuitBreaker.HALF_OPEN)
+        self.assert_(not breaker.allow_request())
+    
+    def testShouldCloseWhenTheTrialRequestSucceeds(self):
+        breaker = self.breaker
+        for _ in range(3):
+            breaker.record_failure()
+        self.now += 30
+        breaker.allow_request()
+        
+        breaker.record_success()
+        
+        self.assertEqual(breaker.state(), CircuitBreaker.CLOSED)
+        self.assert_(breaker.allow_request())
+        self.assertEqual(breaker.stats.get('open'), 0)
+    
+    def testShouldReopenWhenTheTrialRequestFails(self):
+        breaker = self.breaker
+        for _ in range(3):
+            breaker.record_failure()
+        self.now += 30
+        breaker.allow_request()
+        
+        breaker.record_failure()
+        
+        self.assertEqual(breaker.state(), CircuitBreaker.OPEN)
+        self.assert_(not breaker.allow_request())
+        self.now += 30
+        self.assert_(breaker.allow_request())
+
+class CircuitBreakersTest (unittest.TestCase):
+    def testShouldKeepASeparateBreakerForEachKey(self):
+        breakers = CircuitBreakers(failure_threshold=2)
+        
+        for _ in range(2):
+            breakers.get('a').record_failure()
+        
+        self.assert_(breakers.get('a') is breakers.get('a'))
+        self.assert_(not breakers.get('a').allow_request())
+        self.assert_(breakers.get('b').allow_request())
+        self.assertEqual(breakers.stats.get('open'), 1)
+        
+        breakers.get('a').record_success()
+        self.assertEqual(breakers.stats.get('open'), 0)
@@ -1,12 +1,18 @@
 import unittest
 import StringIO
 
+try:
+    import json
+except ImportError:
+    from django.utils import simplejson as json
+
 from util.testing import Stub
 from util.testing import patch
 
 from pcs.wsgi_handlers.base import WsgiParameterError
 from pcs.fetchers import SessionLoginError
 from pcs.fetchers import SessionExpiredError
+from pcs.fetchers.screenscrape import ScreenscrapeFetchError
 
 # A fake request class
 class StubRequest (dict):
@@ -20,7 +26,8 @@ class StubRequest (dict):
 
 # A fake response class
 class StubHeaders (object):
-    header_list = []
+    def __init__(self):
+        self.header_list = []
     def add_header(self, key, val):
         self.header_list.append((key,val))
 
@@ -220,8 +227,27 @@ class SessionScreenscrapeSourceTest (unittest.TestCase):
             return
         
         self.fail('Should have raised SessionExpiredError')
+    
+    def testShouldPrepareAFetchThatReconnectsToTheSession(self):
+        # Given...
+        source = SessionScreenscrapeSource()
+        
+        # When...
+        fetch = source.prepare_session_fetch('valid_user', '12345abcde')
+        session = fetch.parse_response('<html><head><title>Reservation Manager</title></head><body><p>Jalani Bakari, you are signed in (Residential)!</body></html>', {})
+        
+        # Then...
+        url, method, data, headers = fetch.request
+        self.assertEqual(method, 'POST')
+        self.assertEqual(headers, {'Cookie': 'sid=12345abcde'})
+        self.assertEqual(session.id, '12345abcde')
+        self.assertEqual(session.name, 'Jalani Bakari')
+        self.assertRaises(SessionExpiredError, fetch.parse_response,
+            "<html><head><title>Please Login</title></head><body></body></html>", {})
 
 from pcs.wsgi_handlers.appengine.session import SessionHandler
+from pcs.wsgi_handlers.base import SessionCache
+from pcs.data.session import Session
 from pcs.fetchers import _SessionSourceInterface
 from pcs.renderers import _SessionViewInterface
 from pcs.fetchers import SessionLoginError
@@ -330,6 +356,50 @@ class SessionHandlerTest (unittest.TestCase):
         self.assertEqual(self.handler.sessionid, 'ses1234')
         self.assert_('SessionExpiredError' in response_body, 'Response does not contain SessionExpiredError: %r' % response_body)
     
+    def testShouldOnlyFetchSessionFromSourceOnceWhenCached(self):
+        self.handler.session_cache = SessionCache()
+        
+        @patch(self.session_source)
+        def fetch_session(self, userid, sessionid):
+            self.fetches = getattr(self, 'fetches', 0) + 1
+            return Session(sessionid, userid, 'My User Name')
+        
+        first = self.handler.get_session(None, 'ses1234')
+        second = self.handler.get_session(None, 'ses1234')
+        
+        self.assertEqual(self.session_source.fetches, 1)
+        self.assert_(first is second)
+    
+    def testShouldRememberExpiredSessionsWhenAnExpiredSessionErrorIsReported(self):
+        self.handler.session_cache = SessionCache()
+        self.handler.session_cache.add(Session('ses1234', None, 'My User Name'))
+        self.handler.request.cookies['session_id'] = 'ses1234'
+        
+        self.handler.generate_error(ScreenscrapeFetchError('Please sign in', 'invalid_session'))
+        
+        self.assertRaises(SessionExpiredError, self.handler.get_session, None, 'ses1234')
+    
+    def testShouldLogPcsResponsesWithoutTheirCookies(self):
+        import logging
+        logged = []
+        class ListHandler (logging.Handler):
+            def emit(self, record):
+                logged.append(record.getMessage())
+        log_handler = ListHandler()
+        logging.getLogger().addHandler(log_handler)
+        
+        self.handler.logged_pcs_body_length = 10
+        self.handler.context.set('pcs_response', ('<html>' + 'x' * 100,
+            [('Set-Cookie', 'sid=live1234; path=/'), ('Content-Type', 'text/html')]))
+        try:
+            self.handler.generate_error(SessionLoginError('Bad password'))
+        finally:
+            logging.getLogger().removeHandler(log_handler)
+        
+        self.assert_('live1234' not in logged[0])
+        self.assert_('text/html' in logged[0])
+        self.assert_('<html>xxxx... (96 more bytes)' in logged[0])
+    
     def testShouldSaveSessionToSetCookieHeader(self):
         class StubSession (object):
             id = 'ses1234'
@@ -454,17 +524,15 @@ class SessionJsonViewTest (unittest.TestCase):
 				self.fail('Exception expected')
 		
 		def testShouldReturnAppropriateBodyWithValidSession(self):
-				expected = \
-"""{"session" : {
-	"id" : "ses123",
-	"userid" : "user123",
-	"name" : "user name"
-}}"""
+				expected = {'session': {'id': 'ses123', 'userid': 'user123', 'name': 'user name'}}
 				view = SessionJsonView()
 				session = Session('ses123', 'user123', 'user name')
 				
 				result = view.render_session(session)
-				self.assertEqual(result, expected)
+				self.assertEqual(json.loads(result), expected)
+				
+				# The response should be compact.
+				self.assert_(': ' not in result and ', ' not in result)
 				
 				
 from pcs.wsgi_handlers.appengine.session import SessionJsonHandler
@@ -0,0 +1,97 @@
+import datetime
+import unittest
+
+from benchmarks.standin import StandInConnection
+from benchmarks.standin import StandInPages
+from benchmarks.standin import start_standin
+from pcs.fetchers import SessionLoginError
+from pcs.fetchers.screenscrape.availability import AvailabilityScreenscrapeSource
+from pcs.fetchers.screenscrape.locations import LocationsScreenscrapeSource
+from pcs.fetchers.screenscrape.pcsconnection import PcsConnection
+from pcs.fetchers.screenscrape.reservations import PcsRequestMaker
+from pcs.fetchers.screenscrape.reservations import ReservationsScreenscrapeSource
+from pcs.fetchers.screenscrape.session import SessionScreenscrapeSource
+from util.TimeZone import Eastern
+
+class StandInTest (unittest.TestCase):
+    def setUp(self):
+        self.server = start_standin(pods=50, history_pages=40,
+                                    reservations_per_page=7)
+        self.host = self.server.host
+        
+        start_time = datetime.datetime(2010, 8, 23, 1, 15, tzinfo=Eastern)
+        self.times = (start_time, start_time + datetime.timedelta(hours=2))
+    
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def create_connection(self):
+        conn = PcsConnection()
+        conn.backend = PcsConnection.HTTPLIB_BACKEND
+        conn.coalescer = None
+        conn.breakers = None
+        conn.rate_limiter = None
+        return conn
+    
+    def testShouldLetAnyoneLogInWithTheRightPassword(self):
+        source = SessionScreenscrapeSource(host=self.host, login_scheme='http')
+        source.create_host_connection = self.create_connection
+        
+        session = source.create_session('mjumbe', 'right')
+        
+        self.assertEqual(session.name, 'Mjumbe Poe')
+        self.assertEqual(source.fetch_session('mjumbe', session.id).id, session.id)
+        self.assertRaises(SessionLoginError,
+            source.create_session, 'mjumbe', 'wrong')
+    
+    def testShouldServeAsManyPodsAsAskedFor(self):
+        source = AvailabilityScreenscrapeSource(host=self.host)
+        source.create_host_connection = self.create_connection
+        
+        vehicles = source.fetch_available_vehicles_near('ses1234', 'loc1234',
+                                                        *self.times)
+        
+        self.assertEqual(len(set(va.vehicle.pod.id for va in vehicles)), 50)
+        self.assertEqual(len(set(va.vehicle.id for va in vehicles)), len(vehicles))
+    
+    def testShouldServeVehicleInformationAndPrices(self):
+        source = AvailabilityScreenscrapeSource(host=self.host)
+        source.create_host_connection = self.create_connection
+        
+        vehicle = source.fetch_vehicle_availability('ses1234', '10000301',
+                                                    *self.times)
+        price = source.fetch_vehicle_price_estimate('ses1234', '10000301',
+                                                    *self.times)
+        
+        self.assertEqual(vehicle.vehicle.id, '10000301')
+        self.assertEqual(price.hourly_rate, 9.25)
+    
+    def testShouldServeLocationProfiles(self):
+        source = LocationsScreenscrapeSource(
+            url='http://%s/my_info.php?mv_action=dpref&mvssl' % self.host)
+        source.create_connection = self.create_connection
+        
+        locations = source.fetch_location_profiles('ses1234')
+        
+        self.assertEqual(len(locations), 4)
+    
+    def testShouldServeAsManyPagesOfHistoryAsAskedFor(self):
+        source = ReservationsScreenscrapeSource(PcsRequestMaker(host=self.host))
+        source.get_pcs_connection = self.create_connection
+        
+        reservations, current_page, page_count = \
+            source.fetch_reservations('ses1234', datetime.date(2010, 9, 1))
+        
+        self.assertEqual(len(reservations), 7)
+        self.assertEqual((current_page, page_count), (1, 40))
+
+class StandInConnectionTest (unittest.TestCase):
+    def testShouldAnswerFromThePagesWithoutAServer(self):
+        source = ReservationsScreenscrapeSource()
+        pages = StandInPages(pods=1, history_pages=1)
+        source.get_pcs_connection = lambda: StandInConnection(pages)
+        
+        reservation = source.fetch_reservation_information('ses1234', '2482842')
+        
+        self.assertEqual(reservation.logid, '2516709')
@@ -6,13 +6,24 @@ class OverrideException (Exception):
     pass
 
 def override(method):
+    """
+    Check that method overrides one with the same arguments in the parent
+    class of whatever instance it is called on.  The check is made the first
+    time the method is called on an instance of each class; later calls go
+    straight through to method.
     
-    def invalid_reason(method, calling_inst):
+    @raise: OverrideException if the method is not a valid override.
+    """
+    
+    # The classes that method has been checked against so far
+    verified_classes = set()
+    
+    def invalid_reason(method, calling_class):
         """
         Return a reason that the given overriden member is not valid in the 
         given class.  If the member is valid, return None.
         """
-        parent_class = inspect.getmro(calling_inst.__class__)[1]
+        parent_class = inspect.getmro(calling_class)[1]
         
         if not hasattr(parent_class, method.__name__):
             return 'Parent class %s has no attribute %r' \
@@ -28,15 +39,17 @@ def override(method):
         # Otherwise, pass
         return None
     
-    def verify_against_calling_inst(calling_inst):
-        reason = invalid_reason(method, calling_inst)
+    def verify_against_calling_class(calling_class):
+        reason = invalid_reason(method, calling_class)
         if reason is not None:
             raise OverrideException('%s.%s is not a valid override: %s' 
-                % (calling_inst.__class__.__name__, method.__name__, reason))
+                % (calling_class.__name__, method.__name__, reason))
+        verified_classes.add(calling_class)
     
     @functools.wraps(method)
     def wrapped(self, *args, **kwds):
-        verify_against_calling_inst(self)
+        if self.__class__ not in verified_classes:
+            verify_against_calling_class(self.__class__)
         return method(self, *args, **kwds)
     
     return wrapped
@@ -0,0 +1,282 @@
+"""
+Thread-safe, in-process caches whose entries expire after a while.  They are
+meant for values that are expensive to get from PCS and that stay valid for a
+predictable amount of time:
+    
+    sessions = TtlCache(ttl=300, stats_name='session_cache')
+    
+    session = sessions.get(sessionid)
+    if session is None:
+        session = fetch_session(sessionid)
+        sessions.set(sessionid, session)
+
+LruCache additionally bounds the total size of its values, evicting the least
+recently used ones first.  Each cache with a stats_name reports its hits,
+misses, expirations and evictions through util.metrics.
+"""
+import threading
+import time
+
+from util import metrics
+
+class _Cache (object):
+    COUNTERS = ('hits', 'misses', 'expired', 'evicted')
+    
+    def _create_stats(self, stats_name):
+        if stats_name is not None:
+            return metrics.counters(stats_name, *self.COUNTERS)
+        else:
+            return metrics.Counters('cache', *self.COUNTERS)
+    
+    def hit_rate(self):
+        """
+        @return: The fraction of lookups that found a value, or None if there
+          have been no lookups yet.
+        """
+        hits = self.stats.get('hits')
+        lookups = hits + self.stats.get('misses')
+        if not lookups:
+            return None
+        return float(hits) / lookups
+
+class TtlCache (_Cache):
+    """
+    A mapping whose entries are forgotten ttl seconds after they are set.  If
+    max_entries is given, the entries closest to expiring are evicted to make
+    room for new ones.
+    """
+    
+    def __init__(self, ttl, max_entries=None, stats_name=None, timer=time.time):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.timer = timer
+        
+        self.__lock = threading.Lock()
+        self.__entries = {}
+        
+        self.stats = self._create_stats(stats_name)
+    
+    def get(self, key, default=None):
+        """
+        @return: The value stored under key, or default if there is none or it
+          has expired.
+        """
+        now = self.timer()
+        
+        self.__lock.acquire()
+        try:
+            entry = self.__entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self.__entries[key]
+                self.stats.increment('expired')
+                entry = None
+        finally:
+            self.__lock.release()
+        
+        if entry is None:
+            self.stats.increment('misses')
+            return default
+        
+        self.stats.increment('hits')
+        return entry[1]
+    
+    def set(self, key, value, ttl=None):
+        """
+        Store value under key for ttl seconds (or the cache's ttl, if none is
+        given).
+        """
+        if ttl is None:
+            ttl = self.ttl
+        now = self.timer()
+        
+        self.__lock.acquire()
+        try:
+            if self.max_entries is not None and key not in self.__entries:
+                self.__make_room(now)
+            self.__entries[key] = (now + ttl, value)
+        finally:
+            self.__lock.release()
+    
+    def __make_room(self, now):
+        if len(self.__entries) < self.max_entries:
+            return
+        
+        for key, (expires_at, _) in self.__entries.items():
+            if expires_at <= now:
+                del self.__entries[key]
+                self.stats.increment('expired')
+        
+        while self.__entries and len(self.__entries) >= self.max_entries:
+            soonest = min(self.__entries,
+                          key=lambda key: self.__entries[key][0])
+            del self.__entries[soonest]
+            self.stats.increment('evicted')
+    
+    def delete(self, key):
+        self.__lock.acquire()
+        try:
+            self.__entries.pop(key, None)
+        finally:
+            self.__lock.release()
+    
+    def clear(self):
+        self.__lock.acquire()
+        try:
+            self.__entries.clear()
+        finally:
+            self.__lock.release()
+    
+    def __len__(self):
+        self.__lock.acquire()
+        try:
+            return len(self.__entries)
+        finally:
+            self.__lock.release()
+    
+class LruCache (_Cache):
+    """
+    A mapping that holds at most max_bytes worth of values, forgetting the
+    least recently used ones to make room for new ones.  Entries also expire
+    ttl seconds after they are set.
+    
+    The size of each value is given when it is set; if it isn't, sizeof(value)
+    is used.
+    """
+    
+    COUNTERS = _Cache.COUNTERS + ('entries', 'bytes')
+    
+    def __init__(self, max_bytes, ttl, sizeof=len, stats_name=None,
+                 timer=time.time):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.timer = timer
+        
+        self.__lock = threading.Lock()
+        self.__entries = {}
+        self.__bytes = 0
+        
+        # The entries are kept in a circular, doubly-linked list, from most to
+        # least recently used.  Each link is [prev, next, key, value, size,
+        # expires_at].
+        self.__head = []
+        self.__head[:] = [self.__head, self.__head, None, None, 0, None]
+        
+        self.stats = self._create_stats(stats_name)
+    
+    def __unlink(self, link):
+        link[0][1] = link[1]
+        link[1][0] = link[0]
+    
+    def __link_first(self, link):
+        head = self.__head
+        link[0] = head
+        link[1] = head[1]
+        head[1][0] = link
+        head[1] = link
+    
+    def __remove(self, link):
+        self.__unlink(link)
+        del self.__entries[link[2]]
+        self.__bytes -= link[4]
+    
+    def __update_stats(self):
+        self.stats.set('entries', len(self.__entries))
+        self.stats.set('bytes', self.__bytes)
+    
+    def get(self, key, default=None):
+        """
+        @return: The value stored under key, or default if there is none or it
+          has expired.
+        """
+        now = self.timer()
+        
+        self.__lock.acquire()
+        try:
+            link = self.__entries.get(key)
+            if link is not None and link[5] <= now:
+                self.__remove(link)
+                self.__update_stats()
+                self.stats.increment('expired')
+                link = None
+            
+            if link is None:
+                self.stats.increment('misses')
+                return default
+            
+            self.__unlink(link)
+            self.__link_first(link)
+            self.stats.increment('hits')
+            return link[3]
+        finally:
+            self.__lock.release()
+    
+    def set(self, key, value, ttl=None, size=None):
+        """
+        Store value under key for ttl seconds (or the cache's ttl, if none is
+        given).  A value larger than the whole cache is not stored at all.
+        """
+        if ttl is None:
+            ttl = self.ttl
+        if size is None:
+            size = self.sizeof(value)
+        now = self.timer()
+        
+        self.__lock.acquire()
+        try:
+            link = self.__entries.get(key)
+            if link is not None:
+                self.__remove(link)
+            
+            if size > self.max_bytes:
+                self.__update_stats()
+                return
+            
+            while self.__bytes + size > self.max_bytes:
+                self.__remove(self.__head[0])
+                self.stats.increment('evicted')
+            
+            link = [None, None, key, value, size, now + ttl]
+            self.__link_first(link)
+            self.__entries[key] = link
+            self.__bytes += size
+            self.__update_stats()
+        finally:
+            self.__lock.release()
+    
+    def delete(self, key):
+        self.__lock.acquire()
+        try:
+            link = self.__entries.get(key)
+            if link is not None:
+                self.__remove(link)
+                self.__update_stats()
+        finally:
+            self.__lock.release()
+    
+    def clear(self):
+        self.__lock.acquire()
+        try:
+            self.__entries.clear()
+            self.__head[:] = [self.__head, self.__head, None, None, 0, None]
+            self.__bytes = 0
+            self.__update_stats()
+        finally:
+            self.__lock.release()
+    
+    def __len__(self):
+        self.__lock.acquire()
+        try:
+            return len(self.__entries)
+        finally:
+            self.__lock.release()
+    
+    def size(self):
+        """
+        @return: The total size of the values in the cache.
+        """
+        self.__lock.acquire()
+        try:
+            return self.__bytes
+        finally:
+            self.__lock.release()
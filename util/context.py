@@ -0,0 +1,80 @@
+"""
+Per-request state that is kept off of the (shared) sources and handlers.  Each
+thread has at most one current RequestContext:
+    
+    context = begin_request()
+    ...
+    current_context().set('pcs_response', (body, headers))
+
+Calls submitted to a util.parallel.WorkerPool run in the context of the thread
+that submitted them, so the state follows a request onto the worker threads.
+"""
+import threading
+
+class RequestContext (object):
+    """
+    A bag of values that belong to a single request.  It may be used from the
+    several threads that are working on the request at once.
+    """
+    
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__values = {}
+    
+    def get(self, key, default=None):
+        self.__lock.acquire()
+        try:
+            return self.__values.get(key, default)
+        finally:
+            self.__lock.release()
+    
+    def set(self, key, value):
+        self.__lock.acquire()
+        try:
+            self.__values[key] = value
+        finally:
+            self.__lock.release()
+
+    def copy(self):
+        """
+        @return: A new context with the same values, which may be changed
+          without changing this one.
+        """
+        context = RequestContext()
+        self.__lock.acquire()
+        try:
+            for key, value in self.__values.items():
+                context.set(key, value)
+        finally:
+            self.__lock.release()
+        return context
+
+_local = threading.local()
+
+def current_context():
+    """
+    @return: The calling thread's RequestContext, or None if it isn't working
+      on a request.
+    """
+    return getattr(_local, 'context', None)
+
+def use_context(context):
+    """
+    Make context the calling thread's current context.
+    
+    @return: The context that was current before.
+    """
+    previous = current_context()
+    _local.context = context
+    return previous
+
+def begin_request():
+    """
+    Start a new context for the request that the calling thread is about to
+    handle.
+    
+    @return: The new RequestContext.
+    """
+    context = RequestContext()
+    use_context(context)
+    return context
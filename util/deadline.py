@@ -0,0 +1,95 @@
+"""
+A time budget for a whole request.  The handler starts the clock when the
+request comes in, and every upstream call made on the request's behalf -- each
+redirect, retry and parallel leg -- draws on whatever time is left:
+    
+    deadline = start_deadline(20)
+    ...
+    timeout = current_deadline().limit(10)
+
+The deadline lives in the request's util.context.RequestContext, so it follows
+the request onto worker threads without being passed through every call.
+"""
+import time
+
+from util.context import current_context
+from util.context import RequestContext
+from util.context import use_context
+
+class DeadlineExceededError (Exception):
+    """
+    Raised when a request has run out of time.
+    """
+    code = 'timeout'
+
+class Deadline (object):
+    def __init__(self, seconds, timer=time.time):
+        self.seconds = seconds
+        self.timer = timer
+        self.expires_at = timer() + seconds
+    
+    def remaining(self):
+        """
+        @return: The number of seconds left, or 0 if there are none.
+        """
+        return max(self.expires_at - self.timer(), 0)
+    
+    def expired(self):
+        return self.remaining() <= 0
+    
+    def limit(self, seconds=None):
+        """
+        @return: The given number of seconds, or the time remaining if that is
+          less (or if seconds is None).
+        @raise: DeadlineExceededError if there is no time remaining.
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceededError(
+                'The request did not finish within %s seconds.' % self.seconds)
+        
+        if seconds is None:
+            return remaining
+        return min(seconds, remaining)
+
+def start_deadline(seconds):
+    """
+    Give the calling thread's current request seconds to finish in.
+    
+    @return: The new Deadline.
+    """
+    deadline = Deadline(seconds)
+    current_context().set('deadline', deadline)
+    return deadline
+
+def current_deadline():
+    """
+    @return: The Deadline of the calling thread's current request, or None if
+      it has none.
+    """
+    context = current_context()
+    if context is None:
+        return None
+    return context.get('deadline')
+
+def call_with_deadline(deadline, function, *args, **kwds):
+    """
+    Call function(*args, **kwds) with the given Deadline in place of the
+    current request's, e.g. for one of several upstream calls that each have
+    their own time budget.  The function sees a copy of the rest of the
+    current request's context; the request's own deadline is left as it was.
+    
+    @return: Whatever the function returns.
+    """
+    context = current_context()
+    if context is None:
+        context = RequestContext()
+    else:
+        context = context.copy()
+    context.set('deadline', deadline)
+    
+    previous_context = use_context(context)
+    try:
+        return function(*args, **kwds)
+    finally:
+        use_context(previous_context)
@@ -0,0 +1,166 @@
+"""
+Interchangeable HTML parsers.  Each backend's parse method returns a document
+supporting the subset of the BeautifulSoup API that the screenscrapers use:
+    
+    doc = default_backend.parse(markup)
+    table = doc.find('table', {'id': 'main_dlist_'})
+    for tr in table.findAll('tr'):
+        print tr.find('a')['href'], tr.text
+
+The lxml backend is much faster, and is the default when lxml is installed;
+otherwise the bundled BeautifulSoup is used.
+
+When only a few parts of a large page are needed, name the elements they are
+rooted at and the rest of the page won't be built:
+    
+    doc = default_backend.parse(markup, only=[('table', {'id': 'main_dlist_'}),
+                                              ('span', {'id': 'confirm_id_'})])
+"""
+import re
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:
+    lxml = None
+
+from util.BeautifulSoup import BeautifulSoup
+from util.BeautifulSoup import SoupStrainer
+
+def element_matches(name, attrs, wanted_name, wanted_attrs):
+    """
+    @return: True if an element with the given name and attrs (a dict) has
+      wanted_name and all of wanted_attrs.
+    """
+    if name != wanted_name:
+        return False
+    for key, value in (wanted_attrs or {}).items():
+        if attrs.get(key) != value:
+            return False
+    return True
+
+class BeautifulSoupBackend (object):
+    name = 'beautifulsoup'
+    
+    def strainer(self, only):
+        """
+        @return: A SoupStrainer that lets through the elements matching any of
+          the (name, attrs) pairs in only, along with everything inside them.
+        """
+        def is_wanted(name, attrs):
+            attrs = dict(attrs)
+            for wanted_name, wanted_attrs in only:
+                if element_matches(name, attrs, wanted_name, wanted_attrs):
+                    return True
+            return False
+        
+        return SoupStrainer(is_wanted)
+    
+    def parse(self, markup, only=None):
+        if only is None:
+            return BeautifulSoup(markup)
+        else:
+            return BeautifulSoup(markup, parseOnlyThese=self.strainer(only))
+
+class LxmlBackend (object):
+    """
+    Parses documents with lxml.html, wrapping the elements so that they behave
+    like BeautifulSoup tags.
+    
+    BeautifulSoup leaves entity references in text alone (the text of
+    "<b>A &amp; B</b>" is u"A &amp; B"), while lxml decodes them.  To give the
+    same text, entity references outside of tags, scripts and comments are
+    escaped before the markup is handed to lxml.
+    
+    lxml builds its whole tree in C, so the only argument to parse is accepted
+    but not acted upon; the subtrees it names are found just the same.
+    """
+    name = 'lxml'
+    
+    UNTOUCHED_MARKUP = re.compile(
+        r'(<script\b.*?</script\s*>|<style\b.*?</style\s*>|<!--.*?-->|<[^>]*>)',
+        re.IGNORECASE | re.DOTALL)
+    ENTITY_REFERENCE = re.compile(r'&(#?\w+;)')
+    
+    def protect_entities(self, markup):
+        pieces = self.UNTOUCHED_MARKUP.split(markup)
+        for index in range(0, len(pieces), 2):
+            pieces[index] = self.ENTITY_REFERENCE.sub(r'&amp;\1', pieces[index])
+        return ''.join(pieces)
+    
+    def parse(self, markup, only=None):
+        markup = self.protect_entities(markup)
+        parser = None
+        if isinstance(markup, unicode):
+            # lxml refuses unicode strings that declare their own encoding.
+            markup = markup.encode('utf-8')
+            parser = lxml.html.HTMLParser(encoding='utf-8')
+        
+        try:
+            root = lxml.html.document_fromstring(markup, parser=parser)
+        except etree.ParserError:
+            # ...and documents with no elements at all.
+            root = lxml.html.document_fromstring('<html></html>')
+        return LxmlDocument(root)
+
+class LxmlElement (object):
+    """
+    An lxml element, made to look like a BeautifulSoup tag.
+    """
+    
+    def __init__(self, element):
+        self.element = element
+        self.name = element.tag
+    
+    def _candidates(self, recursive):
+        if recursive:
+            return self.element.iterdescendants()
+        else:
+            return self.element.iterchildren()
+    
+    def findAll(self, name, attrs=None, recursive=True):
+        return [LxmlElement(element)
+                for element in self._candidates(recursive)
+                if element_matches(element.tag, element.attrib, name, attrs)]
+    
+    def find(self, name, attrs=None, recursive=True):
+        for element in self._candidates(recursive):
+            if element_matches(element.tag, element.attrib, name, attrs):
+                return LxmlElement(element)
+        return None
+    
+    def getText(self, separator=u''):
+        strings = [text.strip() for text in self.element.itertext()]
+        return separator.join(strings)
+    
+    text = property(getText)
+    
+    def get(self, key, default=None):
+        return self.element.get(key, default)
+    
+    def __getitem__(self, key):
+        return self.element.attrib[key]
+    
+    def __nonzero__(self):
+        return True
+
+class LxmlDocument (LxmlElement):
+    """
+    A whole lxml document.  Like a BeautifulSoup object, its root <html>
+    element can itself be found.
+    """
+    
+    def _candidates(self, recursive):
+        if recursive:
+            return self.element.iter()
+        else:
+            return iter([self.element])
+
+backends = {
+    BeautifulSoupBackend.name: BeautifulSoupBackend(),
+}
+if lxml is not None:
+    backends[LxmlBackend.name] = LxmlBackend()
+    default_backend = backends[LxmlBackend.name]
+else:
+    default_backend = backends[BeautifulSoupBackend.name]
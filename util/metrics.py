@@ -0,0 +1,92 @@
+"""
+Simple, thread-safe counters for keeping track of how the application is
+performing.  Each component that wants to report numbers creates a named group
+of counters:
+    
+    stats = metrics.counters('connection_pool', 'hits', 'misses')
+    ...
+    stats.increment('hits')
+
+All of the registered groups can then be retrieved at once with snapshot().
+"""
+import threading
+
+class Counters (object):
+    """
+    A named group of numeric counters that may be updated from several threads
+    at once.
+    """
+    
+    def __init__(self, name, *counter_names):
+        self.name = name
+        self.__lock = threading.Lock()
+        self.__values = {}
+        for counter_name in counter_names:
+            self.__values[counter_name] = 0
+    
+    def increment(self, counter_name, amount=1):
+        self.__lock.acquire()
+        try:
+            self.__values[counter_name] = \
+                self.__values.get(counter_name, 0) + amount
+        finally:
+            self.__lock.release()
+    
+    def set(self, counter_name, value):
+        self.__lock.acquire()
+        try:
+            self.__values[counter_name] = value
+        finally:
+            self.__lock.release()
+    
+    def get(self, counter_name):
+        self.__lock.acquire()
+        try:
+            return self.__values.get(counter_name, 0)
+        finally:
+            self.__lock.release()
+    
+    def snapshot(self):
+        self.__lock.acquire()
+        try:
+            return dict(self.__values)
+        finally:
+            self.__lock.release()
+    
+    def reset(self):
+        self.__lock.acquire()
+        try:
+            for counter_name in self.__values:
+                self.__values[counter_name] = 0
+        finally:
+            self.__lock.release()
+
+_registry_lock = threading.Lock()
+_registry = {}
+
+def counters(name, *counter_names):
+    """
+    Create a group of counters and register it under the given name.  If a
+    group with the same name already exists, the new group replaces it in the
+    registry.
+    """
+    group = Counters(name, *counter_names)
+    _registry_lock.acquire()
+    try:
+        _registry[name] = group
+    finally:
+        _registry_lock.release()
+    return group
+
+def snapshot():
+    """
+    Return the current values of all the registered counter groups, as a dict
+    of dicts keyed by group name.
+    """
+    _registry_lock.acquire()
+    try:
+        groups = _registry.values()
+    finally:
+        _registry_lock.release()
+    
+    return dict([(group.name, group.snapshot()) for group in groups])
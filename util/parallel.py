@@ -0,0 +1,455 @@
+"""
+A small, bounded pool of worker threads, for running independent calls (e.g.,
+requests to PCS) at the same time.  It's used like this:
+    
+    workers = WorkerPool(max_workers=4)
+    
+    tasks = [workers.submit(fetch, url) for url in urls]
+    for task in as_completed(tasks, timeout=10):
+        print task.result()
+
+If threads cannot be started in the current environment (as in AppEngine's
+python 2.5 runtime), submitted calls are simply run in the calling thread,
+unless they're submitted with submit_in_background.  Either way, each call runs in the request context (see util.context) of the
+thread that submitted it.
+"""
+import Queue
+import sys
+import threading
+import time
+
+from util import metrics
+from util.context import current_context
+from util.context import use_context
+from util.deadline import current_deadline
+from util.deadline import DeadlineExceededError
+
+class TaskTimeoutError (Exception):
+    pass
+
+class TaskCancelledError (Exception):
+    pass
+
+class Task (object):
+    """
+    A call that has been submitted to a WorkerPool.
+    """
+    
+    def __init__(self, function, args, kwds):
+        self.function = function
+        self.args = args
+        self.kwds = kwds
+        self.context = current_context()
+        
+        self.__lock = threading.Lock()
+        self.__done = threading.Event()
+        self.__callbacks = []
+        self.__started = False
+        self.__cancelled = False
+        self.__value = None
+        self.__exc_info = None
+    
+    def run(self):
+        self.__lock.acquire()
+        try:
+            if self.__cancelled:
+                return
+            self.__started = True
+        finally:
+            self.__lock.release()
+        
+        previous_context = use_context(self.context)
+        try:
+            try:
+                self.__value = self.function(*self.args, **self.kwds)
+            except:
+                self.__exc_info = sys.exc_info()
+        finally:
+            use_context(previous_context)
+        self.__finish()
+    
+    def __finish(self):
+        self.__lock.acquire()
+        try:
+            self.__done.set()
+            callbacks, self.__callbacks = self.__callbacks, []
+        finally:
+            self.__lock.release()
+        
+        for callback in callbacks:
+            callback(self)
+    
+    def cancel(self):
+        """
+        Keep the task from running, if it hasn't started yet.
+        
+        @return: Whether the task was cancelled.  A task that has already
+          started cannot be cancelled; its result will just be ignored.
+        """
+        self.__lock.acquire()
+        try:
+            if self.__started or self.__cancelled:
+                return self.__cancelled
+            self.__cancelled = True
+        finally:
+            self.__lock.release()
+        
+        self.__finish()
+        return True
+    
+    def add_done_callback(self, callback):
+        """
+        Call callback(task) once the task has finished (or been cancelled).  If
+        it already has, the callback is called right away.
+        """
+        self.__lock.acquire()
+        try:
+            if not self.__done.isSet():
+                self.__callbacks.append(callback)
+                return
+        finally:
+            self.__lock.release()
+        
+        callback(self)
+    
+    def done(self):
+        return self.__done.isSet()
+    
+    def cancelled(self):
+        return self.__cancelled
+    
+    def wait(self, timeout=None):
+        self.__done.wait(timeout)
+        return self.__done.isSet()
+    
+    def exception(self, timeout=None):
+        """
+        Return the exception raised by the call, or None if there was none.
+        """
+        if not self.wait(timeout):
+            raise TaskTimeoutError('Task did not finish within %s seconds' % timeout)
+        if self.__cancelled:
+            raise TaskCancelledError('Task was cancelled')
+        return self.__exc_info[1] if self.__exc_info else None
+    
+    def result(self, timeout=None):
+        """
+        Return the value of the call, re-raising any exception that it raised.
+        """
+        if not self.wait(timeout):
+            raise TaskTimeoutError('Task did not finish within %s seconds' % timeout)
+        if self.__cancelled:
+            raise TaskCancelledError('Task was cancelled')
+        if self.__exc_info:
+            raise self.__exc_info[0], self.__exc_info[1], self.__exc_info[2]
+        return self.__value
+
+class WorkerPool (object):
+    """
+    Runs submitted calls on at most max_workers threads.  Threads are started
+    as they are needed, and are kept around for later calls.
+    """
+    
+    def __init__(self, max_workers=8):
+        self.max_workers = max_workers
+        
+        self.__queue = Queue.Queue()
+        self.__lock = threading.Lock()
+        self.__workers = 0
+        self.__idle = 0
+        self.__pending = 0
+        self.__threads_unavailable = False
+    
+    def __work(self):
+        while True:
+            task = self.__queue.get()
+            self.__lock.acquire()
+            self.__pending -= 1
+            self.__idle -= 1
+            self.__lock.release()
+            
+            task.run()
+            
+            self.__lock.acquire()
+            self.__idle += 1
+            self.__lock.release()
+    
+    def __enqueue(self, task):
+        """
+        Queue the task, starting another worker thread if all the existing ones
+        are busy and there is room for more.
+        
+        @return: False if threads cannot be used here at all, in which case the
+          task has not been queued.
+        """
+        self.__lock.acquire()
+        try:
+            if self.__threads_unavailable:
+                return False
+            
+            if self.__pending >= self.__idle and self.__workers < self.max_workers:
+                worker = threading.Thread(target=self.__work)
+                worker.setDaemon(True)
+                try:
+                    worker.start()
+                except Exception:
+                    self.__threads_unavailable = True
+                    return False
+                
+                self.__workers += 1
+                self.__idle += 1
+            
+            self.__pending += 1
+            self.__queue.put(task)
+            return True
+        finally:
+            self.__lock.release()
+    
+    def submit(self, function, *args, **kwds):
+        """
+        Schedule function(*args, **kwds) to be called.
+        
+        @return: A Task for retrieving the result.
+        """
+        task = Task(function, args, kwds)
+        
+        if not self.__enqueue(task):
+            task.run()
+        
+        return task
+    
+    def submit_in_background(self, function, *args, **kwds):
+        """
+        Schedule function(*args, **kwds) to be called on a worker thread, for
+        calls that aren't worth holding up the calling thread for.
+        
+        @return: A Task for retrieving the result, or None if threads cannot
+          be used here, in which case the call is not made at all.
+        """
+        task = Task(function, args, kwds)
+        
+        if not self.__enqueue(task):
+            return None
+        
+        return task
+
+class SingleFlight (object):
+    """
+    Lets concurrent callers that are after the same thing share a single call.
+    The first caller with a given key makes the call; any others that arrive
+    with that key before it finishes wait for it, and get the same result (or
+    exception).
+    
+    Each waiting caller gives up once its own request's deadline (see
+    util.deadline) has passed.  And if the call fails because the first
+    caller ran out of time (or was cancelled), the callers still waiting don't
+    share that failure; one of them makes the call again instead.
+    """
+    
+    COUNTERS = ('calls', 'coalesced')
+    
+    def __init__(self, stats_name=None):
+        self.__lock = threading.Lock()
+        self.__in_flight = {}
+        
+        if stats_name is not None:
+            self.stats = metrics.counters(stats_name, *self.COUNTERS)
+        else:
+            self.stats = metrics.Counters('single_flight', *self.COUNTERS)
+    
+    def wait(self, task):
+        """
+        Wait for another caller's task to finish.
+        
+        @raise: DeadlineExceededError if the current request runs out of time
+          first.
+        """
+        deadline = current_deadline()
+        if deadline is None:
+            task.wait()
+        elif not task.wait(deadline.limit()):
+            raise DeadlineExceededError(
+                'The request did not finish within %s seconds.' % deadline.seconds)
+    
+    def is_callers_failure(self, task):
+        """
+        Check whether a finished task failed because of the caller that made
+        it (by running out of time, or being cancelled), rather than because of
+        the call itself.
+        """
+        if task.cancelled():
+            return True
+        return isinstance(task.exception(),
+                          (DeadlineExceededError, TaskCancelledError))
+    
+    def do(self, key, function, *args, **kwds):
+        """
+        Call function(*args, **kwds), unless a call with the same key is already
+        under way, in which case wait for that one instead.
+        
+        @return: The value of the call.
+        @raise: DeadlineExceededError if the current request runs out of time
+          while waiting.
+        """
+        while True:
+            self.__lock.acquire()
+            try:
+                task = self.__in_flight.get(key)
+                is_leader = task is None or task.done()
+                if is_leader:
+                    task = Task(function, args, kwds)
+                    self.__in_flight[key] = task
+            finally:
+                self.__lock.release()
+            
+            if is_leader:
+                break
+        
+            self.stats.increment('coalesced')
+            self.wait(task)
+            if not self.is_callers_failure(task):
+                return task.result()
+        
+        self.stats.increment('calls')
+        try:
+            task.run()
+        finally:
+            self.__lock.acquire()
+            try:
+                if self.__in_flight.get(key) is task:
+                    del self.__in_flight[key]
+            finally:
+                self.__lock.release()
+        return task.result()
+
+class Hedger (object):
+    """
+    Trims the slow tail of a call's response times.  The call is started on a
+    worker; if it hasn't finished within the hedge delay, an identical call is
+    started too, and whichever succeeds first wins.  Only use it for calls that
+    are safe to make twice.
+    
+    The hedge delay is the given percentile of the recent calls' times, or
+    initial_delay until enough calls have been timed.  At most max_rate of the
+    calls are hedged, so that hedging can't much add to the load on whatever
+    is being called.
+    """
+    
+    COUNTERS = ('calls', 'hedges_sent', 'hedges_won')
+    
+    def __init__(self, workers=None, percentile=0.95, initial_delay=1.0,
+                 max_rate=0.05, window=200, min_samples=20, stats_name=None):
+        self.workers = workers if workers is not None else WorkerPool(max_workers=8)
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.max_rate = max_rate
+        self.window = window
+        self.min_samples = min_samples
+        
+        self.__lock = threading.Lock()
+        self.__times = []
+        self.__calls = 0
+        self.__hedges = 0
+        
+        if stats_name is not None:
+            self.stats = metrics.counters(stats_name, *self.COUNTERS)
+        else:
+            self.stats = metrics.Counters('hedger', *self.COUNTERS)
+    
+    def get_delay(self):
+        """
+        @return: The number of seconds to wait for a call before hedging it.
+        """
+        self.__lock.acquire()
+        try:
+            if len(self.__times) < self.min_samples:
+                return self.initial_delay
+            times = sorted(self.__times)
+        finally:
+            self.__lock.release()
+        
+        return times[int(self.percentile * (len(times) - 1))]
+    
+    def record_time(self, seconds):
+        self.__lock.acquire()
+        try:
+            self.__times.append(seconds)
+            if len(self.__times) > self.window:
+                del self.__times[0]
+        finally:
+            self.__lock.release()
+    
+    def __start_call(self):
+        self.__lock.acquire()
+        try:
+            self.__calls += 1
+        finally:
+            self.__lock.release()
+        self.stats.increment('calls')
+    
+    def __may_hedge(self):
+        self.__lock.acquire()
+        try:
+            if self.__hedges >= self.max_rate * self.__calls:
+                return False
+            self.__hedges += 1
+            return True
+        finally:
+            self.__lock.release()
+    
+    def call(self, function, *args, **kwds):
+        """
+        Call function(*args, **kwds), hedging the call if it is slow.
+        
+        @return: The value of whichever call succeeded first.  If both fail,
+          the first call's exception is raised.
+        """
+        self.__start_call()
+        started_at = time.time()
+        
+        primary = self.workers.submit(function, *args, **kwds)
+        if primary.wait(self.get_delay()) or not self.__may_hedge():
+            value = primary.result()
+            self.record_time(time.time() - started_at)
+            return value
+        
+        self.stats.increment('hedges_sent')
+        hedge = self.workers.submit(function, *args, **kwds)
+        
+        for task in as_completed([primary, hedge]):
+            if task.exception() is None:
+                break
+        else:
+            task = primary
+        
+        # The loser may not have started yet; if so, it needn't be.
+        for other_task in (primary, hedge):
+            if other_task is not task:
+                other_task.cancel()
+        
+        if task is hedge:
+            self.stats.increment('hedges_won')
+        value = task.result()
+        self.record_time(time.time() - started_at)
+        return value
+
+def as_completed(tasks, timeout=None):
+    """
+    Yield each of the given tasks as it finishes.  If timeout seconds pass
+    before they all have, raise a TaskTimeoutError.
+    """
+    finished = Queue.Queue()
+    for task in tasks:
+        task.add_done_callback(finished.put)
+    
+    give_up_at = time.time() + timeout if timeout is not None else None
+    for _ in range(len(tasks)):
+        remaining = None
+        if give_up_at is not None:
+            remaining = max(give_up_at - time.time(), 0)
+        
+        try:
+            task = finished.get(True, remaining)
+        except Queue.Empty:
+            raise TaskTimeoutError('Tasks did not finish within %s seconds' % timeout)
+        yield task
@@ -0,0 +1,136 @@
+"""
+Token buckets, for keeping the rate of calls to a service under a limit.  A
+RateLimiter keeps a bucket for each key (e.g., each host and kind of request)
+that it is asked about:
+    
+    limiter = RateLimiter({'search': (5, 10)}, default=(10, 20))
+    if not limiter.acquire(('example.com', 'search'), timeout=10):
+        raise ...
+
+Callers that find a bucket empty wait for a token instead of failing, in the
+order they arrived, for as long as their timeout allows.
+"""
+import threading
+import time
+
+from util import metrics
+
+class TokenBucket (object):
+    """
+    Holds up to capacity tokens, and gains rate tokens per second.  Each call
+    takes one token.  A caller that finds the bucket empty may still take a
+    token that has yet to arrive, and then waits until it has.
+    """
+    
+    def __init__(self, rate, capacity, timer=time.time):
+        self.rate = float(rate)
+        self.capacity = capacity
+        self.timer = timer
+        
+        self.__lock = threading.Lock()
+        self.__tokens = float(capacity)
+        self.__updated_at = timer()
+    
+    def reserve(self, timeout=None):
+        """
+        Take a token.
+        
+        @return: The number of seconds that the caller has to wait before the
+          token is its to use, or None (and no token is taken) if that would be
+          longer than timeout.
+        """
+        self.__lock.acquire()
+        try:
+            now = self.timer()
+            self.__tokens = min(self.capacity,
+                self.__tokens + (now - self.__updated_at) * self.rate)
+            self.__updated_at = now
+            
+            if self.__tokens >= 1:
+                wait = 0
+            else:
+                wait = (1 - self.__tokens) / self.rate
+            
+            if timeout is not None and wait > timeout:
+                return None
+            
+            self.__tokens -= 1
+            return wait
+        finally:
+            self.__lock.release()
+
+class RateLimiter (object):
+    """
+    Keeps a TokenBucket for each key that it's asked about.  A key is a tuple
+    of (host, kind); the rate and capacity of a key's bucket are looked up in
+    limits by the whole key, then by kind alone, falling back to default.
+    Keys with no limit at all are not limited.
+    
+    The stats report how many calls there have been, how many of those had
+    to wait and for how long in total (in milliseconds), and how many gave up
+    waiting.
+    """
+    
+    COUNTERS = ('calls', 'delayed', 'wait_ms', 'timeouts')
+    
+    def __init__(self, limits=None, default=None, stats_name=None,
+                 timer=time.time, sleep=time.sleep):
+        self.limits = limits or {}
+        self.default = default
+        self.timer = timer
+        self.sleep = sleep
+        
+        self.__lock = threading.Lock()
+        self.__buckets = {}
+        
+        if stats_name is not None:
+            self.stats = metrics.counters(stats_name, *self.COUNTERS)
+        else:
+            self.stats = metrics.Counters('rate_limiter', *self.COUNTERS)
+    
+    def get_limit(self, key):
+        """
+        @return: The (rate, capacity) for the given key, or None.
+        """
+        host, kind = key
+        if key in self.limits:
+            return self.limits[key]
+        return self.limits.get(kind, self.default)
+    
+    def get_bucket(self, key):
+        self.__lock.acquire()
+        try:
+            if key not in self.__buckets:
+                limit = self.get_limit(key)
+                if limit is None:
+                    self.__buckets[key] = None
+                else:
+                    rate, capacity = limit
+                    self.__buckets[key] = TokenBucket(rate, capacity, self.timer)
+            return self.__buckets[key]
+        finally:
+            self.__lock.release()
+    
+    def acquire(self, key, timeout=None):
+        """
+        Wait (for up to timeout seconds) until a call for the given key may be
+        made.
+        
+        @return: Whether the call may be made.
+        """
+        self.stats.increment('calls')
+        
+        bucket = self.get_bucket(key)
+        if bucket is None:
+            return True
+        
+        wait = bucket.reserve(timeout)
+        if wait is None:
+            self.stats.increment('timeouts')
+            return False
+        
+        if wait > 0:
+            self.stats.increment('delayed')
+            self.stats.increment('wait_ms', int(wait * 1000))
+            self.sleep(wait)
+        return True
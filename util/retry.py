@@ -0,0 +1,200 @@
+"""
+Tools for calling a flaky upstream service politely.  A RetryPolicy spaces out
+retries with exponential backoff and jitter, so that many clients retrying at
+once don't all hit the service at the same moments.  A CircuitBreaker stops
+calls altogether for a while once the service has failed several times in a
+row:
+    
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+    policy = RetryPolicy(retries=2)
+    
+    attempt = 0
+    while breaker.allow_request():
+        try:
+            result = call()
+        except TransientError:
+            breaker.record_failure()
+            if attempt >= policy.retries:
+                raise
+            policy.wait(attempt)
+            attempt += 1
+        else:
+            breaker.record_success()
+            return result
+"""
+import random
+import threading
+import time
+
+from util import metrics
+
+class RetryPolicy (object):
+    """
+    Allows up to retries further attempts after a failed one.  Before retry n
+    (counting from 0), waits a random time of up to base_delay * 2**n seconds,
+    but never more than max_delay.
+    """
+    
+    def __init__(self, retries=0, base_delay=0.1, max_delay=2.0,
+                 sleep=time.sleep, random=random.random):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self.random = random
+    
+    def get_delay(self, attempt):
+        """
+        @return: The number of seconds to wait before retrying, after the given
+          (0-based) attempt has failed.
+        """
+        ceiling = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return ceiling * self.random()
+    
+    def wait(self, attempt, max_wait=None):
+        """
+        Sleep before retrying, after the given attempt has failed, but not for
+        longer than max_wait seconds.
+        """
+        delay = self.get_delay(attempt)
+        if max_wait is not None:
+            delay = min(delay, max_wait)
+        self.sleep(delay)
+
+class CircuitBreaker (object):
+    """
+    Counts consecutive failures of calls to a service.  After failure_threshold
+    of them, the circuit opens: allow_request says no to every call for the
+    next reset_timeout seconds.  After that, a single trial call is let through
+    (the circuit is half-open); if it succeeds the circuit closes again, and if
+    it fails the circuit stays open for another reset_timeout seconds.
+    
+    The breaker's stats report whether it is open (1) or not (0), along with
+    the number of failures, the number of times it has opened, and the number
+    of calls it has rejected.  Several breakers may share stats (see
+    CircuitBreakers), in which case open is the number of them that are open.
+    """
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    COUNTERS = ('open', 'failures', 'opened', 'rejected')
+    
+    def __init__(self, failure_threshold=5, reset_timeout=30, stats_name=None,
+                 timer=time.time, stats=None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.timer = timer
+        
+        self.__lock = threading.Lock()
+        self.__state = self.CLOSED
+        self.__failures = 0
+        self.__opened_at = None
+        
+        if stats is not None:
+            self.stats = stats
+        elif stats_name is not None:
+            self.stats = metrics.counters(stats_name, *self.COUNTERS)
+        else:
+            self.stats = metrics.Counters('circuit_breaker', *self.COUNTERS)
+    
+    def state(self):
+        self.__lock.acquire()
+        try:
+            return self.__state
+        finally:
+            self.__lock.release()
+    
+    def allow_request(self):
+        """
+        @return: Whether a call should be made now.
+        """
+        self.__lock.acquire()
+        try:
+            if self.__state == self.CLOSED:
+                return True
+            
+            now = self.timer()
+            if now >= self.__opened_at + self.reset_timeout:
+                # Let one call through to see whether the service is back.  If
+                # that call never reports back, let another through after the
+                # same timeout.
+                self.__state = self.HALF_OPEN
+                self.__opened_at = now
+                return True
+        finally:
+            self.__lock.release()
+        
+        self.stats.increment('rejected')
+        return False
+    
+    def record_success(self):
+        self.__lock.acquire()
+        try:
+            if self.__state != self.CLOSED:
+                self.stats.increment('open', -1)
+            self.__state = self.CLOSED
+            self.__failures = 0
+        finally:
+            self.__lock.release()
+    
+    def record_failure(self):
+        self.stats.increment('failures')
+        
+        self.__lock.acquire()
+        try:
+            self.__failures += 1
+            if self.__state == self.HALF_OPEN \
+               or self.__failures >= self.failure_threshold:
+                if self.__state == self.CLOSED:
+                    self.stats.increment('open')
+                if self.__state != self.OPEN:
+                    self.stats.increment('opened')
+                self.__state = self.OPEN
+                self.__opened_at = self.timer()
+        finally:
+            self.__lock.release()
+
+class CircuitBreakers (object):
+    """
+    A separate CircuitBreaker for each part of a service (e.g., each of its
+    endpoints), so that one part failing doesn't stop calls to the rest:
+        
+        breakers = CircuitBreakers(failure_threshold=5, reset_timeout=30)
+        breaker = breakers.get(endpoint)
+    
+    Each breaker is made the first time it is asked for.  They all count in
+    the same stats.
+    """
+    
+    def __init__(self, failure_threshold=5, reset_timeout=30, stats_name=None,
+                 timer=time.time):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.timer = timer
+        
+        self.__lock = threading.Lock()
+        self.__breakers = {}
+        
+        if stats_name is not None:
+            self.stats = metrics.counters(stats_name, *CircuitBreaker.COUNTERS)
+        else:
+            self.stats = metrics.Counters('circuit_breakers',
+                                          *CircuitBreaker.COUNTERS)
+    
+    def get(self, key):
+        """
+        @return: The CircuitBreaker for the given key.
+        """
+        self.__lock.acquire()
+        try:
+            breaker = self.__breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(self.failure_threshold,
+                                         self.reset_timeout, timer=self.timer,
+                                         stats=self.stats)
+                self.__breakers[key] = breaker
+            return breaker
+        finally:
+            self.__lock.release()